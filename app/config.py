@@ -10,7 +10,7 @@ class Settings(BaseSettings):
     """Application settings from environment variables"""
     
     # LLM Configuration
-    llm_provider: str = "openai"  # openai, groq, or anthropic
+    llm_provider: str = "openai"  # openai, groq, anthropic, or fake (offline load testing)
     
     # OpenAI
     openai_api_key: Optional[str] = None
@@ -23,8 +23,48 @@ class Settings(BaseSettings):
     # Anthropic
     anthropic_api_key: Optional[str] = None
     anthropic_model: str = "claude-3-sonnet-20240229"
+    anthropic_prompt_caching: bool = True  # Mark the static companion system prompt as cacheable
+    
+    # Per-call LLM timeout (seconds)
+    llm_timeout_seconds: float = 15.0
+    
+    # LLM provider routing: fallbacks are tried when the primary fails, or
+    # raced against it once the hedge delay passes
+    llm_fallback_providers: str = ""  # Comma-separated, e.g. "groq,anthropic"
+    llm_hedge_delay_ms: int = 0  # 0 = failover only, no hedged requests
+    llm_breaker_error_rate: float = 0.5  # EWMA error rate that opens a provider's circuit
+    llm_breaker_latency_ms: int = 8000  # EWMA latency that opens a provider's circuit
+    llm_breaker_cooldown_seconds: float = 30.0  # Time before an open circuit lets a probe through
+    
+    # Admission control: per-provider limits (0 = no rate limit) and how long
+    # a call may wait for a slot, by latency class (voice > chat > background)
+    llm_max_concurrent: int = 32
+    llm_requests_per_minute: int = 0
+    llm_tokens_per_minute: int = 0  # Prompt + max reply tokens
+    tts_max_concurrent: int = 8
+    tts_requests_per_minute: int = 0
+    admission_deadline_voice_ms: int = 2000
+    admission_deadline_chat_ms: int = 5000
+    admission_deadline_background_ms: int = 60000
+    
+    # LLM context: history is packed into what this budget leaves after the
+    # system prompt and the current message
+    llm_context_budget_tokens: int = 2000
+    llm_history_message_max_tokens: int = 200  # Longer history messages are truncated
+    # A/B switch: compact core persona plus only the backstory/interests that
+    # match the message (true), or the full companion prompt every turn (false)
+    prompt_profile_slicing: bool = True
+    
+    # Long-term memory: older chats most relevant to each message, found by
+    # a per-conversation BM25 index (snapshots kept in memory_index_dir)
+    memory_enabled: bool = True
+    memory_top_k: int = 3
+    memory_recall_budget_ms: float = 5.0  # Search time limit per turn
+    memory_index_dir: str = ".cache/memory"
+    memory_index_max_mb: int = 128
     
     # Text-to-Speech - ElevenLabs
+    tts_provider: str = "elevenlabs"  # elevenlabs, or fake (offline load testing)
     use_elevenlabs_tts: bool = True
     elevenlabs_api_key: Optional[str] = None
     
@@ -32,6 +72,37 @@ class Settings(BaseSettings):
     elevenlabs_female_voice_id: str = "21m00Tcm4TlvDq8ikWAM"  # Rachel - warm, friendly, natural female voice (Emma)
     elevenlabs_male_voice_id: str = "pNInz6obpgDQGcFmaJgB"    # Adam - warm, friendly, natural male voice (Alex)
     
+    # Fake LLM/TTS providers (LLM_PROVIDER=fake, TTS_PROVIDER=fake): latencies
+    # are lognormal around the medians, output is deterministic per input
+    fake_seed: int = 0
+    fake_latency_sigma: float = 0.5  # Lognormal spread (0 = fixed latencies)
+    fake_llm_ttft_ms: float = 300.0  # Median time to first token
+    fake_llm_tokens_per_second: float = 80.0
+    fake_llm_output_tokens: int = 40
+    fake_llm_error_rate: float = 0.0
+    fake_tts_ttfb_ms: float = 200.0  # Median time to first audio byte
+    fake_tts_bytes_per_second: float = 64000.0
+    fake_tts_error_rate: float = 0.0
+    
+    # TTS audio cache (memory + shared disk tier)
+    tts_cache_enabled: bool = True
+    tts_cache_dir: str = ".cache/tts"
+    tts_cache_memory_mb: int = 32
+    tts_cache_disk_mb: int = 512
+    
+    # /voice/tts relays audio chunks as ElevenLabs produces them (false = buffer the whole clip)
+    tts_stream_responses: bool = True
+    tts_stream_buffer_chunks: int = 16  # Chunks held between ElevenLabs and a slow client
+    tts_stream_cache_max_kb: int = 256  # Longer streamed clips skip the audio cache
+    tts_stream_stall_seconds: float = 10.0  # Synthesis is abandoned when a client reads nothing for this long
+    
+    # WebSocket voice sessions (/voice/ws)
+    voice_ws_heartbeat_seconds: float = 20.0  # Idle sessions are closed after two intervals
+    voice_ws_send_queue_size: int = 64  # Outgoing frames buffered per session before generation waits
+    
+    # Sentence pipeline of streamed voice turns (SSE and WebSocket)
+    voice_pipeline_queue_size: int = 32  # Tokens / sentences buffered per turn before generation waits
+    
     # Legacy TTS options (now commented out - using ElevenLabs)
     # use_openai_tts: bool = False
     # openai_tts_voice: str = "nova"  # alloy, echo, fable, onyx, nova, shimmer
@@ -41,6 +112,34 @@ class Settings(BaseSettings):
     mongo_uri: str = "mongodb://localhost:27017/"
     database_name: str = "AICompanionDB"
     
+    # Database connection pool
+    mongo_max_pool_size: int = 100
+    mongo_min_pool_size: int = 0
+    mongo_wait_queue_timeout_ms: int = 5000  # Max wait for a free pooled connection
+    mongo_server_selection_timeout_ms: int = 5000
+    mongo_bootstrap_indexes: bool = False  # Create indexes in the lifespan handler (normally done by setup_database.py)
+    
+    # Chat persistence (write-behind buffers chats and flushes them with insert_many)
+    chat_write_behind: bool = False
+    chat_write_buffer_size: int = 5000  # Max buffered chats; callers wait when full
+    chat_write_batch_size: int = 200
+    chat_write_flush_interval_ms: int = 250
+    chat_write_retries: int = 3  # Retries of a failed batch, with exponential backoff
+    chat_write_dead_letter_file: str = ".cache/chat_dead_letter.jsonl"  # Chats that still failed; replayed on startup
+    
+    # Companion catalog cache (0 = only reloaded on create/delete in this worker)
+    companion_cache_ttl_seconds: int = 0
+    
+    # Per-conversation history ring buffer used for LLM context
+    history_cache_turns: int = 5
+    history_cache_max_mb: int = 64
+    history_cache_ttl_seconds: float = 0  # Re-read from Mongo after this (0 = never; set >0 with several workers)
+    
+    # Rolling conversation summary (replaces turns older than the history window)
+    summary_enabled: bool = True
+    summary_refresh_turns: int = 10  # Refresh in the background every N turns
+    summary_max_tokens: int = 200
+    
     # Application
     api_host: str = "0.0.0.0"
     api_port: int = 8001
@@ -67,28 +166,45 @@ class Settings(BaseSettings):
         extra="ignore"
     )
     
-    def get_llm_config(self) -> dict:
-        """Get active LLM configuration"""
-        if self.llm_provider == "openai":
+    def get_llm_config(self, provider: Optional[str] = None) -> dict:
+        """Get active LLM configuration (or the configuration of a named provider)"""
+        provider = provider or self.llm_provider
+        if provider == "openai":
             return {
                 "provider": "openai",
                 "api_key": self.openai_api_key,
                 "model": self.openai_model
             }
-        elif self.llm_provider == "groq":
+        elif provider == "groq":
             return {
                 "provider": "groq",
                 "api_key": self.groq_api_key,
                 "model": self.groq_model
             }
-        elif self.llm_provider == "anthropic":
+        elif provider == "anthropic":
             return {
                 "provider": "anthropic",
                 "api_key": self.anthropic_api_key,
-                "model": self.anthropic_model
+                "model": self.anthropic_model,
+                "prompt_caching": self.anthropic_prompt_caching
+            }
+        elif provider == "fake":
+            return {
+                "provider": "fake",
+                "api_key": "fake",
+                "model": "fake-llm"
             }
         else:
-            raise ValueError(f"Unknown LLM provider: {self.llm_provider}")
+            raise ValueError(f"Unknown LLM provider: {provider}")
+    
+    def get_llm_provider_names(self) -> list:
+        """Primary LLM provider followed by the configured fallbacks, without duplicates"""
+        names = [self.llm_provider]
+        for name in self.llm_fallback_providers.split(","):
+            name = name.strip()
+            if name and name not in names:
+                names.append(name)
+        return names
     
     def get_allowed_origins_list(self) -> list:
         """Convert comma-separated origins to list"""
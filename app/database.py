@@ -1,8 +1,15 @@
 """
 MongoDB Database Connection Module
 Handles all database connections and collection references
+Uses Motor (async MongoDB driver) so queries never block the event loop
+
+The client is created by the FastAPI lifespan handler (see app/main.py)
+from Settings, not at import time. Index creation is a separate,
+idempotent bootstrap step (bootstrap_indexes / setup_database.py).
 """
-from pymongo import MongoClient
+from typing import Optional
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase
+from pymongo import ASCENDING, DESCENDING, IndexModel
 from pymongo.errors import ConnectionFailure
 import logging
 
@@ -10,53 +17,133 @@ import logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# MongoDB Configuration
-MONGO_URI = "mongodb://localhost:27017/"
-DATABASE_NAME = "AICompanionDB"
-
-# Initialize MongoDB Client
-try:
-    client = MongoClient(MONGO_URI)
-    # Test connection
-    client.admin.command('ping')
-    logger.info("Successfully connected to MongoDB!")
-except ConnectionFailure as e:
-    logger.error(f"Failed to connect to MongoDB: {e}")
-    raise
-
-# Get database instance
-db = client[DATABASE_NAME]
-
-# Collection references
-users = db["users"]
-companions = db["companions"]
-chats = db["chats"]
-
-# Create indexes for better performance
-def create_indexes():
-    """Create database indexes for optimized queries"""
+# Declared indexes per collection, one entry per query shape the routes issue.
+# Default (key-derived) names are kept so re-running against an existing
+# database does not conflict with indexes created by earlier versions.
+INDEXES = {
+    "users": [
+        # login / signup: {email}
+        IndexModel([("email", ASCENDING)], unique=True),
+    ],
+    "companions": [
+        # get_story / turn handlers: {gender}
+        IndexModel([("gender", ASCENDING)]),
+    ],
+    "chats": [
+        # history pages, stats rebuild: {user_id} sort (timestamp, _id) desc
+        IndexModel([("user_id", ASCENDING), ("timestamp", DESCENDING), ("_id", DESCENDING)]),
+        # turn context, filtered history pages, per-companion counts:
+        # {user_id, companion_gender} sort (timestamp, _id) desc. The limited
+        # context reads fetch only the N newest documents, so the message
+        # text is not copied into the index to make it covering.
+        IndexModel(
+            [
+                ("user_id", ASCENDING),
+                ("companion_gender", ASCENDING),
+                ("timestamp", DESCENDING),
+                ("_id", DESCENDING),
+            ]
+        ),
+    ],
+    "conversation_summaries": [
+        # summary read / refresh: {user_id, companion_gender}
+        IndexModel([("user_id", ASCENDING), ("companion_gender", ASCENDING)], unique=True),
+    ],
+}
+
+# Indexes created by earlier versions that are now redundant, dropped by
+# bootstrap_indexes() if present
+RETIRED_INDEXES = {
+    "chats": [
+        # prefix of (user_id, timestamp, _id)
+        "user_id_1_timestamp_-1",
+        # former covering context index (duplicated the message text)
+        "user_id_1_companion_gender_1_timestamp_-1__id_-1_user_message_1_ai_response_1",
+    ],
+}
+
+# Connection state (populated by connect())
+client: Optional[AsyncIOMotorClient] = None
+db: Optional[AsyncIOMotorDatabase] = None
+
+def connect(settings) -> AsyncIOMotorDatabase:
+    """
+    Create the MongoDB client and database handle from settings
+
+    Motor connects lazily, so this does no network I/O; call ping() to
+    verify the server is reachable.
+
+    Args:
+        settings: Application Settings instance
+
+    Returns:
+        Database instance
+    """
+    global client, db
+
+    if client is not None:
+        return db
+
+    client = AsyncIOMotorClient(
+        settings.mongo_uri,
+        maxPoolSize=settings.mongo_max_pool_size,
+        minPoolSize=settings.mongo_min_pool_size,
+        waitQueueTimeoutMS=settings.mongo_wait_queue_timeout_ms,
+        serverSelectionTimeoutMS=settings.mongo_server_selection_timeout_ms
+    )
+    db = client[settings.database_name]
+
+    logger.info(
+        f"MongoDB client created for database '{settings.database_name}' "
+        f"(pool {settings.mongo_min_pool_size}-{settings.mongo_max_pool_size})"
+    )
+    return db
+
+async def ping():
+    """Verify the MongoDB server is reachable"""
+    try:
+        await get_database().client.admin.command('ping')
+        logger.info("Successfully connected to MongoDB!")
+    except ConnectionFailure as e:
+        logger.error(f"Failed to connect to MongoDB: {e}")
+        raise
+
+async def bootstrap_indexes():
+    """
+    Create all declared indexes and drop retired ones
+
+    Safe to run repeatedly: create_indexes is a no-op for indexes that
+    already exist with the same specification, and retired indexes that
+    are already gone are skipped.
+    """
+    database = get_database()
     try:
-        # User indexes
-        users.create_index("email", unique=True)
-        
-        # Companion indexes
-        companions.create_index("gender")
-        
-        # Chat indexes
-        chats.create_index([("user_id", 1), ("timestamp", -1)])
-        
+        for collection_name, index_models in INDEXES.items():
+            await database[collection_name].create_indexes(index_models)
+
+        for collection_name, index_names in RETIRED_INDEXES.items():
+            existing = await database[collection_name].index_information()
+            for index_name in index_names:
+                if index_name in existing:
+                    await database[collection_name].drop_index(index_name)
+                    logger.info(f"Dropped retired index {collection_name}.{index_name}")
+
         logger.info("Database indexes created successfully!")
     except Exception as e:
         logger.warning(f"Index creation warning: {e}")
 
-# Initialize indexes on module import
-create_indexes()
-
-def get_database():
+def get_database() -> AsyncIOMotorDatabase:
     """Return database instance"""
+    if db is None:
+        raise RuntimeError("Database not connected. Call connect() during application startup.")
     return db
 
 def close_connection():
     """Close MongoDB connection"""
-    client.close()
-    logger.info("MongoDB connection closed")
+    global client, db
+
+    if client is not None:
+        client.close()
+        client = None
+        db = None
+        logger.info("MongoDB connection closed")
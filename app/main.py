@@ -2,12 +2,26 @@
 AI Companion Backend - Main Application
 FastAPI application for AI companion chat system
 """
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from app.routes import auth_routes, chat_routes, companion_routes, voice_routes
 from app.config import settings
+from app import database
+from app.services.chat_persistence_service import chat_persistence_service
+from app.services.companion_catalog import companion_catalog
+from app.services.conversation_history import conversation_history
+from app.services.conversation_summary import conversation_summary
+from app.services.long_term_memory import long_term_memory
+from app.services.prompt_cache import system_prompt_cache
+from app.services.companion_profile import companion_profiles
+from app.services.context_assembler import context_assembler
+from app.services.audio_cache import audio_cache
+from app.services.ai_service_enhanced import enhanced_ai_service
+from app.services.tts_service import tts_service
 import logging
+import time
 
 # Configure logging
 logging.basicConfig(
@@ -16,13 +30,54 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Application lifespan - connect on startup, clean up on shutdown
+    """
+    logger.info("="*50)
+    logger.info("AI Companion Backend Starting...")
+    logger.info("="*50)
+    started = time.perf_counter()
+
+    database.connect(settings)
+    await database.ping()
+    if settings.mongo_bootstrap_indexes:
+        await database.bootstrap_indexes()
+    companion_catalog.configure(settings)
+    await companion_catalog.load()
+    conversation_history.configure(settings)
+    conversation_summary.configure(settings)
+    long_term_memory.configure(settings)
+    context_assembler.configure(settings)
+    audio_cache.configure(settings)
+    chat_persistence_service.start(settings)
+
+    app.state.startup_seconds = time.perf_counter() - started
+    logger.info("FastAPI application initialized")
+    logger.info("MongoDB connection established")
+    logger.info(f"Startup completed in {app.state.startup_seconds * 1000:.1f} ms")
+    logger.info("API Documentation: http://127.0.0.1:8000/docs")
+    logger.info("="*50)
+
+    yield
+
+    logger.info("AI Companion Backend shutting down...")
+    await conversation_summary.stop()
+    await long_term_memory.stop()
+    await chat_persistence_service.stop()
+    await enhanced_ai_service.close()
+    tts_service.close()
+    database.close_connection()
+
 # Create FastAPI application
 app = FastAPI(
     title="AI Companion Backend",
     description="Backend API for AI Companion chat system with human-like conversations",
     version="1.0.1",
     docs_url="/docs",
-    redoc_url="/redoc"
+    redoc_url="/redoc",
+    lifespan=lifespan
 )
 
 # Configure CORS - Allow file:// and all origins for development
@@ -89,34 +144,22 @@ async def health_check():
     return {
         "status": "healthy",
         "database": "connected",
-        "api": "running"
+        "api": "running",
+        "startup_seconds": getattr(app.state, "startup_seconds", None),
+        "chat_persistence": chat_persistence_service.get_stats(),
+        "companion_catalog": companion_catalog.get_stats(),
+        "conversation_history": conversation_history.get_stats(),
+        "conversation_summaries": conversation_summary.get_stats(),
+        "long_term_memory": long_term_memory.get_stats(),
+        "llm": enhanced_ai_service.get_stats(),
+        "system_prompts": system_prompt_cache.get_stats(),
+        "companion_profiles": companion_profiles.get_stats(),
+        "tts_cache": audio_cache.get_stats(),
+        "tts_single_flight": tts_service.flights.get_stats(),
+        "tts_admission": tts_service.limiter.get_stats(),
+        "tts_stream": tts_service.get_stats()
     }
 
-# Startup event
-@app.on_event("startup")
-async def startup_event():
-    """
-    Execute on application startup
-    """
-    logger.info("="*50)
-    logger.info("AI Companion Backend Starting...")
-    logger.info("="*50)
-    logger.info("FastAPI application initialized")
-    logger.info("MongoDB connection established")
-    logger.info("API Documentation: http://127.0.0.1:8000/docs")
-    logger.info("="*50)
-
-# Shutdown event
-@app.on_event("shutdown")
-async def shutdown_event():
-    """
-    Execute on application shutdown
-    """
-    logger.info("AI Companion Backend shutting down...")
-    from app.database import close_connection
-    close_connection()
-    logger.info("MongoDB connection closed")
-
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(
@@ -0,0 +1,214 @@
+"""
+Chat Repository
+Async data access for the chats collection
+"""
+from typing import Optional, Dict, List, Tuple, AsyncIterator
+from datetime import datetime
+from bson import ObjectId
+from pymongo.errors import BulkWriteError
+import base64
+import json
+from app.database import get_database
+from app.repositories.chat_stats_repository import chat_stats_repository, COMPANION_GENDERS
+
+# Fields needed to feed chat history to the LLM; the newest N are found via
+# the (user_id, companion_gender, timestamp, _id) index declared in
+# app.database.INDEXES, so only those N documents are fetched
+CONTEXT_PROJECTION = {"_id": 0, "user_message": 1, "ai_response": 1, "timestamp": 1}
+
+# Keyset sort order for history pages; _id breaks timestamp ties
+HISTORY_SORT = [("timestamp", -1), ("_id", -1)]
+
+DUPLICATE_KEY_ERROR = 11000
+
+def encode_cursor(chat: Dict) -> str:
+    """Encode the (timestamp, _id) position of a chat as an opaque cursor"""
+    payload = json.dumps({"t": chat["timestamp"].isoformat(), "id": str(chat["_id"])})
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii")
+
+def decode_cursor(cursor: str) -> Tuple[datetime, ObjectId]:
+    """
+    Decode a cursor produced by encode_cursor
+
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        return datetime.fromisoformat(payload["t"]), ObjectId(payload["id"])
+    except Exception as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+class ChatRepository:
+    """Async repository for chat documents"""
+
+    @property
+    def collection(self):
+        """Motor collection for chats"""
+        return get_database()["chats"]
+
+    @staticmethod
+    def _build_query(user_id: str, companion_gender: Optional[str] = None) -> Dict:
+        """Build the user (and optional companion) filter"""
+        query = {"user_id": user_id}
+        if companion_gender:
+            query["companion_gender"] = companion_gender
+        return query
+
+    async def insert(self, chat_doc: Dict) -> ObjectId:
+        """Insert a chat document, update the user's counters and return its id"""
+        result = await self.collection.insert_one(chat_doc)
+        await chat_stats_repository.record_chat(
+            chat_doc["user_id"], chat_doc["companion_gender"], chat_doc["timestamp"]
+        )
+        return result.inserted_id
+
+    async def insert_many(self, chat_docs: List[Dict]) -> List[ObjectId]:
+        """
+        Insert a batch of chat documents (unordered) and update counters
+
+        Counters are still updated for the documents that were written if
+        the batch partially fails; the BulkWriteError is then re-raised.
+        A duplicate key means a retried document was written before, maybe
+        without being counted, so its user's counters are rebuilt.
+        """
+        try:
+            result = await self.collection.insert_many(chat_docs, ordered=False)
+        except BulkWriteError as e:
+            errors = e.details.get("writeErrors", [])
+            failed = {error["index"] for error in errors}
+            written = [chat for index, chat in enumerate(chat_docs) if index not in failed]
+            await chat_stats_repository.record_chats(written)
+            duplicate_users = {
+                chat_docs[error["index"]]["user_id"] for error in errors
+                if error.get("code") == DUPLICATE_KEY_ERROR
+            }
+            for user_id in duplicate_users:
+                await chat_stats_repository.rebuild(user_id)
+            raise
+        await chat_stats_repository.record_chats(chat_docs)
+        return result.inserted_ids
+
+    async def find_recent(
+        self,
+        user_id: str,
+        companion_gender: Optional[str] = None,
+        limit: int = 5,
+        projection: Optional[Dict] = None
+    ) -> List[Dict]:
+        """Return the most recent chats, newest first"""
+        cursor = self.collection.find(
+            self._build_query(user_id, companion_gender),
+            projection
+        ).sort("timestamp", -1).limit(limit)
+        return await cursor.to_list(length=limit)
+
+    async def find_between(
+        self,
+        user_id: str,
+        companion_gender: str,
+        after: Optional[datetime],
+        before: datetime,
+        limit: int,
+        projection: Optional[Dict] = None
+    ) -> List[Dict]:
+        """Return chats with after < timestamp < before, oldest first"""
+        timestamp_range = {"$lt": before}
+        if after:
+            timestamp_range["$gt"] = after
+        query = self._build_query(user_id, companion_gender)
+        query["timestamp"] = timestamp_range
+        cursor = self.collection.find(query, projection).sort("timestamp", 1).limit(limit)
+        return await cursor.to_list(length=limit)
+
+    def _history_cursor(
+        self,
+        user_id: str,
+        companion_gender: Optional[str],
+        after: Optional[Tuple[datetime, ObjectId]],
+        projection: Optional[Dict]
+    ):
+        """Motor cursor over history, newest first, starting after a keyset position"""
+        query = self._build_query(user_id, companion_gender)
+        if after:
+            timestamp, chat_id = after
+            query["$or"] = [
+                {"timestamp": {"$lt": timestamp}},
+                {"timestamp": timestamp, "_id": {"$lt": chat_id}}
+            ]
+        return self.collection.find(query, projection).sort(HISTORY_SORT)
+
+    async def find_page(
+        self,
+        user_id: str,
+        companion_gender: Optional[str] = None,
+        limit: int = 50,
+        after: Optional[Tuple[datetime, ObjectId]] = None,
+        projection: Optional[Dict] = None
+    ) -> Tuple[List[Dict], Optional[str]]:
+        """
+        Return one page of history and the cursor for the next page
+
+        Projections must keep timestamp and _id, which form the cursor.
+
+        Returns:
+            (chats, next_cursor) - next_cursor is None on the last page
+        """
+        cursor = self._history_cursor(user_id, companion_gender, after, projection).limit(limit + 1)
+        page = await cursor.to_list(length=limit + 1)
+
+        next_cursor = None
+        if len(page) > limit:
+            page = page[:limit]
+            next_cursor = encode_cursor(page[-1])
+        return page, next_cursor
+
+    async def iter_history(
+        self,
+        user_id: str,
+        companion_gender: Optional[str] = None,
+        after: Optional[Tuple[datetime, ObjectId]] = None,
+        projection: Optional[Dict] = None,
+        batch_size: int = 500
+    ) -> AsyncIterator[Dict]:
+        """Yield history documents one at a time as the server returns batches"""
+        cursor = self._history_cursor(user_id, companion_gender, after, projection).batch_size(batch_size)
+        async for chat in cursor:
+            yield chat
+
+    async def iter_since(
+        self,
+        user_id: str,
+        companion_gender: str,
+        after: Optional[datetime],
+        projection: Optional[Dict] = None,
+        batch_size: int = 1000
+    ) -> AsyncIterator[Dict]:
+        """Yield chats with timestamp > after (all if None), oldest first"""
+        query = self._build_query(user_id, companion_gender)
+        if after:
+            query["timestamp"] = {"$gt": after}
+        cursor = self.collection.find(query, projection).sort([("timestamp", 1), ("_id", 1)]).batch_size(batch_size)
+        async for chat in cursor:
+            yield chat
+
+    async def find_by_ids(self, chat_ids: List[ObjectId], projection: Optional[Dict] = None) -> List[Dict]:
+        """Return the chats with the given ids (in no particular order)"""
+        cursor = self.collection.find({"_id": {"$in": chat_ids}}, projection)
+        return await cursor.to_list(length=len(chat_ids))
+
+    async def delete_for_user(self, user_id: str, companion_gender: Optional[str] = None) -> int:
+        """Delete a user's chats and uncount them, returns number of deleted documents"""
+        # One delete per companion so the per-companion counters can be decremented
+        deleted = {}
+        for gender in [companion_gender] if companion_gender else COMPANION_GENDERS:
+            result = await self.collection.delete_many(self._build_query(user_id, gender))
+            deleted[gender] = result.deleted_count
+        if not companion_gender:
+            result = await self.collection.delete_many(self._build_query(user_id))
+            deleted[None] = result.deleted_count
+        await chat_stats_repository.record_deletion(user_id, deleted)
+        return sum(deleted.values())
+
+# Create singleton instance
+chat_repository = ChatRepository()
@@ -0,0 +1,216 @@
+"""
+Chat Stats Repository
+Per-user chat counters kept in the chat_stats collection
+
+Each chat insert bumps the counters with $inc/$max so /chat/stats is a
+single point read, and deletes subtract what they removed. Increments
+only apply to documents carrying the rebuilt marker, i.e. counters that
+were computed from the chats collection by rebuild() / rebuild_all();
+a user without one (new, or with chats from before the counters) is
+rebuilt instead. A rebuild replaces unmarked counters but only raises
+marked ones, so chats counted concurrently by record_chat are not lost.
+"""
+from typing import Optional, Dict, List
+from datetime import datetime
+from pymongo import ReturnDocument, UpdateOne
+from app.database import get_database
+
+COMPANION_GENDERS = ("boy", "girl")
+
+def _empty_stats() -> Dict:
+    """Counters for a user with no chats"""
+    stats = {"total_chats": 0, "last_chat_time": None}
+    for gender in COMPANION_GENDERS:
+        stats[f"{gender}_chats"] = 0
+    return stats
+
+def _rebuilt_stage(values: Dict) -> Dict:
+    """
+    Pipeline $set stage storing recomputed counters
+
+    Replaces the counters of an unmarked document; on a marked one each
+    value is only raised, never lowered below what increments counted.
+    """
+    stage = {
+        field: {"$cond": [{"$eq": ["$rebuilt", True]}, {"$max": [f"${field}", value]}, value]}
+        for field, value in values.items()
+    }
+    stage["rebuilt"] = True
+    return {"$set": stage}
+
+class ChatStatsRepository:
+    """Async repository for per-user chat counters"""
+
+    @property
+    def collection(self):
+        """Motor collection for chat stats"""
+        return get_database()["chat_stats"]
+
+    @property
+    def chats(self):
+        """Motor collection for chats (source of truth for rebuilds)"""
+        return get_database()["chats"]
+
+    async def record_chat(self, user_id: str, companion_gender: str, timestamp: datetime):
+        """Count one new chat for a user/companion (call after the chat is inserted)"""
+        result = await self.collection.update_one(
+            {"_id": user_id, "rebuilt": True},
+            {
+                "$inc": {"total_chats": 1, f"{companion_gender}_chats": 1},
+                "$max": {"last_chat_time": timestamp}
+            }
+        )
+        if result.matched_count == 0:
+            # Not counted yet: the rebuild includes the chat just inserted
+            await self.rebuild(user_id)
+
+    async def record_chats(self, chat_docs: List[Dict]):
+        """
+        Count a batch of new chats with one unordered bulk_write
+
+        Users whose counters are not rebuilt yet are rebuilt instead (the
+        marker is never removed, so checking it first is safe).
+        """
+        updates: Dict[str, Dict] = {}
+        for chat in chat_docs:
+            update = updates.setdefault(chat["user_id"], {"$inc": {"total_chats": 0}, "$max": {}})
+            update["$inc"]["total_chats"] += 1
+            gender_field = f"{chat['companion_gender']}_chats"
+            update["$inc"][gender_field] = update["$inc"].get(gender_field, 0) + 1
+            latest = update["$max"].get("last_chat_time")
+            if latest is None or chat["timestamp"] > latest:
+                update["$max"]["last_chat_time"] = chat["timestamp"]
+
+        if not updates:
+            return
+
+        counted = {
+            stats["_id"]
+            async for stats in self.collection.find(
+                {"_id": {"$in": list(updates)}, "rebuilt": True}, {"_id": 1}
+            )
+        }
+        if counted:
+            await self.collection.bulk_write(
+                [
+                    UpdateOne({"_id": user_id, "rebuilt": True}, updates[user_id])
+                    for user_id in counted
+                ],
+                ordered=False
+            )
+        for user_id in updates:
+            if user_id not in counted:
+                await self.rebuild(user_id)
+
+    async def record_deletion(self, user_id: str, deleted: Dict[Optional[str], int]):
+        """
+        Uncount deleted chats
+
+        Decrements commute with concurrent record_chat increments, so a chat
+        saved while history is being cleared stays counted. last_chat_time
+        is then moved back with a compare-and-set that leaves it alone if a
+        new chat has advanced it meanwhile.
+
+        Args:
+            user_id: User whose chats were deleted
+            deleted: Deleted count per companion gender
+        """
+        total = sum(deleted.values())
+        if not total:
+            return
+
+        decrement = {"total_chats": -total}
+        for gender, count in deleted.items():
+            if gender in COMPANION_GENDERS:
+                decrement[f"{gender}_chats"] = -count
+        before = await self.collection.find_one_and_update(
+            {"_id": user_id, "rebuilt": True},
+            {"$inc": decrement}
+        )
+        if before is None:
+            return  # Not counted yet; rebuilt on the next read or chat
+
+        latest = await self.chats.find_one(
+            {"user_id": user_id}, {"timestamp": 1}, sort=[("timestamp", -1), ("_id", -1)]
+        )
+        update = (
+            {"$set": {"last_chat_time": latest["timestamp"]}}
+            if latest else {"$unset": {"last_chat_time": ""}}
+        )
+        await self.collection.update_one(
+            {"_id": user_id, "last_chat_time": before.get("last_chat_time")},
+            update
+        )
+
+    async def get(self, user_id: str) -> Optional[Dict]:
+        """Point read of a user's counters"""
+        return await self.collection.find_one({"_id": user_id})
+
+    async def rebuild(self, user_id: str) -> Dict:
+        """
+        Recompute one user's counters with a single $facet aggregation
+
+        Returns:
+            The stored stats document
+        """
+        pipeline = [
+            {"$match": {"user_id": user_id}},
+            {"$facet": {
+                "by_companion": [
+                    {"$group": {"_id": "$companion_gender", "count": {"$sum": 1}}}
+                ],
+                "latest": [
+                    {"$sort": {"timestamp": -1}},
+                    {"$limit": 1},
+                    {"$project": {"_id": 0, "timestamp": 1}}
+                ]
+            }}
+        ]
+        result = await self.chats.aggregate(pipeline).to_list(length=1)
+        facets = result[0] if result else {"by_companion": [], "latest": []}
+
+        stats = _empty_stats()
+        for bucket in facets["by_companion"]:
+            stats["total_chats"] += bucket["count"]
+            if bucket["_id"] in COMPANION_GENDERS:
+                stats[f"{bucket['_id']}_chats"] = bucket["count"]
+        if facets["latest"]:
+            stats["last_chat_time"] = facets["latest"][0]["timestamp"]
+
+        return await self.collection.find_one_and_update(
+            {"_id": user_id},
+            [_rebuilt_stage(stats)],
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+
+    async def rebuild_all(self):
+        """
+        Recompute counters for every user in one server-side aggregation
+
+        Run once by setup_database.py so users with existing chats are
+        counted before their next chat.
+        """
+        group = {
+            "_id": "$user_id",
+            "total_chats": {"$sum": 1},
+            "last_chat_time": {"$max": "$timestamp"}
+        }
+        for gender in COMPANION_GENDERS:
+            group[f"{gender}_chats"] = {
+                "$sum": {"$cond": [{"$eq": ["$companion_gender", gender]}, 1, 0]}
+            }
+
+        pipeline = [
+            {"$group": group},
+            {"$set": {"rebuilt": True}},
+            {"$merge": {
+                "into": "chat_stats",
+                "whenMatched": [_rebuilt_stage({field: f"$$new.{field}" for field in group if field != "_id"})],
+                "whenNotMatched": "insert"
+            }}
+        ]
+        await self.chats.aggregate(pipeline).to_list(length=None)
+
+# Create singleton instance
+chat_stats_repository = ChatStatsRepository()
@@ -0,0 +1,40 @@
+"""
+Companion Repository
+Async data access for the companions collection
+"""
+from typing import Optional, Dict, List
+from bson import ObjectId
+from app.database import get_database
+
+class CompanionRepository:
+    """Async repository for companion documents"""
+
+    @property
+    def collection(self):
+        """Motor collection for companions"""
+        return get_database()["companions"]
+
+    async def find_by_gender(self, gender: str) -> Optional[Dict]:
+        """Find the companion for a gender ('boy' or 'girl')"""
+        return await self.collection.find_one({"gender": gender})
+
+    async def find_by_id(self, companion_id: str) -> Optional[Dict]:
+        """Find a companion by ObjectId string (raises bson InvalidId on bad ids)"""
+        return await self.collection.find_one({"_id": ObjectId(companion_id)})
+
+    async def find_all(self) -> List[Dict]:
+        """Return all companions"""
+        return await self.collection.find({}).to_list(length=None)
+
+    async def insert(self, companion_doc: Dict) -> ObjectId:
+        """Insert a companion document and return its id"""
+        result = await self.collection.insert_one(companion_doc)
+        return result.inserted_id
+
+    async def delete(self, companion_id: str) -> int:
+        """Delete a companion, returns number of deleted documents"""
+        result = await self.collection.delete_one({"_id": ObjectId(companion_id)})
+        return result.deleted_count
+
+# Create singleton instance
+companion_repository = CompanionRepository()
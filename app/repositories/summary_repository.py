@@ -0,0 +1,59 @@
+"""
+Summary Repository
+Rolling per-conversation summaries kept in the conversation_summaries collection
+
+One document per (user, companion): the summary text and the timestamp
+of the newest chat it covers, so each refresh only has to read the
+chats written since.
+"""
+from typing import Optional, Dict
+from datetime import datetime
+from app.database import get_database
+
+class SummaryRepository:
+    """Async repository for conversation summaries"""
+
+    @property
+    def collection(self):
+        """Motor collection for conversation summaries"""
+        return get_database()["conversation_summaries"]
+
+    async def get(self, user_id: str, companion_gender: str) -> Optional[Dict]:
+        """Point read of a conversation's summary"""
+        return await self.collection.find_one(
+            {"user_id": user_id, "companion_gender": companion_gender},
+            {"_id": 0}
+        )
+
+    async def save(
+        self,
+        user_id: str,
+        companion_gender: str,
+        summary: str,
+        summarized_until: datetime,
+        summarized_turns: int
+    ):
+        """Store a refreshed summary and advance its high-water mark"""
+        await self.collection.update_one(
+            {"user_id": user_id, "companion_gender": companion_gender},
+            {
+                "$set": {
+                    "summary": summary,
+                    "summarized_until": summarized_until,
+                    "updated_at": datetime.utcnow()
+                },
+                "$inc": {"summarized_turns": summarized_turns}
+            },
+            upsert=True
+        )
+
+    async def delete_for_user(self, user_id: str, companion_gender: Optional[str] = None) -> int:
+        """Delete a user's summaries, returns number of deleted documents"""
+        query = {"user_id": user_id}
+        if companion_gender:
+            query["companion_gender"] = companion_gender
+        result = await self.collection.delete_many(query)
+        return result.deleted_count
+
+# Create singleton instance
+summary_repository = SummaryRepository()
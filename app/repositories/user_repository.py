@@ -0,0 +1,42 @@
+"""
+User Repository
+Async data access for the users collection
+"""
+from typing import Optional, Dict, List
+from bson import ObjectId
+from app.database import get_database
+
+class UserRepository:
+    """Async repository for user documents"""
+
+    @property
+    def collection(self):
+        """Motor collection for users"""
+        return get_database()["users"]
+
+    async def find_by_id(self, user_id: str) -> Optional[Dict]:
+        """Find a user by ObjectId string (raises bson InvalidId on bad ids)"""
+        return await self.collection.find_one({"_id": ObjectId(user_id)})
+
+    async def find_by_email(self, email: str) -> Optional[Dict]:
+        """Find a user by email address"""
+        return await self.collection.find_one({"email": email})
+
+    async def insert(self, user_doc: Dict) -> ObjectId:
+        """Insert a user document and return its id"""
+        result = await self.collection.insert_one(user_doc)
+        return result.inserted_id
+
+    async def update_fields(self, user_id, fields: Dict) -> int:
+        """Set fields on a user, returns number of modified documents"""
+        if not isinstance(user_id, ObjectId):
+            user_id = ObjectId(user_id)
+        result = await self.collection.update_one({"_id": user_id}, {"$set": fields})
+        return result.modified_count
+
+    async def find_all(self) -> List[Dict]:
+        """Return all users"""
+        return await self.collection.find({}).to_list(length=None)
+
+# Create singleton instance
+user_repository = UserRepository()
@@ -23,7 +23,7 @@ async def signup(user_data: UserCreate):
         User ID and success message
     """
     try:
-        result = user_service.create_user(user_data)
+        result = await user_service.create_user(user_data)
         return result
     except ValueError as e:
         logger.warning(f"Signup failed: {str(e)}")
@@ -50,7 +50,7 @@ async def login(login_data: UserLogin):
         User information and session data
     """
     try:
-        result = user_service.login_user(login_data)
+        result = await user_service.login_user(login_data)
         return result
     except ValueError as e:
         logger.warning(f"Login failed: {str(e)}")
@@ -76,7 +76,7 @@ async def get_user(user_id: str):
     Returns:
         User information
     """
-    user = user_service.get_user_by_id(user_id)
+    user = await user_service.get_user_by_id(user_id)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -93,7 +93,7 @@ async def get_all_users():
         List of all users
     """
     try:
-        users = user_service.get_all_users()
+        users = await user_service.get_all_users()
         return {"users": users, "count": len(users)}
     except Exception as e:
         logger.error(f"Error fetching users: {str(e)}")
@@ -3,12 +3,24 @@ Chat Routes
 Handles chat conversations between users and AI companions
 """
 from fastapi import APIRouter, HTTPException, status, Query
-from app.database import chats, companions, users
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
+from app.repositories.chat_repository import chat_repository, decode_cursor
+from app.repositories.chat_stats_repository import chat_stats_repository
+from app.repositories.user_repository import user_repository
+from app.services.chat_persistence_service import chat_persistence_service
+from app.services.companion_catalog import companion_catalog
+from app.services.conversation_history import conversation_history
+from app.services.conversation_summary import conversation_summary
+from app.services.long_term_memory import long_term_memory
 from app.models.chat_model import ChatMessage, ChatResponse
 from app.services.ai_service import ai_service
-from bson import ObjectId
+from app.services.ai_service_enhanced import enhanced_ai_service
 from datetime import datetime
+from typing import Optional, Dict
+import json
 import logging
+import time
 
 logger = logging.getLogger(__name__)
 
@@ -27,7 +39,7 @@ async def send_message(chat_data: ChatMessage):
     """
     try:
         # Verify user exists
-        user = users.find_one({"_id": ObjectId(chat_data.user_id)})
+        user = await user_repository.find_by_id(chat_data.user_id)
         if not user:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -35,7 +47,7 @@ async def send_message(chat_data: ChatMessage):
             )
         
         # Get companion information
-        companion = companions.find_one({"gender": chat_data.companion_gender})
+        companion = await companion_catalog.get_by_gender(chat_data.companion_gender)
         if not companion:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -44,6 +56,7 @@ async def send_message(chat_data: ChatMessage):
         
         # Prepare companion context
         companion_context = {
+            "companion_id": str(companion["_id"]),
             "backstory": companion.get("backstory", "Friendly AI companion."),
             "personality_traits": companion.get("personality_traits", []),
             "interests": companion.get("interests", []),
@@ -51,9 +64,9 @@ async def send_message(chat_data: ChatMessage):
         }
         
         # Get recent chat history for context (last 5 messages)
-        recent_chats = list(chats.find(
-            {"user_id": chat_data.user_id, "companion_gender": chat_data.companion_gender}
-        ).sort("timestamp", -1).limit(5))
+        recent_chats = await conversation_history.get_recent(
+            chat_data.user_id, chat_data.companion_gender
+        )
         
         companion_context["chat_history"] = recent_chats
         
@@ -76,13 +89,22 @@ async def send_message(chat_data: ChatMessage):
             "metadata": {}
         }
         
-        result = chats.insert_one(chat_doc)
+        chat_id = await chat_persistence_service.save(chat_doc)
+        conversation_history.append(
+            chat_data.user_id, chat_data.companion_gender,
+            chat_doc["user_message"], chat_doc["ai_response"], chat_doc["timestamp"]
+        )
+        conversation_summary.note_turn(chat_data.user_id, chat_data.companion_gender)
+        long_term_memory.add(
+            chat_data.user_id, chat_data.companion_gender, chat_id,
+            chat_doc["user_message"], chat_doc["ai_response"]
+        )
         
         logger.info(f"Chat saved: User {chat_data.user_id} -> {companion.get('name')}")
         
         # Return response
         return ChatResponse(
-            chat_id=str(result.inserted_id),
+            chat_id=str(chat_id),
             user_id=chat_data.user_id,
             companion_name=companion.get("name", "AI Companion"),
             user_message=chat_data.message,
@@ -99,41 +121,228 @@ async def send_message(chat_data: ChatMessage):
             detail=f"Failed to process chat: {str(e)}"
         )
 
+# Fields clients may request through the history "fields" parameter
+HISTORY_FIELDS = {
+    "user_id", "companion_id", "companion_name", "companion_gender",
+    "user_message", "ai_response", "timestamp", "sentiment",
+    "interaction_type", "metadata"
+}
+
+def _build_history_projection(fields: Optional[str]) -> Optional[Dict]:
+    """Turn a comma-separated field list into a projection (timestamp/_id always kept for cursors)"""
+    if not fields:
+        return None
+    
+    requested = {field.strip() for field in fields.split(",") if field.strip()}
+    unknown = requested - HISTORY_FIELDS
+    if unknown:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown history fields: {', '.join(sorted(unknown))}"
+        )
+    
+    projection = {field: 1 for field in requested}
+    projection["timestamp"] = 1
+    return projection
+
+def _serialize_chat(chat: Dict) -> Dict:
+    """Replace the ObjectId with a chat_id string"""
+    chat["chat_id"] = str(chat["_id"])
+    del chat["_id"]
+    return chat
+
+def sse_event(event: str, data: Dict) -> str:
+    """Format one Server-Sent Event"""
+    return f"event: {event}\ndata: {json.dumps(jsonable_encoder(data))}\n\n"
+
+@router.post("/stream")
+async def stream_message(chat_data: ChatMessage):
+    """
+    Send a message and stream the AI response as Server-Sent Events
+    
+    Events:
+        start: {"companion_name"}
+        token: {"delta"} - one per text delta as the model produces it
+        done:  {"chat_id", "ai_response", "timestamp", "first_token_ms", "total_ms"}
+        error: {"detail"}
+    
+    The turn is saved once the stream completes.
+    
+    Args:
+        chat_data: Chat message data (user_id, companion_gender, message)
+    """
+    started = time.perf_counter()
+    try:
+        # Verify user exists
+        user = await user_repository.find_by_id(chat_data.user_id)
+        if not user:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"User with ID {chat_data.user_id} not found"
+            )
+        
+        # Get companion information
+        companion = await companion_catalog.get_by_gender(chat_data.companion_gender)
+        if not companion:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"No {chat_data.companion_gender} companion found. Please add one to the database."
+            )
+        
+        # Prepare companion context
+        companion_context = {
+            "companion_id": str(companion["_id"]),
+            "backstory": companion.get("backstory", "Friendly AI companion."),
+            "personality_traits": companion.get("personality_traits", []),
+            "interests": companion.get("interests", []),
+            "name": companion.get("name", "AI Companion")
+        }
+        companion_context["chat_history"] = await conversation_history.get_recent(
+            chat_data.user_id, chat_data.companion_gender
+        )
+        companion_context["summary"] = await conversation_summary.get(
+            chat_data.user_id, chat_data.companion_gender
+        )
+        companion_context["memories"] = await long_term_memory.recall(
+            chat_data.user_id, chat_data.companion_gender, chat_data.message
+        )
+    
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error in chat stream: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to process chat: {str(e)}"
+        )
+    
+    async def event_stream():
+        yield sse_event("start", {"companion_name": companion_context["name"]})
+        
+        parts = []
+        first_token_at = None
+        try:
+            async for delta in enhanced_ai_service.stream_contextual_response(
+                prompt=chat_data.message,
+                companion_context=companion_context
+            ):
+                if first_token_at is None:
+                    first_token_at = time.perf_counter()
+                parts.append(delta)
+                yield sse_event("token", {"delta": delta})
+            
+            # Store completed turn
+            chat_doc = {
+                "user_id": chat_data.user_id,
+                "companion_id": companion_context["companion_id"],
+                "companion_name": companion_context["name"],
+                "companion_gender": chat_data.companion_gender,
+                "user_message": chat_data.message,
+                "ai_response": "".join(parts),
+                "timestamp": datetime.utcnow(),
+                "sentiment": ai_service.analyze_sentiment(chat_data.message),
+                "metadata": {"streamed": True}
+            }
+            chat_id = await chat_persistence_service.save(chat_doc)
+            conversation_history.append(
+                chat_data.user_id, chat_data.companion_gender,
+                chat_doc["user_message"], chat_doc["ai_response"], chat_doc["timestamp"]
+            )
+            conversation_summary.note_turn(chat_data.user_id, chat_data.companion_gender)
+            long_term_memory.add(
+                chat_data.user_id, chat_data.companion_gender, chat_id,
+                chat_doc["user_message"], chat_doc["ai_response"]
+            )
+            
+            first_token_ms = round(((first_token_at or time.perf_counter()) - started) * 1000, 1)
+            total_ms = round((time.perf_counter() - started) * 1000, 1)
+            logger.info(
+                f"Chat streamed: User {chat_data.user_id} -> {companion_context['name']} "
+                f"(first token {first_token_ms} ms, total {total_ms} ms)"
+            )
+            
+            yield sse_event("done", {
+                "chat_id": str(chat_id),
+                "ai_response": chat_doc["ai_response"],
+                "timestamp": chat_doc["timestamp"],
+                "first_token_ms": first_token_ms,
+                "total_ms": total_ms
+            })
+        except Exception as e:
+            logger.error(f"Error in chat stream: {str(e)}")
+            yield sse_event("error", {"detail": "Failed to process chat"})
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @router.get("/history/{user_id}")
 async def get_chat_history(
     user_id: str,
     companion_gender: str = Query(None, description="Filter by companion gender"),
-    limit: int = Query(50, le=100, description="Number of messages to retrieve")
+    limit: int = Query(50, ge=1, le=100, description="Number of messages to retrieve"),
+    cursor: Optional[str] = Query(None, description="next_cursor from a previous page"),
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return"),
+    format: str = Query("json", pattern="^(json|ndjson)$", description="'ndjson' streams the whole history")
 ):
     """
-    Get chat history for a user
+    Get chat history for a user, newest first
+    
+    Pages are keyed on (timestamp, _id): pass the returned next_cursor to
+    fetch older messages. With format=ndjson every remaining message is
+    streamed one JSON document per line as the database returns it, and
+    limit is ignored.
     
     Args:
         user_id: User's MongoDB ObjectId
         companion_gender: Optional filter by companion gender
-        limit: Maximum number of messages to retrieve
+        limit: Maximum number of messages per page
+        cursor: Opaque position to continue from
+        fields: Optional projection (e.g. "user_message,ai_response")
+        format: 'json' for a page, 'ndjson' for a streamed export
         
     Returns:
-        Chat history
+        Chat history page with next_cursor, or an NDJSON stream
     """
     try:
-        # Build query
-        query = {"user_id": user_id}
-        if companion_gender:
-            query["companion_gender"] = companion_gender
+        after = decode_cursor(cursor) if cursor else None
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    projection = _build_history_projection(fields)
+    
+    if format == "ndjson":
+        async def export_lines():
+            try:
+                async for chat in chat_repository.iter_history(
+                    user_id, companion_gender, after=after, projection=projection
+                ):
+                    yield json.dumps(jsonable_encoder(_serialize_chat(chat))) + "\n"
+            except Exception as e:
+                logger.error(f"Error streaming chat history: {str(e)}")
+                raise
         
-        # Get chat history
-        chat_history = list(chats.find(query).sort("timestamp", -1).limit(limit))
+        return StreamingResponse(export_lines(), media_type="application/x-ndjson")
+    
+    try:
+        # Get one page of chat history
+        chat_history, next_cursor = await chat_repository.find_page(
+            user_id, companion_gender, limit=limit, after=after, projection=projection
+        )
         
         # Convert ObjectIds to strings
         for chat in chat_history:
-            chat["chat_id"] = str(chat["_id"])
-            del chat["_id"]
+            _serialize_chat(chat)
         
         return {
             "user_id": user_id,
             "chat_count": len(chat_history),
-            "chats": chat_history
+            "chats": chat_history,
+            "next_cursor": next_cursor
         }
     
     except Exception as e:
@@ -159,19 +368,20 @@ async def clear_chat_history(
         Success message with deletion count
     """
     try:
-        # Build query
-        query = {"user_id": user_id}
-        if companion_gender:
-            query["companion_gender"] = companion_gender
+        # Write buffered chats first so they cannot reappear after the clear
+        await chat_persistence_service.flush()
         
         # Delete chats
-        result = chats.delete_many(query)
+        deleted_count = await chat_repository.delete_for_user(user_id, companion_gender)
+        conversation_history.invalidate(user_id, companion_gender)
+        await conversation_summary.clear(user_id, companion_gender)
+        long_term_memory.invalidate(user_id, companion_gender)
         
-        logger.info(f"Cleared {result.deleted_count} chats for user {user_id}")
+        logger.info(f"Cleared {deleted_count} chats for user {user_id}")
         
         return {
             "message": "Chat history cleared successfully",
-            "deleted_count": result.deleted_count
+            "deleted_count": deleted_count
         }
     
     except Exception as e:
@@ -193,22 +403,17 @@ async def get_chat_stats(user_id: str):
         Chat statistics
     """
     try:
-        # Total chats
-        total_chats = chats.count_documents({"user_id": user_id})
-        
-        # Chats by companion
-        boy_chats = chats.count_documents({"user_id": user_id, "companion_gender": "boy"})
-        girl_chats = chats.count_documents({"user_id": user_id, "companion_gender": "girl"})
-        
-        # Most recent chat
-        recent_chat = chats.find_one({"user_id": user_id}, sort=[("timestamp", -1)])
+        # Counters are maintained on insert/delete; rebuild once for users that predate them
+        stats = await chat_stats_repository.get(user_id)
+        if stats is None or not stats.get("rebuilt"):
+            stats = await chat_stats_repository.rebuild(user_id)
         
         return {
             "user_id": user_id,
-            "total_chats": total_chats,
-            "boy_chats": boy_chats,
-            "girl_chats": girl_chats,
-            "last_chat_time": recent_chat["timestamp"] if recent_chat else None
+            "total_chats": stats.get("total_chats", 0),
+            "boy_chats": stats.get("boy_chats", 0),
+            "girl_chats": stats.get("girl_chats", 0),
+            "last_chat_time": stats.get("last_chat_time")
         }
     
     except Exception as e:
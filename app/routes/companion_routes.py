@@ -3,9 +3,9 @@ Companion Routes
 Handles AI companion information and backstories
 """
 from fastapi import APIRouter, HTTPException, status
-from app.database import companions
+from app.repositories.companion_repository import companion_repository
+from app.services.companion_catalog import companion_catalog
 from app.models.companion_model import CompanionCreate, CompanionResponse
-from bson import ObjectId
 import logging
 
 logger = logging.getLogger(__name__)
@@ -29,7 +29,7 @@ async def get_companion_story(gender: str):
             detail="Gender must be 'boy' or 'girl'"
         )
     
-    companion = companions.find_one({"gender": gender})
+    companion = await companion_catalog.get_by_gender(gender)
     
     if not companion:
         raise HTTPException(
@@ -51,7 +51,7 @@ async def get_all_companions():
     Returns:
         List of all companions
     """
-    all_companions = list(companions.find({}))
+    all_companions = await companion_catalog.get_all()
     
     for companion in all_companions:
         companion["companion_id"] = str(companion["_id"])
@@ -72,7 +72,7 @@ async def create_companion(companion_data: CompanionCreate):
     """
     try:
         # Check if companion with this gender already exists
-        existing = companions.find_one({"gender": companion_data.gender})
+        existing = await companion_catalog.get_by_gender(companion_data.gender)
         if existing:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
@@ -80,12 +80,13 @@ async def create_companion(companion_data: CompanionCreate):
             )
         
         # Insert companion
-        result = companions.insert_one(companion_data.model_dump())
+        companion_id = await companion_repository.insert(companion_data.model_dump())
+        await companion_catalog.refresh()
         
         logger.info(f"Companion created: {companion_data.name} ({companion_data.gender})")
         
         return {
-            "companion_id": str(result.inserted_id),
+            "companion_id": str(companion_id),
             "message": "Companion created successfully",
             "name": companion_data.name
         }
@@ -110,7 +111,7 @@ async def get_companion_by_id(companion_id: str):
         Companion information
     """
     try:
-        companion = companions.find_one({"_id": ObjectId(companion_id)})
+        companion = await companion_catalog.get_by_id(companion_id)
         
         if not companion:
             raise HTTPException(
@@ -122,6 +123,8 @@ async def get_companion_by_id(companion_id: str):
         del companion["_id"]
         
         return companion
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error fetching companion: {str(e)}")
         raise HTTPException(
@@ -141,9 +144,10 @@ async def delete_companion(companion_id: str):
         Success message
     """
     try:
-        result = companions.delete_one({"_id": ObjectId(companion_id)})
+        deleted_count = await companion_repository.delete(companion_id)
+        await companion_catalog.refresh()
         
-        if result.deleted_count == 0:
+        if deleted_count == 0:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail=f"Companion with ID {companion_id} not found"
@@ -2,24 +2,39 @@
 Voice Routes
 Handles voice-based interactions: speech-to-text, text-to-speech, voice chat
 """
-from fastapi import APIRouter, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, WebSocket, status
 from fastapi.responses import StreamingResponse, Response
 from pydantic import BaseModel
 from typing import Optional
+import base64
 import logging
 import io
+import time
 
-from app.database import chats, companions, users
+from app.repositories.user_repository import user_repository
+from app.services.admission import AdmissionTimeoutError, Priority, request_priority
+from app.services.chat_persistence_service import chat_persistence_service
+from app.services.companion_catalog import companion_catalog
+from app.services.conversation_history import conversation_history
+from app.services.conversation_summary import conversation_summary
+from app.services.long_term_memory import long_term_memory
+from app.services.sentiment import classify_sentiment
 from app.models.chat_model import ChatMessage
 from app.services.ai_service_enhanced import enhanced_ai_service
 from app.services.tts_service import tts_service
+from app.services.voice_pipeline import run_voice_pipeline
+from app.services.voice_session import VoiceSession
+from app.routes.chat_routes import sse_event
 from app.config import settings
-from bson import ObjectId
 from datetime import datetime
 
 logger = logging.getLogger(__name__)
 
-router = APIRouter()
+async def voice_priority():
+    """Voice LLM/TTS calls are admitted ahead of chat and background work"""
+    request_priority.set(Priority.VOICE)
+
+router = APIRouter(dependencies=[Depends(voice_priority)])
 
 class VoiceChatRequest(BaseModel):
     """Request model for voice chat"""
@@ -51,7 +66,7 @@ async def voice_chat(chat_data: VoiceChatRequest):
     """
     try:
         # Verify user exists
-        user = users.find_one({"_id": ObjectId(chat_data.user_id)})
+        user = await user_repository.find_by_id(chat_data.user_id)
         if not user:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -59,7 +74,7 @@ async def voice_chat(chat_data: VoiceChatRequest):
             )
         
         # Get companion information
-        companion = companions.find_one({"gender": chat_data.companion_gender})
+        companion = await companion_catalog.get_by_gender(chat_data.companion_gender)
         if not companion:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -68,6 +83,7 @@ async def voice_chat(chat_data: VoiceChatRequest):
         
         # Prepare companion context
         companion_context = {
+            "companion_id": str(companion["_id"]),
             "backstory": companion.get("backstory", "Friendly AI companion."),
             "personality_traits": companion.get("personality_traits", []),
             "interests": companion.get("interests", []),
@@ -75,14 +91,20 @@ async def voice_chat(chat_data: VoiceChatRequest):
         }
         
         # Get recent chat history for context
-        recent_chats = list(chats.find(
-            {"user_id": chat_data.user_id, "companion_gender": chat_data.companion_gender}
-        ).sort("timestamp", -1).limit(5))
+        recent_chats = await conversation_history.get_recent(
+            chat_data.user_id, chat_data.companion_gender
+        )
         
         companion_context["chat_history"] = recent_chats
+        companion_context["summary"] = await conversation_summary.get(
+            chat_data.user_id, chat_data.companion_gender
+        )
+        companion_context["memories"] = await long_term_memory.recall(
+            chat_data.user_id, chat_data.companion_gender, chat_data.message
+        )
         
         # Generate AI response using enhanced AI service
-        ai_response_text = enhanced_ai_service.generate_contextual_response(
+        ai_response_text = await enhanced_ai_service.generate_contextual_response(
             prompt=chat_data.message,
             companion_context=companion_context
         )
@@ -108,17 +130,27 @@ async def voice_chat(chat_data: VoiceChatRequest):
             "ai_response": ai_response_text,
             "timestamp": datetime.utcnow(),
             "interaction_type": "voice",
+            "sentiment": classify_sentiment(chat_data.message),
             "metadata": {
                 "voice_used": chat_data.voice
             }
         }
         
-        result = chats.insert_one(chat_doc)
+        chat_id = await chat_persistence_service.save(chat_doc)
+        conversation_history.append(
+            chat_data.user_id, chat_data.companion_gender,
+            chat_doc["user_message"], chat_doc["ai_response"], chat_doc["timestamp"]
+        )
+        conversation_summary.note_turn(chat_data.user_id, chat_data.companion_gender)
+        long_term_memory.add(
+            chat_data.user_id, chat_data.companion_gender, chat_id,
+            chat_doc["user_message"], chat_doc["ai_response"]
+        )
         
         logger.info(f"Voice chat completed: User {chat_data.user_id} -> {companion.get('name')}")
         
         return VoiceChatResponse(
-            chat_id=str(result.inserted_id),
+            chat_id=str(chat_id),
             user_id=chat_data.user_id,
             companion_name=companion.get("name", "AI Companion"),
             user_message=chat_data.message,
@@ -129,6 +161,12 @@ async def voice_chat(chat_data: VoiceChatRequest):
     
     except HTTPException:
         raise
+    except AdmissionTimeoutError as e:
+        logger.warning(f"Voice chat rejected, provider overloaded: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Voice service is busy, please retry"
+        )
     except Exception as e:
         logger.error(f"Voice chat error: {str(e)}")
         raise HTTPException(
@@ -136,6 +174,224 @@ async def voice_chat(chat_data: VoiceChatRequest):
             detail=f"Voice chat failed: {str(e)}"
         )
 
+@router.post("/chat/stream")
+async def voice_chat_stream(chat_data: VoiceChatRequest):
+    """
+    Pipelined voice chat - streams text and per-sentence audio as Server-Sent Events
+    
+    The LLM response is streamed and cut into sentences; each sentence is
+    synthesized while later tokens are still generating, and audio
+    segments are sent in order as soon as each is ready.
+    
+    Events:
+        start: {"companion_name", "tts_available"}
+        token: {"delta"}
+        audio: {"index", "text", "audio_base64"} - MP3 per sentence, in order
+        done:  {"chat_id", "ai_response", "timestamp", "first_token_ms", "first_audio_ms", "total_ms"}
+        error: {"detail"}
+    """
+    started = time.perf_counter()
+    try:
+        # Verify user exists
+        user = await user_repository.find_by_id(chat_data.user_id)
+        if not user:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"User with ID {chat_data.user_id} not found"
+            )
+        
+        # Get companion information
+        companion = await companion_catalog.get_by_gender(chat_data.companion_gender)
+        if not companion:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"No {chat_data.companion_gender} companion found"
+            )
+        
+        # Prepare companion context
+        companion_context = {
+            "companion_id": str(companion["_id"]),
+            "backstory": companion.get("backstory", "Friendly AI companion."),
+            "personality_traits": companion.get("personality_traits", []),
+            "interests": companion.get("interests", []),
+            "name": companion.get("name", "AI Companion")
+        }
+        companion_context["chat_history"] = await conversation_history.get_recent(
+            chat_data.user_id, chat_data.companion_gender
+        )
+        companion_context["summary"] = await conversation_summary.get(
+            chat_data.user_id, chat_data.companion_gender
+        )
+        companion_context["memories"] = await long_term_memory.recall(
+            chat_data.user_id, chat_data.companion_gender, chat_data.message
+        )
+    
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Voice chat stream error: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Voice chat failed: {str(e)}"
+        )
+    
+    synthesize = None
+    if tts_service.is_available():
+        async def synthesize(sentence: str) -> bytes:
+            return await tts_service.text_to_speech(
+                text=sentence,
+                voice=chat_data.voice,
+                gender=chat_data.companion_gender
+            )
+    
+    async def event_stream():
+        yield sse_event("start", {
+            "companion_name": companion_context["name"],
+            "tts_available": synthesize is not None
+        })
+        
+        parts = []
+        first_token_at = None
+        first_audio_at = None
+        try:
+            text_deltas = enhanced_ai_service.stream_contextual_response(
+                prompt=chat_data.message,
+                companion_context=companion_context
+            )
+            async for event in run_voice_pipeline(
+                text_deltas, synthesize, queue_size=settings.voice_pipeline_queue_size
+            ):
+                if event["type"] == "token":
+                    if first_token_at is None:
+                        first_token_at = time.perf_counter()
+                    parts.append(event["delta"])
+                    yield sse_event("token", {"delta": event["delta"]})
+                else:
+                    if first_audio_at is None and event["audio"]:
+                        first_audio_at = time.perf_counter()
+                    yield sse_event("audio", {
+                        "index": event["index"],
+                        "text": event["text"],
+                        "audio_base64": base64.b64encode(event["audio"]).decode("utf-8")
+                    })
+            
+            # Store completed turn
+            chat_doc = {
+                "user_id": chat_data.user_id,
+                "companion_id": companion_context["companion_id"],
+                "companion_name": companion_context["name"],
+                "companion_gender": chat_data.companion_gender,
+                "user_message": chat_data.message,
+                "ai_response": "".join(parts),
+                "timestamp": datetime.utcnow(),
+                "interaction_type": "voice",
+                "sentiment": classify_sentiment(chat_data.message),
+                "metadata": {
+                    "voice_used": chat_data.voice,
+                    "pipelined": True
+                }
+            }
+            chat_id = await chat_persistence_service.save(chat_doc)
+            conversation_history.append(
+                chat_data.user_id, chat_data.companion_gender,
+                chat_doc["user_message"], chat_doc["ai_response"], chat_doc["timestamp"]
+            )
+            conversation_summary.note_turn(chat_data.user_id, chat_data.companion_gender)
+            long_term_memory.add(
+                chat_data.user_id, chat_data.companion_gender, chat_id,
+                chat_doc["user_message"], chat_doc["ai_response"]
+            )
+            
+            def elapsed_ms(moment):
+                return round((moment - started) * 1000, 1) if moment else None
+            
+            total_ms = elapsed_ms(time.perf_counter())
+            logger.info(
+                f"Voice chat streamed: User {chat_data.user_id} -> {companion_context['name']} "
+                f"(first token {elapsed_ms(first_token_at)} ms, first audio {elapsed_ms(first_audio_at)} ms, "
+                f"total {total_ms} ms)"
+            )
+            
+            yield sse_event("done", {
+                "chat_id": str(chat_id),
+                "ai_response": chat_doc["ai_response"],
+                "timestamp": chat_doc["timestamp"],
+                "first_token_ms": elapsed_ms(first_token_at),
+                "first_audio_ms": elapsed_ms(first_audio_at),
+                "total_ms": total_ms
+            })
+        except Exception as e:
+            logger.error(f"Voice chat stream error: {str(e)}")
+            yield sse_event("error", {"detail": "Voice chat failed"})
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.websocket("/ws")
+async def voice_session_socket(
+    websocket: WebSocket,
+    user_id: str,
+    companion_gender: str,
+    voice: Optional[str] = None
+):
+    """
+    Persistent voice session over WebSocket
+    
+    The user and companion are resolved once when the socket opens; after
+    that every {"type": "turn"} message streams text deltas and per-sentence
+    audio frames back without any per-turn lookups. See voice_session for
+    the message protocol.
+    
+    Query params:
+        user_id: User ID
+        companion_gender: 'boy' or 'girl'
+        voice: Optional voice ID (overrides gender selection)
+    """
+    await websocket.accept()
+    
+    try:
+        user = await user_repository.find_by_id(user_id)
+        companion = await companion_catalog.get_by_gender(companion_gender) if user else None
+        history = await conversation_history.get_recent(user_id, companion_gender) if companion else []
+    except Exception as e:
+        logger.error(f"Voice session setup error: {str(e)}")
+        await websocket.send_json({"type": "error", "detail": "Voice session setup failed"})
+        await websocket.close(code=1011)
+        return
+    
+    if not user or not companion:
+        detail = f"User with ID {user_id} not found" if not user else f"No {companion_gender} companion found"
+        await websocket.send_json({"type": "error", "detail": detail})
+        await websocket.close(code=1008)
+        return
+    
+    logger.info(f"Voice session opened: User {user_id} -> {companion.get('name')}")
+    session = VoiceSession(
+        websocket,
+        user_id=user_id,
+        companion_gender=companion_gender,
+        companion=companion,
+        history=history,
+        settings=settings,
+        voice=voice
+    )
+    await session.run()
+
+async def relay_audio(first_chunk: bytes, audio_chunks):
+    """Response body for a streamed clip: the first chunk, then the rest as it arrives"""
+    try:
+        yield first_chunk
+        async for chunk in audio_chunks:
+            yield chunk
+    except Exception as e:
+        # Headers are already sent, so the clip just ends early
+        logger.error(f"TTS stream failed mid-clip: {str(e)}")
+    finally:
+        await audio_chunks.aclose()
+
 @router.post("/tts")
 async def text_to_speech_endpoint(
     text: str,
@@ -145,7 +401,7 @@ async def text_to_speech_endpoint(
 ):
     """
     Convert text to speech audio using ElevenLabs
-    Returns MP3 audio stream
+    Returns MP3 audio stream (relayed as it is synthesized when TTS_STREAM_RESPONSES is on)
     
     Args:
         text: Text to convert to speech
@@ -160,6 +416,23 @@ async def text_to_speech_endpoint(
                 detail="ElevenLabs TTS service not available. Please configure ELEVENLABS_API_KEY in .env"
             )
         
+        if settings.tts_stream_responses:
+            audio_chunks = tts_service.stream_speech(text, voice, gender)
+            # Wait for the first chunk so a failed synthesis still gets an error status
+            try:
+                first_chunk = await audio_chunks.__anext__()
+            except StopAsyncIteration:
+                first_chunk = b""
+            
+            # No Content-Length: the clip is sent with chunked transfer encoding
+            return StreamingResponse(
+                relay_audio(first_chunk, audio_chunks),
+                media_type="audio/mpeg",
+                headers={
+                    "Content-Disposition": "inline; filename=speech.mp3"
+                }
+            )
+        
         audio_bytes = await tts_service.text_to_speech(text, voice, speed, gender)
         
         return Response(
@@ -172,6 +445,12 @@ async def text_to_speech_endpoint(
     
     except HTTPException:
         raise
+    except AdmissionTimeoutError as e:
+        logger.warning(f"TTS request rejected, overloaded: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="TTS service is busy, please retry"
+        )
     except Exception as e:
         logger.error(f"TTS endpoint error: {str(e)}")
         raise HTTPException(
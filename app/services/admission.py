@@ -0,0 +1,266 @@
+"""
+Admission Control
+Per-provider concurrency and rate limits with a priority queue
+
+Every upstream LLM / TTS call takes a slot from its provider's
+controller first. A slot is granted when the provider is under its
+concurrency limit, its requests/min and tokens/min buckets have room,
+and it is not backing off after a 429. Waiters are served strictly by
+priority (voice turns, then chat, then background work) and FIFO within
+a priority; each gives up with AdmissionTimeoutError once its queue-wait
+deadline passes, so an overloaded provider fails fast instead of piling
+up requests that would time out anyway.
+
+The priority of a call comes from the request_priority context variable,
+set by the route handlers and inherited by the tasks they start.
+"""
+import asyncio
+import heapq
+import itertools
+import time
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from enum import IntEnum
+from typing import Dict, Optional
+
+class Priority(IntEnum):
+    """Latency class of a call (lower is served first)"""
+    VOICE = 0
+    CHAT = 1
+    BACKGROUND = 2
+
+request_priority: ContextVar[Priority] = ContextVar("request_priority", default=Priority.CHAT)
+
+# Backoff after a 429 without Retry-After: doubles per throttle up to the cap
+BACKOFF_INITIAL_SECONDS = 1.0
+BACKOFF_MAX_SECONDS = 30.0
+
+class AdmissionTimeoutError(asyncio.TimeoutError):
+    """No slot became available before the queue-wait deadline"""
+
+def rate_limit_retry_after(error: Exception) -> Optional[float]:
+    """
+    Seconds to wait if error is a provider rate limit (HTTP 429)
+
+    Returns:
+        Retry-After in seconds (0 if the provider sent none), or None if
+        error is not a rate limit
+    """
+    if getattr(error, "status_code", None) != 429:
+        return None
+    headers = getattr(error, "headers", None) or getattr(getattr(error, "response", None), "headers", None) or {}
+    retry_after = getattr(error, "retry_after", None) or headers.get("retry-after")
+    try:
+        return max(0.0, float(retry_after))
+    except (TypeError, ValueError):
+        return 0.0
+
+class _RateBucket:
+    """Token bucket refilled continuously up to one minute's allowance"""
+
+    def __init__(self, per_minute: float):
+        self.capacity = per_minute
+        self.level = per_minute
+        self.rate = per_minute / 60
+        self.updated = time.monotonic()
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """Seconds until amount is available (amounts over capacity wait for a full bucket)"""
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+        missing = min(amount, self.capacity) - self.level
+        return missing / self.rate if missing > 0 else 0.0
+
+    def take(self, amount: float):
+        self.level -= min(amount, self.capacity)
+
+class _Waiter:
+    __slots__ = ("priority", "tokens", "future", "enqueued")
+
+    def __init__(self, priority: Priority, tokens: int, future: asyncio.Future):
+        self.priority = priority
+        self.tokens = tokens
+        self.future = future
+        self.enqueued = time.monotonic()
+
+class AdmissionController:
+    """Concurrency / rate limiter with a priority queue for one provider"""
+
+    def __init__(
+        self,
+        name: str,
+        max_concurrent: int,
+        requests_per_minute: int = 0,
+        tokens_per_minute: int = 0,
+        deadlines: Optional[Dict[Priority, float]] = None
+    ):
+        self.name = name
+        self.max_concurrent = max_concurrent
+        self._requests = _RateBucket(requests_per_minute) if requests_per_minute > 0 else None
+        self._tokens = _RateBucket(tokens_per_minute) if tokens_per_minute > 0 else None
+        self.deadlines = deadlines or {Priority.VOICE: 2.0, Priority.CHAT: 5.0, Priority.BACKGROUND: 60.0}
+
+        self._active = 0
+        self._queue = []
+        self._sequence = itertools.count()
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._blocked_until = 0.0
+        self._backoff = 0.0
+
+        # Metrics (per priority)
+        self.granted = {priority: 0 for priority in Priority}
+        self.timeouts = {priority: 0 for priority in Priority}
+        self._wait_seconds = {priority: 0.0 for priority in Priority}
+        self._max_wait_seconds = {priority: 0.0 for priority in Priority}
+        self.throttles = 0
+
+    @property
+    def counts_tokens(self) -> bool:
+        """Whether callers need to pass token estimates"""
+        return self._tokens is not None
+
+    def deadline_for(self, priority: Optional[Priority] = None) -> float:
+        """Absolute (monotonic) queue-wait deadline for a call starting now"""
+        priority = request_priority.get() if priority is None else priority
+        return time.monotonic() + self.deadlines[priority]
+
+    @asynccontextmanager
+    async def slot(self, tokens: int = 0, priority: Optional[Priority] = None, deadline: Optional[float] = None):
+        """Hold a slot for the duration of the block"""
+        await self.acquire(tokens, priority, deadline)
+        try:
+            yield
+        finally:
+            self.release()
+
+    async def acquire(self, tokens: int = 0, priority: Optional[Priority] = None, deadline: Optional[float] = None):
+        """
+        Wait for a slot
+
+        Raises:
+            AdmissionTimeoutError: If no slot is granted before the deadline
+        """
+        priority = request_priority.get() if priority is None else priority
+        if deadline is None:
+            deadline = self.deadline_for(priority)
+
+        waiter = _Waiter(priority, tokens, asyncio.get_running_loop().create_future())
+        heapq.heappush(self._queue, (priority, next(self._sequence), waiter))
+        self._pump()
+
+        try:
+            await asyncio.wait_for(waiter.future, timeout=max(0.0, deadline - time.monotonic()))
+        except asyncio.TimeoutError:
+            if waiter.future.done() and not waiter.future.cancelled():
+                self.release()  # Granted just as the deadline passed
+            self.timeouts[priority] += 1
+            raise AdmissionTimeoutError(
+                f"{self.name}: no slot within {self.deadlines[priority]:.1f}s ({priority.name.lower()} queue)"
+            ) from None
+        except asyncio.CancelledError:
+            if waiter.future.done() and not waiter.future.cancelled():
+                self.release()  # Granted just as the caller went away
+            raise
+
+        waited = time.monotonic() - waiter.enqueued
+        self.granted[priority] += 1
+        self._wait_seconds[priority] += waited
+        self._max_wait_seconds[priority] = max(self._max_wait_seconds[priority], waited)
+
+    def release(self):
+        """Return a slot"""
+        self._active -= 1
+        self._pump()
+
+    def throttle(self, retry_after: Optional[float] = None):
+        """
+        Stop granting slots after a 429
+
+        Args:
+            retry_after: Provider's Retry-After in seconds; 0/None uses
+                exponential backoff instead
+        """
+        self.throttles += 1
+        if retry_after:
+            delay = retry_after
+        else:
+            self._backoff = min(BACKOFF_MAX_SECONDS, self._backoff * 2 or BACKOFF_INITIAL_SECONDS)
+            delay = self._backoff
+        self._blocked_until = max(self._blocked_until, time.monotonic() + delay)
+
+    def record_success(self):
+        """A call went through: reset the 429 backoff"""
+        self._backoff = 0.0
+
+    def _pump(self):
+        """Grant slots to waiters at the head of the queue while limits allow"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        while self._queue:
+            _, _, waiter = self._queue[0]
+            if waiter.future.done():
+                heapq.heappop(self._queue)  # Timed out or cancelled
+                continue
+            if self._active >= self.max_concurrent:
+                return  # release() pumps again
+
+            now = time.monotonic()
+            delay = self._blocked_until - now
+            if self._requests is not None:
+                delay = max(delay, self._requests.wait_time(1, now))
+            if self._tokens is not None:
+                delay = max(delay, self._tokens.wait_time(waiter.tokens, now))
+            if delay > 0:
+                # Head of the queue waits for capacity; lower priorities wait behind it
+                self._timer = asyncio.get_running_loop().call_later(delay, self._pump)
+                return
+
+            heapq.heappop(self._queue)
+            if self._requests is not None:
+                self._requests.take(1)
+            if self._tokens is not None:
+                self._tokens.take(waiter.tokens)
+            self._active += 1
+            waiter.future.set_result(None)
+
+    def get_stats(self) -> Dict:
+        """Queue depth, wait times and throttling"""
+        depth = {priority: 0 for priority in Priority}
+        for priority, _, waiter in self._queue:
+            if not waiter.future.done():
+                depth[priority] += 1
+
+        queues = {}
+        for priority in Priority:
+            granted = self.granted[priority]
+            queues[priority.name.lower()] = {
+                "depth": depth[priority],
+                "granted": granted,
+                "timeouts": self.timeouts[priority],
+                "avg_wait_ms": round(self._wait_seconds[priority] / granted * 1000, 1) if granted else None,
+                "max_wait_ms": round(self._max_wait_seconds[priority] * 1000, 1)
+            }
+        return {
+            "active": self._active,
+            "max_concurrent": self.max_concurrent,
+            "throttles": self.throttles,
+            "blocked_for_seconds": round(max(0.0, self._blocked_until - time.monotonic()), 1),
+            "queues": queues
+        }
+
+def create_controller(name: str, settings, max_concurrent: int, requests_per_minute: int = 0,
+                      tokens_per_minute: int = 0) -> AdmissionController:
+    """Controller with the queue-wait deadlines from settings"""
+    return AdmissionController(
+        name,
+        max_concurrent=max_concurrent,
+        requests_per_minute=requests_per_minute,
+        tokens_per_minute=tokens_per_minute,
+        deadlines={
+            Priority.VOICE: settings.admission_deadline_voice_ms / 1000,
+            Priority.CHAT: settings.admission_deadline_chat_ms / 1000,
+            Priority.BACKGROUND: settings.admission_deadline_background_ms / 1000,
+        }
+    )
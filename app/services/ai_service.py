@@ -7,6 +7,7 @@ import random
 import re
 from typing import List, Dict, Optional
 from datetime import datetime
+from app.services.sentiment import classify_sentiment
 
 class AIService:
     """AI Response Generation Service"""
@@ -48,26 +49,8 @@ class AIService:
         }
     
     def analyze_sentiment(self, message: str) -> str:
-        """Analyze message sentiment (basic keyword matching)"""
-        message_lower = message.lower()
-        
-        # Greeting patterns
-        if any(word in message_lower for word in ["hi", "hello", "hey", "sup", "morning", "evening"]):
-            return "greeting"
-        
-        # Happy patterns
-        if any(word in message_lower for word in ["happy", "great", "awesome", "excited", "love", "amazing", "wonderful"]):
-            return "happy"
-        
-        # Sad/empathetic patterns
-        if any(word in message_lower for word in ["sad", "upset", "angry", "frustrated", "tired", "worried", "stressed"]):
-            return "empathetic"
-        
-        # Question patterns
-        if "?" in message or any(word in message_lower for word in ["what", "why", "how", "when", "where", "who"]):
-            return "curious"
-        
-        return "default"
+        """Analyze message sentiment (whole-word keyword matching, see sentiment)"""
+        return classify_sentiment(message)
     
     def generate_ai_response(
         self, 
@@ -2,31 +2,46 @@
 Enhanced AI Service with Real LLM Integration
 Supports OpenAI, Groq, and Anthropic APIs for human-like conversations
 """
+import asyncio
 import random
 import logging
-from typing import List, Dict, Optional
+from typing import AsyncIterator, List, Dict, Optional
 from datetime import datetime
+from app.services.prompt_cache import system_prompt_cache
+from app.services.companion_profile import companion_profiles
+from app.services.context_assembler import context_assembler
+from app.services.single_flight import SingleFlight, fingerprint
+from app.services.sentiment import classify_sentiment
+from app.services.token_counter import count_tokens
 
 logger = logging.getLogger(__name__)
 
-# Try to import LLM libraries
+# Try to import LLM configuration and providers
 try:
     from app.config import settings
-    from openai import OpenAI
-    from groq import Groq
-    import anthropic
+    from app.services.llm_router import create_router
     LLM_AVAILABLE = True
 except ImportError as e:
     logger.warning(f"LLM libraries not fully available: {e}. Using mock responses.")
     LLM_AVAILABLE = False
     settings = None
 
+# Instructions for folding older turns into the rolling conversation summary
+SUMMARY_PROMPT = """You maintain the long-term memory of an AI companion's conversation with one user.
+Update the current summary with the new turns. Keep facts about the user (name, people, events,
+preferences, plans, feelings) and open threads; drop small talk. Write in the third person about
+"the user", as short plain sentences, under 150 words. Reply with the updated summary only."""
+
 class EnhancedAIService:
     """AI Service with real LLM integration"""
     
     def __init__(self):
-        self.llm_client = None
+        self.llm_provider = None
         self.provider = None
+        # Identical prompts in flight at the same time share one LLM call
+        self.flights = SingleFlight()
+        # A/B switch: compact core persona + relevant profile chunks vs. the full prompt
+        self.profile_slicing = bool(settings and settings.prompt_profile_slicing)
         
         if LLM_AVAILABLE and settings:
             self._initialize_llm()
@@ -67,118 +82,142 @@ class EnhancedAIService:
         }
     
     def _initialize_llm(self):
-        """Initialize the LLM client based on configuration"""
+        """Initialize the async LLM provider router (primary plus fallbacks) based on configuration"""
         try:
-            llm_config = settings.get_llm_config()
-            self.provider = llm_config["provider"]
-            api_key = llm_config["api_key"]
-            
-            if not api_key or api_key.startswith("your"):
-                logger.warning(f"No valid API key for {self.provider}. Using mock responses.")
-                return
-            
-            if self.provider == "openai":
-                self.llm_client = OpenAI(api_key=api_key)
-                self.model = llm_config["model"]
-                logger.info(f"Initialized OpenAI client with model: {self.model}")
-            
-            elif self.provider == "groq":
-                self.llm_client = Groq(api_key=api_key)
-                self.model = llm_config["model"]
-                logger.info(f"Initialized Groq client with model: {self.model}")
-            
-            elif self.provider == "anthropic":
-                self.llm_client = anthropic.Anthropic(api_key=api_key)
-                self.model = llm_config["model"]
-                logger.info(f"Initialized Anthropic client with model: {self.model}")
+            self.provider = settings.llm_provider
+            self.llm_provider = create_router(settings)
+            if self.llm_provider:
+                self.model = self.llm_provider.model
         
         except Exception as e:
             logger.error(f"Failed to initialize LLM: {e}. Using mock responses.")
-            self.llm_client = None
+            self.llm_provider = None
     
     def analyze_sentiment(self, message: str) -> str:
-        """Analyze message sentiment (basic keyword matching)"""
-        message_lower = message.lower()
-        
-        # Greeting patterns
-        if any(word in message_lower for word in ["hi", "hello", "hey", "sup", "morning", "evening"]):
-            return "greeting"
-        
-        # Happy patterns
-        if any(word in message_lower for word in ["happy", "great", "awesome", "excited", "love", "amazing", "wonderful"]):
-            return "happy"
-        
-        # Sad/empathetic patterns
-        if any(word in message_lower for word in ["sad", "upset", "angry", "frustrated", "tired", "worried", "stressed"]):
-            return "empathetic"
-        
-        # Question patterns
-        if "?" in message or any(word in message_lower for word in ["what", "why", "how", "when", "where", "who"]):
-            return "curious"
-        
-        return "default"
+        """Analyze message sentiment (whole-word keyword matching, see sentiment)"""
+        return classify_sentiment(message)
     
-    def generate_response_with_llm(
+    def _build_messages(
+        self,
+        user_message: str,
+        companion_context: Dict,
+        chat_history: Optional[List[Dict]] = None
+    ) -> List[Dict]:
+        """Build the LLM message list: system prompt, recent history packed to the token budget, current message"""
+        compiled = system_prompt_cache.get(companion_context, self._render_system_prompt)
+        profile = None
+        if self.profile_slicing:
+            full_tokens = compiled.token_count
+            companion_profile = companion_profiles.get(companion_context)
+            compiled = companion_profile.core
+            profile = companion_profile.select(user_message)
+            companion_profiles.record(
+                compiled.token_count + (count_tokens(profile) if profile else 0), full_tokens
+            )
+        context = context_assembler.assemble(
+            compiled, user_message, chat_history,
+            profile=profile,
+            summary=companion_context.get("summary"),
+            memories=companion_context.get("memories")
+        )
+        logger.info(
+            f"LLM context: {context.token_count} tokens "
+            f"({context.history_turns} history turns, {context.dropped_turns} dropped, "
+            f"{context.memory_turns} memories)"
+        )
+        return context.messages
+    
+    async def generate_response_with_llm(
         self,
         user_message: str,
         companion_context: Dict,
         chat_history: Optional[List[Dict]] = None
     ) -> str:
-        """Generate response using real LLM"""
+        """Generate response using the async LLM provider"""
         try:
-            # Build system prompt with companion personality
-            system_prompt = self._build_system_prompt(companion_context)
-            
-            # Build conversation history
-            messages = [{"role": "system", "content": system_prompt}]
-            
-            # Add recent chat history for context
-            if chat_history:
-                for chat in reversed(chat_history[-5:]):  # Last 5 messages
-                    messages.append({"role": "user", "content": chat.get("user_message", "")})
-                    messages.append({"role": "assistant", "content": chat.get("ai_response", "")})
-            
-            # Add current message
-            messages.append({"role": "user", "content": user_message})
-            
-            # Generate response based on provider
-            if self.provider == "openai":
-                response = self.llm_client.chat.completions.create(
-                    model=self.model,
-                    messages=messages,
-                    temperature=0.8,
-                    max_tokens=150
-                )
-                return response.choices[0].message.content
-            
-            elif self.provider == "groq":
-                response = self.llm_client.chat.completions.create(
-                    model=self.model,
-                    messages=messages,
-                    temperature=0.8,
-                    max_tokens=150
-                )
-                return response.choices[0].message.content
+            messages = self._build_messages(user_message, companion_context, chat_history)
             
-            elif self.provider == "anthropic":
-                # Anthropic uses different message format
-                system_content = messages[0]["content"]
-                conversation = messages[1:]
-                
-                response = self.llm_client.messages.create(
-                    model=self.model,
-                    system=system_content,
-                    messages=conversation,
-                    temperature=0.8,
-                    max_tokens=150
-                )
-                return response.content[0].text
+            # Generate response (bounded by the provider's per-call timeout);
+            # concurrent identical prompts, e.g. bursts of greetings, are coalesced
+            key = fingerprint(self.model, 0.8, 150, messages)
+            return await self.flights.run(key, lambda: self.llm_provider.complete(
+                messages,
+                temperature=0.8,
+                max_tokens=150
+            ))
         
         except Exception as e:
-            logger.error(f"LLM generation failed: {e}. Using fallback.")
+            logger.error(f"LLM generation failed: {str(e) or type(e).__name__}. Using fallback.")
             return self._generate_mock_response(user_message, companion_context)
     
+    async def summarize_conversation(
+        self,
+        previous_summary: Optional[str],
+        turns: List[Dict],
+        max_tokens: int = 200
+    ) -> Optional[str]:
+        """
+        Fold older turns into a running conversation summary
+        
+        Args:
+            previous_summary: Summary so far (None for the first one)
+            turns: Chats to fold in, oldest first
+            max_tokens: Length limit for the new summary
+            
+        Returns:
+            Updated summary, or None without an LLM provider
+        """
+        if not self.llm_provider:
+            return None
+        
+        transcript = "\n".join(
+            f"User: {chat.get('user_message', '')}\nCompanion: {chat.get('ai_response', '')}"
+            for chat in turns
+        )
+        messages = [
+            {"role": "system", "content": SUMMARY_PROMPT},
+            {"role": "user", "content": f"CURRENT SUMMARY:\n{previous_summary or '(none yet)'}\n\nNEW TURNS:\n{transcript}"}
+        ]
+        return await self.llm_provider.complete(messages, temperature=0.3, max_tokens=max_tokens)
+    
+    async def stream_contextual_response(
+        self,
+        prompt: str,
+        companion_context: Dict
+    ) -> AsyncIterator[str]:
+        """
+        Stream the AI response as text deltas
+        Streams from the real LLM if available; falls back to the mock
+        responder (word by word) if the LLM is unavailable, fails before
+        producing any text or produces none at all
+        """
+        chat_history = companion_context.get("chat_history", [])
+        
+        if self.llm_provider:
+            emitted = False
+            try:
+                messages = self._build_messages(prompt, companion_context, chat_history)
+                async for delta in self.llm_provider.stream(messages, temperature=0.8, max_tokens=150):
+                    emitted = True
+                    yield delta
+                if not emitted:
+                    logger.error("LLM streaming returned no text.")
+            except Exception as e:
+                logger.error(f"LLM streaming failed: {str(e) or type(e).__name__}.")
+            if emitted:
+                return
+        
+        # Fallback to mock responses, emitted word by word
+        words = self._generate_mock_response(prompt, companion_context).split(" ")
+        for index, word in enumerate(words):
+            yield word if index == 0 else " " + word
+            await asyncio.sleep(0)
+    
     def _build_system_prompt(self, companion_context: Dict) -> str:
+        """Get the (cached) system prompt for a companion"""
+        return system_prompt_cache.get(companion_context, self._render_system_prompt).text
+    
+    def _render_system_prompt(self, companion_context: Dict) -> str:
         """Build system prompt from companion context"""
         name = companion_context.get("name", "AI Companion")
         backstory = companion_context.get("backstory", "")
@@ -319,7 +358,7 @@ REMEMBER:
         base += " " + random.choice(followups)
         return base
     
-    def generate_contextual_response(
+    async def generate_contextual_response(
         self,
         prompt: str,
         companion_context: Dict
@@ -331,19 +370,31 @@ REMEMBER:
         chat_history = companion_context.get("chat_history", [])
         
         # Use real LLM if available
-        if self.llm_client:
-            return self.generate_response_with_llm(prompt, companion_context, chat_history)
+        if self.llm_provider:
+            return await self.generate_response_with_llm(prompt, companion_context, chat_history)
         
         # Fallback to mock responses
         return self._generate_mock_response(prompt, companion_context)
 
+    def get_stats(self) -> Dict:
+        """LLM routing metrics"""
+        stats = self.llm_provider.get_stats() if self.llm_provider else {"providers": [], "mock": True}
+        stats["single_flight"] = self.flights.get_stats()
+        stats["context"] = context_assembler.get_stats()
+        return stats
+
+    async def close(self):
+        """Release the LLM provider's HTTP client"""
+        if self.llm_provider:
+            await self.llm_provider.close()
+
 # Create singleton instance
 enhanced_ai_service = EnhancedAIService()
 
 # Backward compatibility
 ai_service = enhanced_ai_service
 
-def generate_ai_response(prompt: str, backstory: str = "") -> str:
+async def generate_ai_response(prompt: str, backstory: str = "") -> str:
     """Simple function for generating AI responses (backward compatible)"""
     context = {"backstory": backstory, "chat_history": []}
-    return enhanced_ai_service.generate_contextual_response(prompt, context)
+    return await enhanced_ai_service.generate_contextual_response(prompt, context)
@@ -0,0 +1,199 @@
+"""
+Audio Cache
+Content-addressed cache for synthesized TTS audio
+
+Audio is keyed by a SHA-256 of (voice_id, model_id, voice_settings,
+normalized text), so identical phrases spoken with the same voice are
+only synthesized once. Two tiers:
+- memory: per-process LRU bounded by bytes
+- disk: shared directory bounded by bytes, evicted by file mtime (reads
+  touch the file), written atomically via temp file + os.replace so
+  several workers can share it safely
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import time
+import uuid
+from collections import OrderedDict
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+def normalize_text(text: str) -> str:
+    """Collapse whitespace so trivially different strings share an entry"""
+    return " ".join(text.split())
+
+def audio_cache_key(voice_id: str, model_id: str, voice_settings: Optional[Dict], text: str) -> str:
+    """Content address for one synthesis request"""
+    payload = json.dumps(
+        [voice_id, model_id, voice_settings or {}, normalize_text(text)],
+        sort_keys=True,
+        ensure_ascii=False
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+class AudioCache:
+    """Two-tier (memory + disk) LRU cache of audio bytes"""
+
+    def __init__(self):
+        self.enabled = False
+        self.directory = ".cache/tts"
+        self.memory_max_bytes = 32 * 1024 * 1024
+        self.disk_max_bytes = 512 * 1024 * 1024
+        self._memory: "OrderedDict[str, bytes]" = OrderedDict()
+        self._memory_bytes = 0
+        self._disk_bytes = 0
+
+        # Metrics
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lookup_seconds = 0.0
+        self._lookups = 0
+
+    def configure(self, settings):
+        """Apply cache settings and measure the existing disk tier"""
+        self.enabled = settings.tts_cache_enabled
+        self.directory = settings.tts_cache_dir
+        self.memory_max_bytes = settings.tts_cache_memory_mb * 1024 * 1024
+        self.disk_max_bytes = settings.tts_cache_disk_mb * 1024 * 1024
+
+        if self.enabled:
+            os.makedirs(self.directory, exist_ok=True)
+            self._disk_bytes = sum(size for _, size, _ in self._scan_disk())
+            logger.info(f"TTS audio cache enabled at {self.directory} ({self._disk_bytes} bytes on disk)")
+
+    def _path(self, key: str) -> str:
+        """Disk location for a key (sharded by prefix)"""
+        return os.path.join(self.directory, key[:2], f"{key}.mp3")
+
+    async def get(self, key: str) -> Optional[bytes]:
+        """Cached audio for a key, or None"""
+        if not self.enabled:
+            return None
+
+        started = time.perf_counter()
+        try:
+            audio = self._memory.get(key)
+            if audio is not None:
+                self.memory_hits += 1
+                self._memory.move_to_end(key)
+                return audio
+
+            audio = await asyncio.to_thread(self._read_disk, key)
+            if audio is not None:
+                self.disk_hits += 1
+                self._remember(key, audio)
+                return audio
+
+            self.misses += 1
+            return None
+        finally:
+            self._lookup_seconds += time.perf_counter() - started
+            self._lookups += 1
+
+    async def put(self, key: str, audio: bytes):
+        """Store audio in both tiers (empty audio is never cached)"""
+        if not self.enabled or not audio:
+            return
+
+        self._remember(key, audio)
+        try:
+            await asyncio.to_thread(self._write_disk, key, audio)
+        except OSError as e:
+            logger.warning(f"Failed to write TTS cache entry: {e}")
+
+    def _remember(self, key: str, audio: bytes):
+        """Insert into the memory tier, evicting least recently used entries"""
+        if len(audio) > self.memory_max_bytes:
+            return
+        previous = self._memory.pop(key, None)
+        if previous is not None:
+            self._memory_bytes -= len(previous)
+        self._memory[key] = audio
+        self._memory_bytes += len(audio)
+        while self._memory_bytes > self.memory_max_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= len(evicted)
+
+    def _read_disk(self, key: str) -> Optional[bytes]:
+        """Read an entry and touch it for LRU (runs in a thread)"""
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                audio = f.read()
+            os.utime(path)
+            return audio
+        except FileNotFoundError:
+            return None
+
+    def _write_disk(self, key: str, audio: bytes):
+        """Atomically write an entry, then evict if over the cap (runs in a thread)"""
+        path = self._path(key)
+        if os.path.exists(path):
+            return
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(audio)
+        os.replace(tmp_path, path)
+
+        self._disk_bytes += len(audio)
+        if self._disk_bytes > self.disk_max_bytes:
+            self._evict_disk()
+
+    def _scan_disk(self):
+        """(path, size, mtime) of every cached file"""
+        entries = []
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if not name.endswith(".mp3"):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((path, stat.st_size, stat.st_mtime))
+        return entries
+
+    def _evict_disk(self):
+        """Delete least recently used files until the disk tier is under 90% of its cap"""
+        entries = sorted(self._scan_disk(), key=lambda entry: entry[2])
+        total = sum(size for _, size, _ in entries)
+        target = int(self.disk_max_bytes * 0.9)
+
+        for path, size, _ in entries:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+                total -= size
+                self.evictions += 1
+            except FileNotFoundError:
+                total -= size
+        self._disk_bytes = total
+
+    def get_stats(self) -> Dict:
+        """Cache metrics"""
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        hits = self.memory_hits + self.disk_hits
+        return {
+            "enabled": self.enabled,
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_ratio": round(hits / lookups, 4) if lookups else None,
+            "memory_bytes": self._memory_bytes,
+            "disk_bytes": self._disk_bytes,
+            "disk_evictions": self.evictions,
+            "avg_lookup_ms": round(self._lookup_seconds / self._lookups * 1000, 3) if self._lookups else None
+        }
+
+# Create singleton instance
+audio_cache = AudioCache()
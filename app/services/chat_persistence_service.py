@@ -0,0 +1,245 @@
+"""
+Chat Persistence Service
+Saves chat turns either directly or through a write-behind buffer
+
+In write-behind mode the chat _id is allocated up front, the document is
+queued and the caller returns immediately. A background task flushes the
+queue with insert_many once a batch fills up or the flush interval
+elapses. The queue is bounded: when it is full, save() waits for space
+(backpressure) instead of growing memory.
+
+A failed batch is retried with exponential backoff; documents rejected
+as duplicate keys were written by an earlier attempt and count as done
+(chat_repository recounts their users, in case that attempt failed
+after the write but before the counters were updated).
+Documents that still fail are appended to a dead-letter file (extended
+JSON, one per line) and queued again on the next startup, since their
+ids were already returned to clients.
+"""
+import asyncio
+import logging
+import os
+from typing import Dict, List, Optional
+from bson import ObjectId, json_util
+from pymongo.errors import BulkWriteError
+from app.repositories.chat_repository import chat_repository, DUPLICATE_KEY_ERROR
+
+logger = logging.getLogger(__name__)
+
+# Queued by stop() to tell the flush loop to finish
+_STOP = object()
+
+# Backoff between retries of a failed batch
+FLUSH_BACKOFF_INITIAL_SECONDS = 0.5
+FLUSH_BACKOFF_MAX_SECONDS = 8.0
+
+class ChatPersistenceService:
+    """Direct or write-behind chat persistence"""
+
+    def __init__(self):
+        self.write_behind = False
+        self.batch_size = 200
+        self.flush_interval = 0.25
+        self.retries = 3
+        self.dead_letter_file = ".cache/chat_dead_letter.jsonl"
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._replay_task: Optional[asyncio.Task] = None
+
+        # Metrics
+        self.flushed_count = 0
+        self.failed_count = 0
+        self.batch_count = 0
+        self.retry_count = 0
+        self.replayed_count = 0
+
+    def start(self, settings):
+        """Start the background flush loop if write-behind is enabled"""
+        self.write_behind = settings.chat_write_behind
+        if not self.write_behind or self._task is not None:
+            return
+
+        self.batch_size = settings.chat_write_batch_size
+        self.flush_interval = settings.chat_write_flush_interval_ms / 1000
+        self.retries = settings.chat_write_retries
+        self.dead_letter_file = settings.chat_write_dead_letter_file
+        self._queue = asyncio.Queue(maxsize=settings.chat_write_buffer_size)
+        self._task = asyncio.create_task(self._flush_loop())
+        self._replay_task = asyncio.create_task(self._replay_dead_letters())
+        logger.info(
+            f"Chat write-behind enabled (buffer {settings.chat_write_buffer_size}, "
+            f"batch {self.batch_size}, interval {settings.chat_write_flush_interval_ms} ms)"
+        )
+
+    async def save(self, chat_doc: Dict) -> ObjectId:
+        """
+        Persist a chat document
+
+        Returns:
+            The chat's ObjectId (already allocated in write-behind mode)
+        """
+        if self._task is None:
+            return await chat_repository.insert(chat_doc)
+
+        chat_doc.setdefault("_id", ObjectId())
+        await self._queue.put(chat_doc)
+        return chat_doc["_id"]
+
+    async def flush(self):
+        """Wait until every chat queued so far has been written (or dead-lettered)"""
+        if self._task is None:
+            return
+
+        flushed = asyncio.get_running_loop().create_future()
+        await self._queue.put(flushed)
+        await flushed
+
+    async def _flush_loop(self):
+        """Collect queued chats into batches and write them"""
+        loop = asyncio.get_running_loop()
+        stopping = False
+
+        while not stopping:
+            first = await self._queue.get()
+            if first is _STOP:
+                break
+            if isinstance(first, asyncio.Future):
+                first.set_result(None)
+                continue
+
+            batch = [first]
+            flushed = None
+            deadline = loop.time() + self.flush_interval
+            while len(batch) < self.batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                if isinstance(item, asyncio.Future):
+                    flushed = item
+                    break
+                batch.append(item)
+
+            await self._flush(batch)
+            if flushed is not None:
+                flushed.set_result(None)
+
+    async def _flush(self, batch: List[Dict]):
+        """Write one batch, retrying failures and dead-lettering what still fails"""
+        pending = batch
+        for attempt in range(self.retries + 1):
+            try:
+                await chat_repository.insert_many(pending)
+                self.flushed_count += len(pending)
+                pending = []
+                break
+            except BulkWriteError as e:
+                # Duplicate keys were written by an earlier attempt
+                failed = {
+                    error["index"] for error in e.details.get("writeErrors", [])
+                    if error.get("code") != DUPLICATE_KEY_ERROR
+                }
+                self.flushed_count += len(pending) - len(failed)
+                pending = [chat for index, chat in enumerate(pending) if index in failed]
+                if not pending:
+                    break
+                error = e
+            except Exception as e:
+                error = e
+
+            if attempt < self.retries:
+                self.retry_count += 1
+                delay = min(FLUSH_BACKOFF_INITIAL_SECONDS * 2 ** attempt, FLUSH_BACKOFF_MAX_SECONDS)
+                logger.warning(f"Failed to flush {len(pending)} buffered chats, retrying in {delay:.1f}s: {error}")
+                await asyncio.sleep(delay)
+
+        self.batch_count += 1
+        if pending:
+            self.failed_count += len(pending)
+            logger.error(f"Failed to flush {len(pending)} buffered chats after {self.retries} retries: {error}")
+            await self._dead_letter(pending)
+
+    async def _dead_letter(self, chats: List[Dict]):
+        """Append chats that could not be written to the dead-letter file"""
+        lines = "".join(json_util.dumps(chat) + "\n" for chat in chats)
+
+        def append():
+            os.makedirs(os.path.dirname(self.dead_letter_file) or ".", exist_ok=True)
+            with open(self.dead_letter_file, "a", encoding="utf-8") as f:
+                f.write(lines)
+
+        try:
+            await asyncio.to_thread(append)
+            logger.warning(f"Saved {len(chats)} unwritten chats to {self.dead_letter_file}")
+        except OSError as e:
+            logger.error(f"Failed to save unwritten chats to {self.dead_letter_file}: {e}")
+
+    async def _replay_dead_letters(self):
+        """Queue chats left in the dead-letter file by an earlier run"""
+        def take() -> List[Dict]:
+            try:
+                with open(self.dead_letter_file, encoding="utf-8") as f:
+                    chats = [json_util.loads(line) for line in f if line.strip()]
+            except FileNotFoundError:
+                return []
+            os.remove(self.dead_letter_file)
+            return chats
+
+        try:
+            chats = await asyncio.to_thread(take)
+        except (OSError, ValueError) as e:
+            logger.error(f"Failed to read {self.dead_letter_file}: {e}")
+            return
+
+        for chat in chats:
+            await self._queue.put(chat)
+        if chats:
+            self.replayed_count += len(chats)
+            logger.info(f"Replaying {len(chats)} chats from {self.dead_letter_file}")
+
+    async def stop(self):
+        """Flush everything still buffered and stop the flush loop"""
+        if self._task is None:
+            return
+
+        await self._replay_task
+        await self._queue.put(_STOP)
+        await self._task
+        self._task = None
+
+        # Anything queued behind the stop marker
+        remaining = []
+        waiters = []
+        while not self._queue.empty():
+            item = self._queue.get_nowait()
+            if isinstance(item, asyncio.Future):
+                waiters.append(item)
+            elif item is not _STOP:
+                remaining.append(item)
+        for start in range(0, len(remaining), self.batch_size):
+            await self._flush(remaining[start:start + self.batch_size])
+        for waiter in waiters:
+            waiter.set_result(None)
+
+        logger.info(f"Chat write-behind stopped ({self.flushed_count} flushed, {self.failed_count} failed)")
+
+    def get_stats(self) -> Dict:
+        """Write-behind buffer metrics"""
+        return {
+            "write_behind": self.write_behind,
+            "buffered": self._queue.qsize() if self._queue else 0,
+            "flushed": self.flushed_count,
+            "failed": self.failed_count,
+            "batches": self.batch_count,
+            "retries": self.retry_count,
+            "replayed": self.replayed_count
+        }
+
+# Create singleton instance
+chat_persistence_service = ChatPersistenceService()
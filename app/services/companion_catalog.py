@@ -0,0 +1,114 @@
+"""
+Companion Catalog
+In-memory cache of companion documents keyed by gender and by id
+
+Companions change rarely, so the catalog is loaded once at startup and
+reloaded when companions are created or deleted through this worker.
+An optional TTL bounds how stale another worker's changes can be.
+"""
+import asyncio
+import logging
+import time
+from typing import Dict, List, Optional
+from app.repositories.companion_repository import companion_repository
+from app.services.prompt_cache import system_prompt_cache
+from app.services.companion_profile import companion_profiles
+
+logger = logging.getLogger(__name__)
+
+class CompanionCatalog:
+    """Cached view of the companions collection"""
+
+    def __init__(self):
+        self.ttl_seconds = 0  # 0 = never expire
+        self._by_id: Dict[str, Dict] = {}
+        self._by_gender: Dict[str, Dict] = {}
+        self._loaded_at: Optional[float] = None
+        self._lock = asyncio.Lock()
+
+        # Metrics
+        self.hits = 0
+        self.misses = 0
+        self.reloads = 0
+
+    def configure(self, settings):
+        """Apply cache settings"""
+        self.ttl_seconds = settings.companion_cache_ttl_seconds
+
+    def _is_fresh(self) -> bool:
+        """Whether the loaded catalog can be served"""
+        if self._loaded_at is None:
+            return False
+        if self.ttl_seconds <= 0:
+            return True
+        return time.monotonic() - self._loaded_at < self.ttl_seconds
+
+    async def load(self):
+        """(Re)load every companion from the database"""
+        companions = await companion_repository.find_all()
+
+        by_id = {}
+        by_gender = {}
+        for companion in companions:
+            by_id[str(companion["_id"])] = companion
+            by_gender.setdefault(companion.get("gender"), companion)
+
+        self._by_id = by_id
+        self._by_gender = by_gender
+        self._loaded_at = time.monotonic()
+        self.reloads += 1
+        system_prompt_cache.invalidate()
+        companion_profiles.invalidate()
+        logger.info(f"Companion catalog loaded: {len(by_id)} companions")
+
+    def invalidate(self):
+        """Force a reload on the next lookup"""
+        self._loaded_at = None
+
+    async def refresh(self):
+        """Reload now (after this worker changed a companion)"""
+        async with self._lock:
+            await self.load()
+
+    async def _ensure_loaded(self):
+        """Reload once if the catalog is missing or expired"""
+        if self._is_fresh():
+            self.hits += 1
+            return
+
+        self.misses += 1
+        async with self._lock:
+            if not self._is_fresh():
+                await self.load()
+
+    async def get_by_gender(self, gender: str) -> Optional[Dict]:
+        """Companion for a gender, as a copy safe to modify"""
+        await self._ensure_loaded()
+        companion = self._by_gender.get(gender)
+        return dict(companion) if companion else None
+
+    async def get_by_id(self, companion_id: str) -> Optional[Dict]:
+        """Companion by id string, as a copy safe to modify"""
+        await self._ensure_loaded()
+        companion = self._by_id.get(companion_id)
+        return dict(companion) if companion else None
+
+    async def get_all(self) -> List[Dict]:
+        """All companions, as copies safe to modify"""
+        await self._ensure_loaded()
+        return [dict(companion) for companion in self._by_id.values()]
+
+    def get_stats(self) -> Dict:
+        """Cache metrics"""
+        lookups = self.hits + self.misses
+        return {
+            "companions": len(self._by_id),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else None,
+            "reloads": self.reloads,
+            "ttl_seconds": self.ttl_seconds
+        }
+
+# Create singleton instance
+companion_catalog = CompanionCatalog()
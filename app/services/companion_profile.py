@@ -0,0 +1,164 @@
+"""
+Companion Profile
+Relevance-sliced companion persona for the LLM prompt
+
+The full system prompt sends the whole backstory, every interest and
+the long list of conversation principles on every turn. In sliced mode
+(Settings.prompt_profile_slicing) the prompt is instead:
+- a compact core persona: name, identity sentence, personality, style
+  and the principles in brief. It is identical on every turn, so the
+  provider's prompt cache still applies to it
+- the profile chunks (backstory sentences, interests) whose terms match
+  the current message, as a second system message; none if nothing
+  matches, the whole backstory if the user asks about the companion
+
+Profiles are split and indexed once per companion version and cached
+until the companion catalog reloads.
+"""
+import logging
+import re
+from collections import OrderedDict
+from typing import Dict, FrozenSet, List, Optional, Tuple
+from app.services.long_term_memory import tokenize
+from app.services.prompt_cache import CompiledPrompt, prompt_version
+from app.services.token_counter import count_tokens
+
+logger = logging.getLogger(__name__)
+
+# Most backstory sentences / interests added for one message
+MAX_BACKSTORY_CHUNKS = 2
+MAX_INTEREST_CHUNKS = 3
+
+PROFILE_HEADER = "ABOUT YOU (RELEVANT TO THIS MESSAGE):"
+
+# Messages asking about the companion get the whole backstory
+_SELF_QUESTION = re.compile(
+    r"\b(yourself|about you|who are you|your (story|life|past|background|childhood|family|hobbies|interests|job|work))\b",
+    re.IGNORECASE
+)
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+CORE_PRINCIPLES = """HOW TO TALK:
+- This is a voice conversation: reply in 1-3 short, natural sentences and get to the point.
+- Sound like a real person: use contractions, show fitting emotion, match the user's tone.
+- Engage with ANY topic; if unsure, say so honestly but still help. Give real, specific answers.
+- Say your name only when first introducing yourself - never start with "I'm {name}" or "As {name}".
+- Focus on the current message: don't repeat what the user said or say "Earlier you mentioned...".
+- Keep the conversation going with a follow-up question when it fits; show empathy when needed."""
+
+def _stem(term: str) -> str:
+    """Crude stem so related word forms match ("movies"/"movie", "musical"/"music")"""
+    if len(term) > 3 and term.endswith("s"):
+        term = term[:-1]
+    return term[:5]
+
+def _terms(text: str) -> FrozenSet[str]:
+    return frozenset(_stem(token) for token in tokenize(text))
+
+class ProfileChunk:
+    """One selectable piece of a companion profile"""
+    __slots__ = ("text", "terms")
+
+    def __init__(self, text: str):
+        self.text = text
+        self.terms = _terms(text)
+
+class CompanionProfile:
+    """Core persona prompt plus the indexed profile chunks of one companion"""
+
+    def __init__(self, companion_context: Dict):
+        name = companion_context.get("name", "AI Companion")
+        sentences = [
+            sentence.strip()
+            for sentence in _SENTENCE_END.split((companion_context.get("backstory") or "").strip())
+            if sentence.strip()
+        ]
+        traits = companion_context.get("personality_traits") or []
+        speaking_style = companion_context.get("speaking_style", "friendly")
+
+        identity = f" {sentences[0]}" if sentences else ""
+        core = (
+            f"You are {name}, a knowledgeable AI companion having a natural voice conversation.{identity}\n\n"
+            f"PERSONALITY: {', '.join(traits) if traits else 'Friendly, helpful, and genuine'}\n"
+            f"CONVERSATION STYLE: {speaking_style} and natural\n\n"
+            + CORE_PRINCIPLES.format(name=name)
+        )
+        self.core = CompiledPrompt(core, count_tokens(core), prompt_version(companion_context) + ("core",))
+        self.backstory = [ProfileChunk(sentence) for sentence in sentences[1:]]
+        self.interests = [ProfileChunk(interest) for interest in companion_context.get("interests") or []]
+
+    def select(self, message: str) -> Optional[str]:
+        """
+        Profile text relevant to a message
+
+        Returns:
+            The profile system message, or None if nothing is relevant
+        """
+        if _SELF_QUESTION.search(message):
+            backstory = self.backstory
+            interests = self.interests
+        else:
+            terms = _terms(message)
+            backstory = self._best(self.backstory, terms, MAX_BACKSTORY_CHUNKS)
+            interests = self._best(self.interests, terms, MAX_INTEREST_CHUNKS)
+
+        lines = [chunk.text for chunk in backstory]
+        if interests:
+            lines.append("Interests: " + ", ".join(chunk.text for chunk in interests))
+        if not lines:
+            return None
+        return "\n".join([PROFILE_HEADER] + lines)
+
+    @staticmethod
+    def _best(chunks: List[ProfileChunk], terms: FrozenSet[str], limit: int) -> List[ProfileChunk]:
+        """Chunks sharing the most terms with the message, in profile order"""
+        scored = [(len(chunk.terms & terms), index) for index, chunk in enumerate(chunks)]
+        best = sorted((item for item in scored if item[0]), key=lambda item: (-item[0], item[1]))[:limit]
+        return [chunks[index] for _, index in sorted(best, key=lambda item: item[1])]
+
+class CompanionProfileCache:
+    """Bounded LRU of indexed companion profiles keyed by prompt version"""
+
+    def __init__(self, max_entries: int = 32):
+        self.max_entries = max_entries
+        self._profiles: "OrderedDict[Tuple, CompanionProfile]" = OrderedDict()
+
+        # Metrics
+        self.selections = 0
+        self.sliced_tokens = 0
+        self.full_tokens = 0
+
+    def get(self, companion_context: Dict) -> CompanionProfile:
+        """Indexed profile for a companion, built on a miss"""
+        version = prompt_version(companion_context)
+        profile = self._profiles.get(version)
+        if profile is None:
+            profile = self._profiles[version] = CompanionProfile(companion_context)
+            if len(self._profiles) > self.max_entries:
+                self._profiles.popitem(last=False)
+        else:
+            self._profiles.move_to_end(version)
+        return profile
+
+    def record(self, sliced_tokens: int, full_tokens: int):
+        """Count prompt tokens sent vs. what the full profile prompt would have cost"""
+        self.selections += 1
+        self.sliced_tokens += sliced_tokens
+        self.full_tokens += full_tokens
+
+    def invalidate(self):
+        """Drop every cached profile"""
+        self._profiles.clear()
+
+    def get_stats(self) -> Dict:
+        """Profile prompt tokens, sliced vs. full"""
+        return {
+            "profiles": len(self._profiles),
+            "selections": self.selections,
+            "avg_profile_tokens": round(self.sliced_tokens / self.selections, 1) if self.selections else None,
+            "avg_full_prompt_tokens": round(self.full_tokens / self.selections, 1) if self.selections else None,
+            "token_reduction": round(1 - self.sliced_tokens / self.full_tokens, 4) if self.full_tokens else None
+        }
+
+# Create singleton instance
+companion_profiles = CompanionProfileCache()
@@ -0,0 +1,178 @@
+"""
+Context Assembler
+Packs the LLM prompt for a turn into a token budget
+
+The prompt is: the static companion system prompt, the profile details
+relevant to this message and the rolling summary of older turns (if
+any, as further system messages so the static prefix stays cacheable),
+recalled long-term memories, as many recent history
+turns as fit (newest first, each message capped in length), and the
+current user message. History never pushes the prompt over the budget:
+the newest turn is always kept (cut down if it does not fit whole) and
+older turns that do not fit are dropped oldest first. The summary and
+memories only get what the recent history leaves, the summary cut to
+fit. Token counts use the local tokenizer (see token_counter), so they
+are close to but not exactly what each provider bills.
+"""
+import logging
+from typing import Dict, List, Optional
+from app.services.prompt_cache import CompiledPrompt
+from app.services.token_counter import count_tokens, truncate_to_tokens
+
+logger = logging.getLogger(__name__)
+
+# Role and formatting tokens added per chat message, and to prime the reply
+MESSAGE_OVERHEAD_TOKENS = 4
+REPLY_PRIMING_TOKENS = 3
+
+SUMMARY_HEADER = "WHAT YOU REMEMBER FROM EARLIER CONVERSATIONS WITH THIS USER:"
+MEMORY_HEADER = "EARLIER MOMENTS WITH THIS USER THAT MAY BE RELEVANT NOW:"
+
+class AssembledContext:
+    """Messages for one LLM call and what went into them"""
+    __slots__ = ("messages", "token_count", "history_turns", "dropped_turns", "memory_turns")
+
+    def __init__(self, messages: List[Dict], token_count: int, history_turns: int, dropped_turns: int,
+                 memory_turns: int = 0):
+        self.messages = messages
+        self.token_count = token_count
+        self.history_turns = history_turns
+        self.dropped_turns = dropped_turns
+        self.memory_turns = memory_turns
+
+class ContextAssembler:
+    """Builds token-budgeted message lists and tracks tokens sent per turn"""
+
+    def __init__(self):
+        self.budget_tokens = 2000
+        self.max_message_tokens = 200
+
+        # Metrics
+        self.turns = 0
+        self.total_tokens = 0
+        self.max_tokens = 0
+        self.over_budget = 0
+        self.dropped_turns = 0
+
+    def configure(self, settings):
+        """Apply budget settings"""
+        self.budget_tokens = settings.llm_context_budget_tokens
+        self.max_message_tokens = settings.llm_history_message_max_tokens
+
+    def assemble(
+        self,
+        system_prompt: CompiledPrompt,
+        user_message: str,
+        chat_history: Optional[List[Dict]] = None,
+        summary: Optional[str] = None,
+        memories: Optional[List[Dict]] = None,
+        profile: Optional[str] = None
+    ) -> AssembledContext:
+        """
+        Build the message list for a turn
+
+        Args:
+            system_prompt: Compiled companion system prompt
+            user_message: Current user message
+            chat_history: Recent turns, newest first
+            summary: Rolling summary of turns older than chat_history
+            memories: Recalled older turns, most relevant first
+            profile: Companion profile details selected for this message
+
+        Returns:
+            Messages in OpenAI format (system, profile, summary, memories, history oldest first, user)
+        """
+        used = (
+            REPLY_PRIMING_TOKENS
+            + system_prompt.token_count + MESSAGE_OVERHEAD_TOKENS
+            + count_tokens(user_message) + MESSAGE_OVERHEAD_TOKENS
+        )
+        if profile:
+            used += count_tokens(profile) + MESSAGE_OVERHEAD_TOKENS
+
+        packed = []
+        for chat in chat_history or []:
+            user_text = truncate_to_tokens(chat.get("user_message", ""), self.max_message_tokens)
+            ai_text = truncate_to_tokens(chat.get("ai_response", ""), self.max_message_tokens)
+            cost = count_tokens(user_text) + count_tokens(ai_text) + 2 * MESSAGE_OVERHEAD_TOKENS
+            if used + cost > self.budget_tokens:
+                if packed:
+                    break
+                # The newest turn is kept, cut down to the room left
+                room = (self.budget_tokens - used) // 2 - MESSAGE_OVERHEAD_TOKENS
+                if room <= 0:
+                    break
+                user_text = truncate_to_tokens(user_text, room)
+                ai_text = truncate_to_tokens(ai_text, room)
+                cost = count_tokens(user_text) + count_tokens(ai_text) + 2 * MESSAGE_OVERHEAD_TOKENS
+            packed.append((user_text, ai_text))
+            used += cost
+
+        summary_message = None
+        if summary:
+            room = self.budget_tokens - used - MESSAGE_OVERHEAD_TOKENS - count_tokens(SUMMARY_HEADER) - 1
+            while room > 0:
+                message = f"{SUMMARY_HEADER}\n{truncate_to_tokens(summary, room)}"
+                cost = count_tokens(message) + MESSAGE_OVERHEAD_TOKENS
+                if used + cost <= self.budget_tokens:
+                    summary_message = message
+                    used += cost
+                    break
+                # Tokens can merge differently across the joined header
+                room -= used + cost - self.budget_tokens
+
+        memory_lines = []
+        if memories:
+            used += count_tokens(MEMORY_HEADER) + MESSAGE_OVERHEAD_TOKENS
+            for memory in memories:
+                line = (
+                    f"- User: {truncate_to_tokens(memory.get('user_message', ''), self.max_message_tokens)}\n"
+                    f"  You: {truncate_to_tokens(memory.get('ai_response', ''), self.max_message_tokens)}"
+                )
+                cost = count_tokens(line) + 1
+                if used + cost > self.budget_tokens:
+                    break
+                memory_lines.append(line)
+                used += cost
+            if not memory_lines:
+                used -= count_tokens(MEMORY_HEADER) + MESSAGE_OVERHEAD_TOKENS
+
+        messages = [{"role": "system", "content": system_prompt.text}]
+        if profile:
+            messages.append({"role": "system", "content": profile})
+        if summary_message:
+            messages.append({"role": "system", "content": summary_message})
+        if memory_lines:
+            messages.append({"role": "system", "content": "\n".join([MEMORY_HEADER] + memory_lines)})
+        for user_text, ai_text in reversed(packed):
+            messages.append({"role": "user", "content": user_text})
+            messages.append({"role": "assistant", "content": ai_text})
+        messages.append({"role": "user", "content": user_message})
+
+        dropped = len(chat_history or []) - len(packed)
+        self._record(used, dropped)
+        return AssembledContext(messages, used, len(packed), dropped, len(memory_lines))
+
+    def _record(self, token_count: int, dropped: int):
+        self.turns += 1
+        self.total_tokens += token_count
+        self.max_tokens = max(self.max_tokens, token_count)
+        self.dropped_turns += dropped
+        if token_count > self.budget_tokens:
+            # Only possible when the system prompt, profile and message alone exceed it
+            self.over_budget += 1
+            logger.warning(f"Prompt exceeds token budget without history: {token_count} > {self.budget_tokens}")
+
+    def get_stats(self) -> Dict:
+        """Tokens sent per turn"""
+        return {
+            "budget_tokens": self.budget_tokens,
+            "turns": self.turns,
+            "avg_tokens_per_turn": round(self.total_tokens / self.turns, 1) if self.turns else None,
+            "max_tokens_per_turn": self.max_tokens,
+            "over_budget": self.over_budget,
+            "dropped_history_turns": self.dropped_turns
+        }
+
+# Create singleton instance
+context_assembler = ContextAssembler()
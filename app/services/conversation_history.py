@@ -0,0 +1,174 @@
+"""
+Conversation History Cache
+Bounded in-memory ring buffer of recent turns per (user, companion)
+
+Each turn handler needs the last few exchanges to build LLM context.
+Those are turns this server just wrote, so they are kept here as compact
+tuples and the chats collection is only queried on a miss (first turn
+after startup or after eviction). Conversations are evicted least
+recently used first once the estimated memory use exceeds the cap.
+
+The buffer only sees this process's writes, so with several workers a
+turn or clear handled by another worker would go unnoticed. Each
+conversation can be re-read from the chats collection once it is older
+than history_cache_ttl_seconds. The default of 0 never expires entries,
+so a single worker only queries Mongo on the first turn; with several
+workers a TTL trades that for freshness (turns further apart than the
+TTL then each re-read the conversation).
+"""
+import sys
+import logging
+import time
+from collections import OrderedDict, deque
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from app.repositories.chat_repository import chat_repository, CONTEXT_PROJECTION
+
+logger = logging.getLogger(__name__)
+
+ConversationKey = Tuple[str, str]
+
+def _turn_size(turn: Tuple[str, str, datetime]) -> int:
+    """Approximate bytes held by one (user_message, ai_response, timestamp) turn"""
+    return sys.getsizeof(turn) + sum(sys.getsizeof(part) for part in turn)
+
+class _Conversation:
+    """Recent turns of one conversation, oldest first"""
+    __slots__ = ("turns", "nbytes", "loaded_at")
+
+    def __init__(self, max_turns: int):
+        self.turns = deque(maxlen=max_turns)
+        self.nbytes = sys.getsizeof(self.turns)
+        self.loaded_at = time.monotonic()
+
+    def append(self, turn: Tuple[str, str, datetime]) -> int:
+        """Add a turn, returns the change in estimated bytes"""
+        before = self.nbytes
+        if len(self.turns) == self.turns.maxlen:
+            self.nbytes -= _turn_size(self.turns[0])
+        self.turns.append(turn)
+        self.nbytes += _turn_size(turn)
+        return self.nbytes - before
+
+class ConversationHistoryCache:
+    """LRU of per-conversation ring buffers with a total memory cap"""
+
+    def __init__(self):
+        self.max_turns = 5
+        self.max_bytes = 64 * 1024 * 1024
+        self.ttl_seconds = 0.0
+        self._conversations: "OrderedDict[ConversationKey, _Conversation]" = OrderedDict()
+        self._total_bytes = 0
+
+        # Metrics
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def configure(self, settings):
+        """Apply cache settings"""
+        self.max_turns = settings.history_cache_turns
+        self.max_bytes = settings.history_cache_max_mb * 1024 * 1024
+        self.ttl_seconds = settings.history_cache_ttl_seconds
+
+    async def get_recent(self, user_id: str, companion_gender: str) -> List[Dict]:
+        """
+        Recent turns, newest first, in the same shape as the chats query
+
+        Hydrates the conversation from the chats collection on a miss or
+        once the cached copy has expired.
+        """
+        key = (user_id, companion_gender)
+        conversation = self._conversations.get(key)
+        if (
+            conversation is not None and self.ttl_seconds > 0
+            and time.monotonic() - conversation.loaded_at > self.ttl_seconds
+        ):
+            # Other workers may have written or cleared turns since it was loaded
+            self._total_bytes -= self._conversations.pop(key).nbytes
+            self.expirations += 1
+            conversation = None
+
+        if conversation is not None:
+            self.hits += 1
+            self._conversations.move_to_end(key)
+        else:
+            self.misses += 1
+            recent_chats = await chat_repository.find_recent(
+                user_id, companion_gender, limit=self.max_turns,
+                projection=CONTEXT_PROJECTION
+            )
+            # Another request may have hydrated it while we were waiting
+            conversation = self._conversations.get(key)
+            if conversation is None:
+                conversation = _Conversation(self.max_turns)
+                for chat in reversed(recent_chats):
+                    conversation.append((
+                        chat.get("user_message", ""),
+                        chat.get("ai_response", ""),
+                        chat.get("timestamp")
+                    ))
+                self._conversations[key] = conversation
+                self._total_bytes += conversation.nbytes
+                self._evict()
+
+        return [
+            {"user_message": user_message, "ai_response": ai_response, "timestamp": timestamp}
+            for user_message, ai_response, timestamp in reversed(conversation.turns)
+        ]
+
+    def append(
+        self,
+        user_id: str,
+        companion_gender: str,
+        user_message: str,
+        ai_response: str,
+        timestamp: datetime
+    ):
+        """Record a turn this server just wrote (only if the conversation is cached)"""
+        key = (user_id, companion_gender)
+        conversation = self._conversations.get(key)
+        if conversation is None:
+            # Not hydrated: the next read loads it, including this turn, from Mongo
+            return
+
+        self._total_bytes += conversation.append((user_message, ai_response, timestamp))
+        self._conversations.move_to_end(key)
+        self._evict()
+
+    def invalidate(self, user_id: str, companion_gender: Optional[str] = None):
+        """Drop a user's cached conversations (all companions if gender is None)"""
+        keys = [
+            key for key in self._conversations
+            if key[0] == user_id and (companion_gender is None or key[1] == companion_gender)
+        ]
+        for key in keys:
+            self._total_bytes -= self._conversations.pop(key).nbytes
+
+    def _evict(self):
+        """Evict least recently used conversations until under the memory cap"""
+        while self._total_bytes > self.max_bytes and len(self._conversations) > 1:
+            _, conversation = self._conversations.popitem(last=False)
+            self._total_bytes -= conversation.nbytes
+            self.evictions += 1
+
+    def get_stats(self) -> Dict:
+        """Cache metrics, including estimated memory per conversation"""
+        count = len(self._conversations)
+        lookups = self.hits + self.misses
+        return {
+            "conversations": count,
+            "estimated_bytes": self._total_bytes,
+            "bytes_per_conversation": self._total_bytes // count if count else 0,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else None,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "ttl_seconds": self.ttl_seconds
+        }
+
+# Create singleton instance
+conversation_history = ConversationHistoryCache()
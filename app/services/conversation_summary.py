@@ -0,0 +1,204 @@
+"""
+Conversation Summary
+Rolling per-(user, companion) summary memory
+
+The LLM sees the last few turns verbatim (see conversation_history) plus
+one summary of everything older, so prompt size stays constant however
+long a conversation runs. Every N turns a refresh is started in the
+background (never on the request path): it folds the chats that have
+aged out of the verbatim window since the last refresh into the summary
+and stores it with the timestamp of the newest chat it covers.
+
+Summaries are cached per worker; a refresh done by another worker is
+picked up once this worker's entry is evicted or refreshed itself.
+
+Clearing a conversation bumps its generation; a refresh that was already
+running when the history was cleared then discards its summary instead
+of writing one of the deleted chats back.
+"""
+import asyncio
+import logging
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+from app.repositories.chat_repository import chat_repository, CONTEXT_PROJECTION
+from app.repositories.summary_repository import summary_repository
+from app.services.admission import Priority, request_priority
+from app.services.ai_service_enhanced import enhanced_ai_service
+from app.services.token_counter import truncate_to_tokens
+
+logger = logging.getLogger(__name__)
+
+ConversationKey = Tuple[str, str]
+
+# Most aged-out chats folded into the summary by one refresh
+SUMMARY_BATCH_TURNS = 50
+
+class ConversationSummaryService:
+    """Caches conversation summaries and refreshes them in the background"""
+
+    def __init__(self):
+        self.enabled = True
+        self.refresh_turns = 10
+        self.recent_turns = 5
+        self.max_tokens = 200
+        self.max_entries = 10000
+        self._summaries: "OrderedDict[ConversationKey, Optional[str]]" = OrderedDict()
+        self._turns_since_refresh: Dict[ConversationKey, int] = {}
+        self._refreshing: Dict[ConversationKey, asyncio.Task] = {}
+        # Bumped by clear() while a refresh of the conversation is running
+        self._generations: Dict[ConversationKey, int] = {}
+
+        # Metrics
+        self.hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        self.failures = 0
+        self.summarized_turns = 0
+
+    def configure(self, settings):
+        """Apply summary settings"""
+        self.enabled = settings.summary_enabled
+        self.refresh_turns = settings.summary_refresh_turns
+        self.recent_turns = settings.history_cache_turns
+        self.max_tokens = settings.summary_max_tokens
+
+    async def get(self, user_id: str, companion_gender: str) -> Optional[str]:
+        """Summary of the conversation before the verbatim window, or None"""
+        if not self.enabled:
+            return None
+
+        key = (user_id, companion_gender)
+        if key in self._summaries:
+            self.hits += 1
+            self._summaries.move_to_end(key)
+            return self._summaries[key]
+
+        self.misses += 1
+        doc = await summary_repository.get(user_id, companion_gender)
+        summary = doc["summary"] if doc else None
+        self._remember(key, summary)
+        return summary
+
+    def note_turn(self, user_id: str, companion_gender: str):
+        """Count a stored turn; starts a background refresh every refresh_turns turns"""
+        if not self.enabled:
+            return
+
+        key = (user_id, companion_gender)
+        count = self._turns_since_refresh.pop(key, 0) + 1
+        if count >= self.refresh_turns and key not in self._refreshing:
+            self._generations[key] = 0
+            task = asyncio.create_task(self._refresh(key))
+            self._refreshing[key] = task
+            task.add_done_callback(lambda _: self._finish_refresh(key))
+            return
+
+        # Re-inserted at the end, so the oldest counters are dropped first
+        self._turns_since_refresh[key] = count
+        if len(self._turns_since_refresh) > self.max_entries:
+            self._turns_since_refresh.pop(next(iter(self._turns_since_refresh)))
+
+    async def _refresh(self, key: ConversationKey):
+        """Fold chats that left the verbatim window into the summary"""
+        user_id, companion_gender = key
+        if not enhanced_ai_service.llm_provider:
+            return  # Mock responses only: nothing to summarize with
+        # Runs in its own task, so this only affects the refresh's own LLM call
+        request_priority.set(Priority.BACKGROUND)
+        try:
+            recent = await chat_repository.find_recent(
+                user_id, companion_gender, limit=self.recent_turns, projection=CONTEXT_PROJECTION
+            )
+            if len(recent) < self.recent_turns:
+                return  # Everything still fits in the verbatim window
+
+            doc = await summary_repository.get(user_id, companion_gender)
+            aged_out = await chat_repository.find_between(
+                user_id,
+                companion_gender,
+                after=doc["summarized_until"] if doc else None,
+                before=recent[-1]["timestamp"],
+                limit=SUMMARY_BATCH_TURNS,
+                projection=CONTEXT_PROJECTION
+            )
+            if not aged_out:
+                return
+
+            summary = await enhanced_ai_service.summarize_conversation(
+                doc["summary"] if doc else None,
+                aged_out,
+                max_tokens=self.max_tokens
+            )
+            if not summary:
+                return
+            summary = truncate_to_tokens(summary.strip(), self.max_tokens)
+
+            if self._generations.get(key):
+                logger.info(f"Conversation summary refresh discarded, history was cleared: User {user_id} ({companion_gender})")
+                return
+            await summary_repository.save(
+                user_id, companion_gender, summary, aged_out[-1]["timestamp"], len(aged_out)
+            )
+            if self._generations.get(key):
+                # Cleared while the write was in flight: undo it
+                await summary_repository.delete_for_user(user_id, companion_gender)
+                return
+            self._remember(key, summary)
+            self.refreshes += 1
+            self.summarized_turns += len(aged_out)
+            logger.info(f"Conversation summary refreshed: User {user_id} ({companion_gender}), {len(aged_out)} turns folded in")
+
+        except Exception as e:
+            self.failures += 1
+            logger.error(f"Conversation summary refresh failed for user {user_id}: {str(e) or type(e).__name__}")
+
+    def _finish_refresh(self, key: ConversationKey):
+        self._refreshing.pop(key, None)
+        self._generations.pop(key, None)
+
+    def _remember(self, key: ConversationKey, summary: Optional[str]):
+        self._summaries[key] = summary
+        self._summaries.move_to_end(key)
+        if len(self._summaries) > self.max_entries:
+            self._summaries.popitem(last=False)
+
+    async def clear(self, user_id: str, companion_gender: Optional[str] = None):
+        """Delete a user's stored summaries (all companions if gender is None) and forget them"""
+        # Before the delete, so a refresh finishing during it still sees the clear
+        for key in self._generations:
+            if key[0] == user_id and (companion_gender is None or key[1] == companion_gender):
+                self._generations[key] += 1
+        await summary_repository.delete_for_user(user_id, companion_gender)
+        # After the delete, so nothing read during it stays cached
+        self.invalidate(user_id, companion_gender)
+
+    def invalidate(self, user_id: str, companion_gender: Optional[str] = None):
+        """Forget cached summaries and turn counts for a user (or one conversation)"""
+        for mapping in (self._summaries, self._turns_since_refresh):
+            for key in [key for key in mapping if key[0] == user_id]:
+                if companion_gender is None or key[1] == companion_gender:
+                    del mapping[key]
+
+    async def stop(self):
+        """Cancel refreshes still running at shutdown"""
+        tasks = list(self._refreshing.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def get_stats(self) -> Dict:
+        """Summary metrics"""
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "refresh_turns": self.refresh_turns,
+            "cached": len(self._summaries),
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else None,
+            "refreshing": len(self._refreshing),
+            "refreshes": self.refreshes,
+            "failures": self.failures,
+            "summarized_turns": self.summarized_turns
+        }
+
+# Create singleton instance
+conversation_summary = ConversationSummaryService()
@@ -0,0 +1,195 @@
+"""
+Fake Providers
+Offline stand-ins for the LLM and ElevenLabs clients, for load testing
+
+The fakes mimic the client surfaces the real code calls
+(chat.completions.create with and without stream=True, and
+text_to_speech.convert), so LLM_PROVIDER=fake / TTS_PROVIDER=fake run
+the same provider, router, pipeline and cache code paths as production
+without network or API cost.
+
+- latency: time to first token / first byte is drawn from a lognormal
+  distribution around the configured median; text streams at a fixed
+  tokens/sec and audio at a fixed bytes/sec
+- errors: each call fails with the configured probability
+- output: text and audio depend only on the input (and seed), so runs
+  are reproducible; audio is a sequence of silent MP3 frames
+"""
+import asyncio
+import hashlib
+import math
+import random
+import time
+from types import SimpleNamespace
+from typing import Dict, Iterator, List
+from app.config import settings
+
+# Silent MPEG-1 Layer III frame: 128 kbps, 44.1 kHz, mono, all-zero side
+# info and main data (417 bytes, ~26 ms of audio)
+_SILENT_MP3_FRAME = bytes([0xFF, 0xFB, 0x90, 0xC0]) + bytes(413)
+
+# Frames per character of text (~15 characters per second of speech)
+_FRAMES_PER_CHAR = 2.5
+
+# Audio is yielded in chunks of this size, like the ElevenLabs stream
+_AUDIO_CHUNK_BYTES = 4096
+
+_VOCABULARY = (
+    "that sounds really nice and I would love to hear more about how your day "
+    "went because it seems like you have been thinking about this for a while "
+    "tell me what happened next and how you felt about it honestly"
+).split()
+
+class FakeProviderError(Exception):
+    """Injected provider failure"""
+
+    def __init__(self, status_code: int = 503):
+        super().__init__(f"Fake provider error ({status_code})")
+        self.status_code = status_code
+
+class LatencyModel:
+    """Lognormal delays around a median, plus injected errors"""
+
+    def __init__(self, median_ms: float, sigma: float, error_rate: float, seed: int):
+        self.median_ms = median_ms
+        self.sigma = sigma
+        self.error_rate = error_rate
+        self._random = random.Random(seed)
+
+    def first_delay(self) -> float:
+        """Seconds until the first token / byte"""
+        if self.median_ms <= 0:
+            return 0.0
+        if self.sigma <= 0:
+            return self.median_ms / 1000
+        return self._random.lognormvariate(math.log(self.median_ms / 1000), self.sigma)
+
+    def should_fail(self) -> bool:
+        return self.chance(self.error_rate)
+
+    def chance(self, probability: float) -> bool:
+        return self._random.random() < probability
+
+def _seeded(seed: int, *parts: str) -> random.Random:
+    """RNG determined only by the seed and the given input"""
+    digest = hashlib.sha256("\x1f".join((str(seed),) + parts).encode("utf-8")).digest()
+    return random.Random(int.from_bytes(digest[:8], "big"))
+
+def fake_completion_tokens(messages: List[Dict], max_tokens: int, output_tokens: int, seed: int) -> List[str]:
+    """Deterministic reply for a message list, as streamed tokens"""
+    last_user = next((m["content"] for m in reversed(messages) if m["role"] == "user"), "")
+    rng = _seeded(seed, last_user, str(len(messages)))
+
+    tokens = []
+    sentence_length = 0
+    for index in range(min(output_tokens, max_tokens)):
+        word = rng.choice(_VOCABULARY)
+        if sentence_length == 0:
+            word = word.capitalize()
+        sentence_length += 1
+        end_of_sentence = sentence_length >= rng.randint(6, 12) or index == min(output_tokens, max_tokens) - 1
+        if end_of_sentence:
+            word += "."
+            sentence_length = 0
+        tokens.append(word if index == 0 else " " + word)
+    return tokens
+
+class _FakeChatStream:
+    """Async iterator of OpenAI-style chunks, paced like a real stream"""
+
+    def __init__(self, tokens: List[str], first_delay: float, tokens_per_second: float, fail_midway: bool):
+        self._tokens = tokens
+        self._first_delay = first_delay
+        self._interval = 1 / tokens_per_second if tokens_per_second > 0 else 0
+        self._fail_at = len(tokens) // 2 if fail_midway else None
+
+    async def __aiter__(self):
+        await asyncio.sleep(self._first_delay)
+        for index, token in enumerate(self._tokens):
+            if index == self._fail_at:
+                raise FakeProviderError(502)
+            if index:
+                await asyncio.sleep(self._interval)
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=token))])
+
+    async def close(self):
+        pass
+
+class _FakeCompletions:
+    def __init__(self, owner: "FakeChatClient"):
+        self._owner = owner
+
+    async def create(self, model: str, messages: List[Dict], temperature: float = 1.0,
+                     max_tokens: int = 150, stream: bool = False, **kwargs):
+        owner = self._owner
+        settings = owner.settings
+        tokens = fake_completion_tokens(messages, max_tokens, settings.fake_llm_output_tokens, settings.fake_seed)
+        first_delay = owner.latency.first_delay()
+        fails = owner.latency.should_fail()
+
+        if stream:
+            if fails and owner.latency.chance(0.5):
+                # Half of injected stream errors happen before the first token
+                await asyncio.sleep(first_delay)
+                raise FakeProviderError(503)
+            return _FakeChatStream(tokens, first_delay, settings.fake_llm_tokens_per_second, fails)
+
+        interval = 1 / settings.fake_llm_tokens_per_second if settings.fake_llm_tokens_per_second > 0 else 0
+        await asyncio.sleep(first_delay + interval * max(len(tokens) - 1, 0))
+        if fails:
+            raise FakeProviderError(503)
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content="".join(tokens)))])
+
+class FakeChatClient:
+    """Stand-in for AsyncOpenAI / AsyncGroq"""
+
+    def __init__(self, api_key: str = "fake", timeout: float = None):
+        self.settings = settings
+        self.latency = LatencyModel(
+            settings.fake_llm_ttft_ms, settings.fake_latency_sigma,
+            settings.fake_llm_error_rate, settings.fake_seed
+        )
+        self.chat = SimpleNamespace(completions=_FakeCompletions(self))
+
+    async def close(self):
+        pass
+
+def fake_audio(text: str) -> bytes:
+    """Deterministic silent MP3 whose length follows the text length"""
+    frames = max(1, math.ceil(len(text) * _FRAMES_PER_CHAR))
+    return _SILENT_MP3_FRAME * frames
+
+class _FakeTextToSpeech:
+    def __init__(self, owner: "FakeElevenLabs"):
+        self._owner = owner
+
+    def convert(self, voice_id: str, text: str, model_id: str = None, voice_settings=None, **kwargs) -> Iterator[bytes]:
+        """Blocking chunked audio stream, like ElevenLabs text_to_speech.convert"""
+        owner = self._owner
+        first_delay = owner.latency.first_delay()
+        fails = owner.latency.should_fail()
+        bytes_per_second = owner.settings.fake_tts_bytes_per_second
+
+        def chunks() -> Iterator[bytes]:
+            time.sleep(first_delay)
+            if fails:
+                raise FakeProviderError(503)
+            audio = fake_audio(text)
+            for start in range(0, len(audio), _AUDIO_CHUNK_BYTES):
+                chunk = audio[start:start + _AUDIO_CHUNK_BYTES]
+                if start and bytes_per_second > 0:
+                    time.sleep(len(chunk) / bytes_per_second)
+                yield chunk
+
+        return chunks()
+
+class FakeElevenLabs:
+    """Stand-in for the ElevenLabs client"""
+
+    def __init__(self, api_key: str = "fake"):
+        self.settings = settings
+        self.latency = LatencyModel(
+            settings.fake_tts_ttfb_ms, settings.fake_latency_sigma,
+            settings.fake_tts_error_rate, settings.fake_seed
+        )
+        self.text_to_speech = _FakeTextToSpeech(self)
@@ -0,0 +1,308 @@
+"""
+LLM Providers
+Async clients for OpenAI, Groq and Anthropic (plus an offline fake) behind one interface
+
+Every provider takes an OpenAI-style message list (the first message may
+be the system prompt) and either returns the completion text (complete)
+or yields it in deltas as they arrive (stream). Calls are bounded by a
+per-call timeout and are cancelled cleanly if the caller is. With an
+admission controller attached, each call first waits for a slot, and a
+429 is retried (within the queue-wait deadline) once the provider's
+Retry-After has passed.
+"""
+import asyncio
+import logging
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+from app.services.admission import AdmissionController, rate_limit_retry_after
+from app.services.token_counter import count_tokens
+
+logger = logging.getLogger(__name__)
+
+# Retries of a rate-limited (429) call before the error is raised
+RATE_LIMIT_RETRIES = 2
+
+# Try to import async LLM clients
+try:
+    from openai import AsyncOpenAI
+except ImportError:
+    AsyncOpenAI = None
+try:
+    from groq import AsyncGroq
+except ImportError:
+    AsyncGroq = None
+from app.services.fake_providers import FakeChatClient
+try:
+    from anthropic import AsyncAnthropic, NOT_GIVEN
+except ImportError:
+    AsyncAnthropic = None
+    NOT_GIVEN = None
+
+class LLMProvider:
+    """Base class for async chat-completion providers"""
+
+    name = "base"
+    client_class = None
+
+    def __init__(self, api_key: str, model: str, timeout: float):
+        self.model = model
+        self.timeout = timeout
+        self.client = self.client_class(api_key=api_key, timeout=timeout)
+        self.limiter: Optional[AdmissionController] = None
+
+    def _estimate_tokens(self, messages: List[Dict], max_tokens: int) -> int:
+        """Prompt plus reply tokens, for the tokens/min limit"""
+        if self.limiter is None or not self.limiter.counts_tokens:
+            return 0
+        return sum(count_tokens(message["content"]) for message in messages) + max_tokens
+
+    def _should_retry(self, error: Exception, attempt: int) -> bool:
+        """Throttle the limiter on a 429 and tell whether to try again"""
+        retry_after = rate_limit_retry_after(error)
+        if retry_after is None or self.limiter is None:
+            return False
+        self.limiter.throttle(retry_after)
+        logger.warning(f"LLM provider {self.name} rate limited (retry after {retry_after:.1f}s)")
+        return attempt < RATE_LIMIT_RETRIES
+
+    async def complete(
+        self,
+        messages: List[Dict],
+        temperature: float = 0.8,
+        max_tokens: int = 150,
+        timeout: Optional[float] = None
+    ) -> str:
+        """
+        Generate a completion
+
+        Raises:
+            asyncio.TimeoutError: If the provider does not answer in time
+            AdmissionTimeoutError: If no slot frees up before the queue-wait deadline
+        """
+        if self.limiter is None:
+            return await asyncio.wait_for(
+                self._complete(messages, temperature, max_tokens),
+                timeout=timeout or self.timeout
+            )
+
+        tokens = self._estimate_tokens(messages, max_tokens)
+        deadline = self.limiter.deadline_for()
+        attempt = 0
+        while True:
+            async with self.limiter.slot(tokens, deadline=deadline):
+                try:
+                    text = await asyncio.wait_for(
+                        self._complete(messages, temperature, max_tokens),
+                        timeout=timeout or self.timeout
+                    )
+                except Exception as e:
+                    if not self._should_retry(e, attempt):
+                        raise
+                    attempt += 1
+                    continue
+            self.limiter.record_success()
+            return text
+
+    async def stream(
+        self,
+        messages: List[Dict],
+        temperature: float = 0.8,
+        max_tokens: int = 150,
+        timeout: Optional[float] = None
+    ) -> AsyncIterator[str]:
+        """
+        Yield completion text deltas as the provider produces them
+
+        The timeout bounds the wait for each delta (including the first).
+        The admission slot is held until the stream ends; a 429 is only
+        retried before the first delta.
+
+        Raises:
+            asyncio.TimeoutError: If the provider stalls for longer than the timeout
+            AdmissionTimeoutError: If no slot frees up before the queue-wait deadline
+        """
+        if self.limiter is None:
+            async for delta in self._stream_deltas(messages, temperature, max_tokens, timeout):
+                yield delta
+            return
+
+        tokens = self._estimate_tokens(messages, max_tokens)
+        deadline = self.limiter.deadline_for()
+        attempt = 0
+        while True:
+            async with self.limiter.slot(tokens, deadline=deadline):
+                started = False
+                deltas = self._stream_deltas(messages, temperature, max_tokens, timeout)
+                try:
+                    async for delta in deltas:
+                        started = True
+                        yield delta
+                except Exception as e:
+                    if started or not self._should_retry(e, attempt):
+                        raise
+                    attempt += 1
+                    continue
+                finally:
+                    await deltas.aclose()
+            self.limiter.record_success()
+            return
+
+    async def _stream_deltas(
+        self,
+        messages: List[Dict],
+        temperature: float,
+        max_tokens: int,
+        timeout: Optional[float]
+    ) -> AsyncIterator[str]:
+        timeout = timeout or self.timeout
+        deltas = self._stream(messages, temperature, max_tokens)
+        try:
+            while True:
+                try:
+                    delta = await asyncio.wait_for(deltas.__anext__(), timeout=timeout)
+                except StopAsyncIteration:
+                    return
+                if delta:
+                    yield delta
+        finally:
+            await deltas.aclose()
+
+    async def _complete(self, messages: List[Dict], temperature: float, max_tokens: int) -> str:
+        raise NotImplementedError
+
+    def _stream(self, messages: List[Dict], temperature: float, max_tokens: int) -> AsyncIterator[str]:
+        raise NotImplementedError
+
+    async def close(self):
+        """Release the underlying HTTP client"""
+        close = getattr(self.client, "close", None)
+        if close is not None:
+            await close()
+
+class OpenAICompatibleProvider(LLMProvider):
+    """Providers exposing the OpenAI chat.completions API"""
+
+    async def _complete(self, messages: List[Dict], temperature: float, max_tokens: int) -> str:
+        response = await self.client.chat.completions.create(
+            model=self.model,
+            messages=messages,
+            temperature=temperature,
+            max_tokens=max_tokens
+        )
+        return response.choices[0].message.content
+
+    async def _stream(self, messages: List[Dict], temperature: float, max_tokens: int) -> AsyncIterator[str]:
+        stream = await self.client.chat.completions.create(
+            model=self.model,
+            messages=messages,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            stream=True
+        )
+        try:
+            async for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+        finally:
+            await stream.close()
+
+class OpenAIProvider(OpenAICompatibleProvider):
+    """OpenAI via AsyncOpenAI"""
+
+    name = "openai"
+    client_class = AsyncOpenAI
+
+class GroqProvider(OpenAICompatibleProvider):
+    """Groq via AsyncGroq"""
+
+    name = "groq"
+    client_class = AsyncGroq
+
+class FakeProvider(OpenAICompatibleProvider):
+    """Offline fake with configurable latency and errors (see fake_providers)"""
+
+    name = "fake"
+    client_class = FakeChatClient
+
+class AnthropicProvider(LLMProvider):
+    """Anthropic via AsyncAnthropic"""
+
+    name = "anthropic"
+    client_class = AsyncAnthropic
+
+    def __init__(self, api_key: str, model: str, timeout: float, prompt_caching: bool = True):
+        super().__init__(api_key, model, timeout)
+        self.prompt_caching = prompt_caching
+
+    def _split_system(self, messages: List[Dict]) -> Tuple[List[Dict], List[Dict]]:
+        """
+        Anthropic takes the system prompt separately from the conversation
+
+        Leading system messages become system blocks. The first one is the
+        static companion prompt and is marked cacheable, so the provider
+        reuses the processed prefix across turns instead of re-billing it.
+        """
+        blocks = []
+        index = 0
+        while index < len(messages) and messages[index]["role"] == "system":
+            blocks.append({"type": "text", "text": messages[index]["content"]})
+            index += 1
+        if blocks and self.prompt_caching:
+            blocks[0]["cache_control"] = {"type": "ephemeral"}
+        return blocks, messages[index:]
+
+    async def _complete(self, messages: List[Dict], temperature: float, max_tokens: int) -> str:
+        system_blocks, conversation = self._split_system(messages)
+
+        response = await self.client.messages.create(
+            model=self.model,
+            system=system_blocks or NOT_GIVEN,
+            messages=conversation,
+            temperature=temperature,
+            max_tokens=max_tokens
+        )
+        return response.content[0].text
+
+    async def _stream(self, messages: List[Dict], temperature: float, max_tokens: int) -> AsyncIterator[str]:
+        system_blocks, conversation = self._split_system(messages)
+
+        async with self.client.messages.stream(
+            model=self.model,
+            system=system_blocks or NOT_GIVEN,
+            messages=conversation,
+            temperature=temperature,
+            max_tokens=max_tokens
+        ) as stream:
+            async for text in stream.text_stream:
+                yield text
+
+PROVIDER_CLASSES = {
+    "openai": OpenAIProvider,
+    "groq": GroqProvider,
+    "anthropic": AnthropicProvider,
+    "fake": FakeProvider,
+}
+
+def create_provider(llm_config: Dict, timeout: float) -> Optional[LLMProvider]:
+    """
+    Build the provider for an LLM config (see Settings.get_llm_config)
+
+    Returns:
+        Provider instance, or None if the key or client library is missing
+    """
+    provider_name = llm_config["provider"]
+    api_key = llm_config["api_key"]
+
+    if not api_key or api_key.startswith("your"):
+        logger.warning(f"No valid API key for {provider_name}. Using mock responses.")
+        return None
+
+    provider_class = PROVIDER_CLASSES[provider_name]
+    if provider_class.client_class is None:
+        logger.warning(f"Client library for {provider_name} not installed. Using mock responses.")
+        return None
+
+    # Provider-specific options (e.g. Anthropic prompt caching)
+    options = {key: value for key, value in llm_config.items() if key not in ("provider", "api_key", "model")}
+    provider = provider_class(api_key=api_key, model=llm_config["model"], timeout=timeout, **options)
+    logger.info(f"Initialized async {provider_name} client with model: {provider.model}")
+    return provider
@@ -0,0 +1,408 @@
+"""
+LLM Router
+Hedging, failover and circuit breaking across several LLM providers
+
+The router exposes the same complete()/stream() interface as a single
+LLMProvider. Providers are tried in configured order:
+- failover: if a provider errors or times out, the next one is started
+- hedging: if a provider has not answered (for streams: produced its
+  first token) within the hedge delay, the next one is started as well
+  and whichever answers first wins; the loser is cancelled
+- circuit breaking: each provider keeps an EWMA of latency and error
+  rate; once either crosses its threshold the provider is skipped until
+  a cooldown passes, after which a single probe request is let through
+- admission: each provider has its own concurrency / rate limiter (see
+  admission); a call that times out in a provider's queue fails over
+  without counting against that provider's health
+"""
+import asyncio
+import bisect
+import logging
+import time
+from typing import AsyncIterator, Dict, List, Optional
+from app.services.admission import AdmissionTimeoutError, create_controller
+from app.services.llm_providers import LLMProvider, create_provider
+
+logger = logging.getLogger(__name__)
+
+# Weight of the newest sample in the EWMAs
+EWMA_ALPHA = 0.2
+
+# Samples needed before the breaker may open
+BREAKER_MIN_CALLS = 5
+
+# Latency histogram bucket upper bounds (ms); the last bucket is unbounded
+LATENCY_BUCKETS_MS = [100, 250, 500, 1000, 2500, 5000, 10000]
+
+class NoProviderAvailableError(RuntimeError):
+    """Every provider's circuit is open"""
+
+class EmptyResponseError(RuntimeError):
+    """A provider stream ended without producing any text"""
+
+class ProviderHealth:
+    """Circuit breaker and latency statistics for one provider"""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, error_rate_threshold: float, latency_threshold_ms: float, cooldown_seconds: float):
+        self.error_rate_threshold = error_rate_threshold
+        self.latency_threshold_ms = latency_threshold_ms
+        self.cooldown_seconds = cooldown_seconds
+
+        self.state = self.CLOSED
+        self.opened_at = 0.0
+        self._probe_in_flight = False
+
+        self.calls = 0
+        self.failures = 0
+        self.ewma_latency_ms: Optional[float] = None
+        self.ewma_error_rate = 0.0
+        self.latency_histogram = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+
+    def available(self) -> bool:
+        """Whether a request may be sent now"""
+        if self.state == self.CLOSED:
+            return True
+        if self.state == self.OPEN:
+            if time.monotonic() - self.opened_at < self.cooldown_seconds:
+                return False
+            self.state = self.HALF_OPEN
+        return not self._probe_in_flight
+
+    def begin(self):
+        """Mark a request as started (it is the probe when half-open)"""
+        if self.state == self.HALF_OPEN:
+            self._probe_in_flight = True
+
+    def record_success(self, latency_ms: float):
+        """Record a completed call"""
+        self.calls += 1
+        self.latency_histogram[bisect.bisect_left(LATENCY_BUCKETS_MS, latency_ms)] += 1
+        self.ewma_latency_ms = latency_ms if self.ewma_latency_ms is None else (
+            EWMA_ALPHA * latency_ms + (1 - EWMA_ALPHA) * self.ewma_latency_ms
+        )
+        self.ewma_error_rate *= 1 - EWMA_ALPHA
+
+        if self.state == self.HALF_OPEN:
+            # Probe succeeded: start over with a clean error rate
+            self._probe_in_flight = False
+            self.state = self.CLOSED
+            self.ewma_error_rate = 0.0
+            self.ewma_latency_ms = latency_ms
+        elif self.ewma_latency_ms > self.latency_threshold_ms:
+            self._open("latency")
+
+    def record_failure(self):
+        """Record a failed or timed out call"""
+        self.calls += 1
+        self.failures += 1
+        self.ewma_error_rate = EWMA_ALPHA + (1 - EWMA_ALPHA) * self.ewma_error_rate
+
+        if self.state == self.HALF_OPEN:
+            self._probe_in_flight = False
+            self._open("probe failed")
+        elif self.ewma_error_rate >= self.error_rate_threshold:
+            self._open("error rate")
+
+    def release(self):
+        """Give back the probe slot of a call that was cancelled"""
+        self._probe_in_flight = False
+
+    def _open(self, reason: str):
+        if self.calls < BREAKER_MIN_CALLS and reason != "probe failed":
+            return
+        self.state = self.OPEN
+        self.opened_at = time.monotonic()
+        logger.warning(f"LLM provider circuit opened ({reason})")
+
+    def get_stats(self) -> Dict:
+        """Breaker state and latency histogram"""
+        bounds = [f"le_{bound}" for bound in LATENCY_BUCKETS_MS] + ["inf"]
+        return {
+            "state": self.state,
+            "calls": self.calls,
+            "failures": self.failures,
+            "ewma_latency_ms": round(self.ewma_latency_ms, 1) if self.ewma_latency_ms is not None else None,
+            "ewma_error_rate": round(self.ewma_error_rate, 4),
+            "latency_histogram_ms": dict(zip(bounds, self.latency_histogram))
+        }
+
+class LLMRouter:
+    """Routes completions across providers in priority order"""
+
+    def __init__(
+        self,
+        providers: List[LLMProvider],
+        hedge_delay_ms: int = 0,
+        error_rate_threshold: float = 0.5,
+        latency_threshold_ms: float = 8000,
+        cooldown_seconds: float = 30.0
+    ):
+        self.providers = providers
+        self.hedge_delay = hedge_delay_ms / 1000 if hedge_delay_ms > 0 else None
+        self.health = {
+            provider.name: ProviderHealth(error_rate_threshold, latency_threshold_ms, cooldown_seconds)
+            for provider in providers
+        }
+        self.model = providers[0].model
+
+        # Metrics
+        self.requests = 0
+        self.hedges = 0
+        self.secondary_wins = 0
+        self.failovers = 0
+        self.rejected = 0
+
+    @property
+    def name(self) -> str:
+        return self.providers[0].name
+
+    def _candidates(self) -> List[LLMProvider]:
+        """Providers whose circuit currently lets a request through, in order"""
+        candidates = [provider for provider in self.providers if self.health[provider.name].available()]
+        if not candidates:
+            self.rejected += 1
+            raise NoProviderAvailableError("All LLM provider circuits are open")
+        return candidates
+
+    async def complete(
+        self,
+        messages: List[Dict],
+        temperature: float = 0.8,
+        max_tokens: int = 150,
+        timeout: Optional[float] = None
+    ) -> str:
+        """
+        Generate a completion from the first provider to answer
+
+        Raises:
+            NoProviderAvailableError: If every circuit is open
+            Exception: The last provider error if all candidates fail
+        """
+        self.requests += 1
+        candidates = self._candidates()
+        pending: Dict[asyncio.Task, LLMProvider] = {}
+        next_index = 0
+        last_error: Optional[BaseException] = None
+
+        async def call(provider: LLMProvider) -> str:
+            health = self.health[provider.name]
+            started = time.perf_counter()
+            try:
+                text = await provider.complete(messages, temperature, max_tokens, timeout)
+            except (asyncio.CancelledError, AdmissionTimeoutError):
+                # Not the provider's fault: queued too long here, or abandoned
+                health.release()
+                raise
+            except Exception:
+                health.record_failure()
+                raise
+            health.record_success((time.perf_counter() - started) * 1000)
+            return text
+
+        def launch():
+            nonlocal next_index
+            provider = candidates[next_index]
+            next_index += 1
+            self.health[provider.name].begin()
+            pending[asyncio.create_task(call(provider))] = provider
+
+        launch()
+        try:
+            while pending:
+                can_hedge = self.hedge_delay is not None and next_index < len(candidates)
+                done, _ = await asyncio.wait(
+                    pending,
+                    timeout=self.hedge_delay if can_hedge else None,
+                    return_when=asyncio.FIRST_COMPLETED
+                )
+                if not done:
+                    self.hedges += 1
+                    launch()
+                    continue
+
+                for task in done:
+                    provider = pending.pop(task)
+                    try:
+                        text = task.result()
+                    except Exception as e:
+                        logger.warning(f"LLM provider {provider.name} failed: {str(e) or type(e).__name__}")
+                        last_error = e
+                        continue
+                    if provider is not candidates[0]:
+                        self.secondary_wins += 1
+                    return text
+
+                if not pending and next_index < len(candidates):
+                    self.failovers += 1
+                    launch()
+
+            raise last_error
+        finally:
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+
+    async def stream(
+        self,
+        messages: List[Dict],
+        temperature: float = 0.8,
+        max_tokens: int = 150,
+        timeout: Optional[float] = None
+    ) -> AsyncIterator[str]:
+        """
+        Stream from the first provider to produce a token
+
+        Hedging and failover only apply before the first token; once text
+        has been yielded the stream is committed to that provider.
+
+        Raises:
+            NoProviderAvailableError: If every circuit is open
+            Exception: The last provider error if all candidates fail
+        """
+        self.requests += 1
+        candidates = self._candidates()
+        pending: Dict[asyncio.Task, tuple] = {}
+        next_index = 0
+        last_error: Optional[BaseException] = None
+        winner = None
+
+        def launch():
+            nonlocal next_index
+            provider = candidates[next_index]
+            next_index += 1
+            self.health[provider.name].begin()
+            deltas = provider.stream(messages, temperature, max_tokens, timeout)
+            task = asyncio.create_task(deltas.__anext__())
+            pending[task] = (provider, deltas, time.perf_counter())
+
+        launch()
+        try:
+            while pending and winner is None:
+                can_hedge = self.hedge_delay is not None and next_index < len(candidates)
+                done, _ = await asyncio.wait(
+                    pending,
+                    timeout=self.hedge_delay if can_hedge else None,
+                    return_when=asyncio.FIRST_COMPLETED
+                )
+                if not done:
+                    self.hedges += 1
+                    launch()
+                    continue
+
+                for task in done:
+                    provider, deltas, started = pending.pop(task)
+                    try:
+                        first = task.result()
+                    except StopAsyncIteration:
+                        # An empty reply is a failure, not a winner
+                        e = EmptyResponseError(f"{provider.name} returned an empty stream")
+                        logger.warning(f"LLM provider {provider.name} failed: {e}")
+                        self.health[provider.name].record_failure()
+                        await deltas.aclose()
+                        last_error = e
+                        continue
+                    except Exception as e:
+                        logger.warning(f"LLM provider {provider.name} failed: {str(e) or type(e).__name__}")
+                        if isinstance(e, AdmissionTimeoutError):
+                            self.health[provider.name].release()
+                        else:
+                            self.health[provider.name].record_failure()
+                        await deltas.aclose()
+                        last_error = e
+                        continue
+                    winner = (provider, deltas, started, first)
+                    break
+
+                if winner is None and not pending and next_index < len(candidates):
+                    self.failovers += 1
+                    launch()
+
+            if winner is None:
+                raise last_error
+        finally:
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+            for provider, deltas, _ in pending.values():
+                self.health[provider.name].release()
+                await deltas.aclose()
+
+        provider, deltas, started, first = winner
+        health = self.health[provider.name]
+        if provider is not candidates[0]:
+            self.secondary_wins += 1
+        first_token_ms = (time.perf_counter() - started) * 1000
+
+        completed = False
+        try:
+            yield first
+            async for delta in deltas:
+                yield delta
+            completed = True
+        except Exception:
+            health.record_failure()
+            raise
+        finally:
+            await deltas.aclose()
+            if completed:
+                # Time to first token is what voice latency depends on
+                health.record_success(first_token_ms)
+            else:
+                health.release()
+
+    async def close(self):
+        """Release every provider's HTTP client"""
+        for provider in self.providers:
+            await provider.close()
+
+    def get_stats(self) -> Dict:
+        """Routing counters and per-provider health"""
+        return {
+            "providers": [provider.name for provider in self.providers],
+            "hedge_delay_ms": round(self.hedge_delay * 1000) if self.hedge_delay else 0,
+            "requests": self.requests,
+            "hedges": self.hedges,
+            "secondary_wins": self.secondary_wins,
+            "failovers": self.failovers,
+            "rejected": self.rejected,
+            "health": {name: health.get_stats() for name, health in self.health.items()},
+            "admission": {
+                provider.name: provider.limiter.get_stats()
+                for provider in self.providers if provider.limiter is not None
+            }
+        }
+
+def create_router(settings) -> Optional[LLMRouter]:
+    """
+    Build a router over every configured provider that has a key and client
+
+    Returns:
+        Router, or None if no provider is usable
+    """
+    providers = []
+    for name in settings.get_llm_provider_names():
+        provider = create_provider(settings.get_llm_config(name), timeout=settings.llm_timeout_seconds)
+        if provider is not None:
+            provider.limiter = create_controller(
+                f"llm:{name}",
+                settings,
+                max_concurrent=settings.llm_max_concurrent,
+                requests_per_minute=settings.llm_requests_per_minute,
+                tokens_per_minute=settings.llm_tokens_per_minute
+            )
+            providers.append(provider)
+
+    if not providers:
+        return None
+
+    return LLMRouter(
+        providers,
+        hedge_delay_ms=settings.llm_hedge_delay_ms,
+        error_rate_threshold=settings.llm_breaker_error_rate,
+        latency_threshold_ms=settings.llm_breaker_latency_ms,
+        cooldown_seconds=settings.llm_breaker_cooldown_seconds
+    )
@@ -0,0 +1,465 @@
+"""
+Long-Term Memory
+Per-(user, companion) BM25 index over the whole chat history
+
+The LLM only sees the last few turns verbatim plus the rolling summary.
+This index lets a turn recall the older exchanges most relevant to what
+the user just said: each stored chat (user_message + ai_response) is a
+document, and recall() scores them with BM25 under a strict time budget
+and fetches the top few from the chats collection.
+
+- storage: postings are array('I') of interleaved (doc number, term
+  frequency) pairs, doc lengths an array('I') and chat ids a bytearray
+  of 12-byte ObjectIds, so an index costs a few bytes per token
+- maintenance: the first recall for a conversation loads the index in
+  the background (that turn gets no memories): from a disk snapshot if
+  there is one, then from the chats stored after it. New chats are
+  added as they are written
+- persistence: snapshots are written when an index is evicted (LRU,
+  bounded by bytes) and at shutdown; they are only a head start, the
+  chats collection stays the source of truth
+"""
+import asyncio
+import hashlib
+import heapq
+import json
+import logging
+import math
+import os
+import re
+import struct
+import time
+import uuid
+from array import array
+from bisect import bisect_left
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from bson import ObjectId
+from app.repositories.chat_repository import chat_repository
+from app.repositories.chat_stats_repository import COMPANION_GENDERS
+
+logger = logging.getLogger(__name__)
+
+ConversationKey = Tuple[str, str]
+
+# BM25 parameters (the usual defaults)
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Terms in more than this share of a conversation's chats carry almost no
+# weight (idf -> 0) but cost the most to score, so queries skip them
+MAX_DOCUMENT_FREQUENCY = 0.5
+
+# Terms in at most this share of the chats are scored over all their
+# postings; commoner ones only re-score the best CANDIDATES so far
+FULL_SCORE_FREQUENCY = 0.05
+CANDIDATES = 256
+
+# Postings scored between checks of the search deadline
+BUDGET_CHECK_POSTINGS = 2048
+
+# Snapshot file layout: magic, header length, JSON header, then the arrays
+SNAPSHOT_MAGIC = b"LTM1"
+
+INDEX_PROJECTION = {"user_message": 1, "ai_response": 1, "timestamp": 1}
+MEMORY_PROJECTION = {"user_message": 1, "ai_response": 1, "timestamp": 1}
+
+_TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:'[a-z]+)?")
+
+# Words too common to say anything about relevance
+STOPWORDS = frozenset("""
+a about after again all also am an and any are as at be because been before being but by can
+could did do does doing don't for from had has have having he her here hers him his how i i'd
+i'll i'm i've if in into is it it's its just let's me more most my no nor not now of on once
+only or other our ours out over own really same she should so some such than that that's the
+their them then there these they this those through to too under until up very was we were
+what when where which while who why will with would you you're your yours
+""".split())
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased word tokens without stopwords"""
+    return [token for token in _TOKEN_PATTERN.findall(text.lower()) if token not in STOPWORDS]
+
+class MemoryIndex:
+    """BM25 inverted index over one conversation's chats"""
+
+    def __init__(self):
+        self.chat_ids = bytearray()  # 12-byte ObjectIds by doc number
+        self.doc_lengths = array("I")
+        self.postings: Dict[str, array] = {}  # term -> (doc, tf, doc, tf, ...)
+        self.total_length = 0
+        # Every chat stored up to here is indexed; chats added since then
+        # (and maybe not written yet) are tracked by id
+        self.synced_until: Optional[datetime] = None
+        self.unsynced_ids: Set[bytes] = set()
+        self.nbytes = 0
+
+    def __len__(self) -> int:
+        return len(self.doc_lengths)
+
+    def add(self, chat_id: bytes, text: str) -> int:
+        """Index one chat, returns the change in estimated bytes"""
+        doc = len(self.doc_lengths)
+        tokens = tokenize(text)
+        counts: Dict[str, int] = {}
+        for token in tokens:
+            counts[token] = counts.get(token, 0) + 1
+
+        added = 12 + self.doc_lengths.itemsize
+        for term, count in counts.items():
+            postings = self.postings.get(term)
+            if postings is None:
+                postings = self.postings[term] = array("I")
+                added += 64 + len(term)  # Dict slot, key and array header
+            postings.append(doc)
+            postings.append(count)
+            added += 2 * postings.itemsize
+
+        self.chat_ids += chat_id
+        self.doc_lengths.append(len(tokens))
+        self.total_length += len(tokens)
+        self.nbytes += added
+        return added
+
+    def chat_id(self, doc: int) -> ObjectId:
+        return ObjectId(bytes(self.chat_ids[doc * 12:doc * 12 + 12]))
+
+    def search(self, terms: Iterable[str], k: int, below: int, deadline: float) -> Tuple[List[Tuple[float, int]], bool]:
+        """
+        Top-k documents for the query terms, by BM25
+
+        Terms in more than MAX_DOCUMENT_FREQUENCY of the documents are
+        skipped. Rare terms (in at most FULL_SCORE_FREQUENCY of them) are
+        scored over their whole postings; the commoner ones only adjust
+        the best CANDIDATES documents found so far, looked up by binary
+        search, as they hardly change the ranking otherwise. The deadline
+        is checked every BUDGET_CHECK_POSTINGS postings and the rarest
+        terms go first, so a search cut short has scored the most
+        informative ones.
+
+        Args:
+            terms: Query tokens
+            k: Number of results
+            below: Only documents numbered below this are returned
+            deadline: perf_counter() time to stop scoring at
+
+        Returns:
+            ([(score, doc), ...] best first, whether the deadline cut it short)
+        """
+        count = len(self.doc_lengths)
+        if not count or below <= 0:
+            return [], False
+
+        lengths = self.doc_lengths
+        # tf * (k1 + 1) / (tf + k1 * (1 - b + b * length / average_length))
+        norm = BM25_K1 * (1 - BM25_B)
+        scale = BM25_K1 * BM25_B / (self.total_length / count or 1.0)
+        max_frequency = max(1, int(count * MAX_DOCUMENT_FREQUENCY))
+        full_frequency = max(1, int(count * FULL_SCORE_FREQUENCY))
+        postings_lists = sorted(
+            (
+                self.postings[term] for term in set(terms)
+                if term in self.postings and len(self.postings[term]) // 2 <= max_frequency
+            ),
+            key=len
+        )
+
+        scores: Dict[int, float] = {}
+        candidates = None
+        for postings in postings_lists:
+            frequency = len(postings) // 2
+            weight = math.log(1 + (count - frequency + 0.5) / (frequency + 0.5)) * (BM25_K1 + 1)
+
+            if frequency <= full_frequency or not scores:
+                for start in range(0, len(postings), 2 * BUDGET_CHECK_POSTINGS):
+                    chunk = postings[start:start + 2 * BUDGET_CHECK_POSTINGS]
+                    for doc, tf in zip(chunk[0::2], chunk[1::2]):
+                        scores[doc] = scores.get(doc, 0.0) + weight * tf / (tf + norm + scale * lengths[doc])
+                    if time.perf_counter() > deadline:
+                        return self._top(scores, k, below), True
+                continue
+
+            if candidates is None:
+                candidates = heapq.nlargest(CANDIDATES, scores, key=scores.get)
+            docs = postings[0::2]  # Ascending: documents are added in order
+            for doc in candidates:
+                position = bisect_left(docs, doc)
+                if position < frequency and docs[position] == doc:
+                    tf = postings[2 * position + 1]
+                    scores[doc] += weight * tf / (tf + norm + scale * lengths[doc])
+            if time.perf_counter() > deadline:
+                return self._top(scores, k, below), True
+
+        return self._top(scores, k, below), False
+
+    def _top(self, scores: Dict[int, float], k: int, below: int) -> List[Tuple[float, int]]:
+        for doc in range(below, len(self.doc_lengths)):
+            scores.pop(doc, None)
+        return [(scores[doc], doc) for doc in heapq.nlargest(k, scores, key=scores.get)]
+
+    def to_bytes(self) -> bytes:
+        """Compact snapshot (arrays in native byte order)"""
+        terms = list(self.postings)
+        header = json.dumps({
+            "docs": len(self.doc_lengths),
+            "total_length": self.total_length,
+            "synced_until": self.synced_until.isoformat() if self.synced_until else None,
+            "unsynced": [chat_id.hex() for chat_id in self.unsynced_ids],
+            "terms": [[term, len(self.postings[term])] for term in terms]
+        }).encode("utf-8")
+        parts = [SNAPSHOT_MAGIC, struct.pack("<I", len(header)), header,
+                 bytes(self.chat_ids), self.doc_lengths.tobytes()]
+        parts.extend(self.postings[term].tobytes() for term in terms)
+        return b"".join(parts)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "MemoryIndex":
+        """
+        Rebuild an index from to_bytes() output
+
+        Raises:
+            ValueError: If the snapshot is not valid
+        """
+        if data[:4] != SNAPSHOT_MAGIC:
+            raise ValueError("Not a memory index snapshot")
+        (header_length,) = struct.unpack_from("<I", data, 4)
+        offset = 8 + header_length
+        header = json.loads(data[8:offset])
+
+        index = cls()
+        docs = header["docs"]
+        index.chat_ids = bytearray(data[offset:offset + docs * 12])
+        offset += docs * 12
+        index.doc_lengths.frombytes(data[offset:offset + docs * index.doc_lengths.itemsize])
+        offset += docs * index.doc_lengths.itemsize
+        for term, size in header["terms"]:
+            postings = array("I")
+            postings.frombytes(data[offset:offset + size * postings.itemsize])
+            offset += size * postings.itemsize
+            index.postings[term] = postings
+        if offset != len(data) or len(index.doc_lengths) != docs:
+            raise ValueError("Truncated memory index snapshot")
+
+        index.total_length = header["total_length"]
+        index.synced_until = datetime.fromisoformat(header["synced_until"]) if header["synced_until"] else None
+        index.unsynced_ids = {bytes.fromhex(chat_id) for chat_id in header["unsynced"]}
+        index.nbytes = len(data) + 64 * len(index.postings)
+        return index
+
+def _chat_text(chat: Dict) -> str:
+    return f"{chat.get('user_message', '')} {chat.get('ai_response', '')}"
+
+class LongTermMemoryService:
+    """Loads, updates and queries per-conversation memory indexes"""
+
+    def __init__(self):
+        self.enabled = True
+        self.top_k = 3
+        self.budget_seconds = 0.005
+        self.recent_turns = 5
+        self.directory = ".cache/memory"
+        self.max_bytes = 128 * 1024 * 1024
+        self._indexes: "OrderedDict[ConversationKey, MemoryIndex]" = OrderedDict()
+        self._total_bytes = 0
+        self._loading: Dict[ConversationKey, asyncio.Task] = {}
+        self._pending: Dict[ConversationKey, List[Tuple[bytes, str]]] = {}
+        self._saving: Set[asyncio.Task] = set()
+
+        # Metrics
+        self.recalls = 0
+        self.not_ready = 0
+        self.recalled = 0
+        self.truncated = 0
+        self.loads = 0
+        self.evictions = 0
+        self._search_seconds = 0.0
+        self._max_search_seconds = 0.0
+
+    def configure(self, settings):
+        """Apply memory settings"""
+        self.enabled = settings.memory_enabled
+        self.top_k = settings.memory_top_k
+        self.budget_seconds = settings.memory_recall_budget_ms / 1000
+        self.recent_turns = settings.history_cache_turns
+        self.directory = settings.memory_index_dir
+        self.max_bytes = settings.memory_index_max_mb * 1024 * 1024
+        if self.enabled:
+            os.makedirs(self.directory, exist_ok=True)
+
+    async def recall(self, user_id: str, companion_gender: str, query: str) -> List[Dict]:
+        """
+        Older chats most relevant to query (excluding the verbatim window)
+
+        Returns:
+            Up to top_k chats (user_message, ai_response, timestamp), most
+            relevant first; empty while the index is still loading
+        """
+        if not self.enabled:
+            return []
+
+        key = (user_id, companion_gender)
+        self.recalls += 1
+        index = self._indexes.get(key)
+        if index is None:
+            self.not_ready += 1
+            if key not in self._loading:
+                task = asyncio.create_task(self._load(key))
+                self._loading[key] = task
+                task.add_done_callback(lambda _: self._loading.pop(key, None))
+            return []
+        self._indexes.move_to_end(key)
+
+        started = time.perf_counter()
+        results, truncated = index.search(
+            tokenize(query), self.top_k, below=len(index) - self.recent_turns,
+            deadline=started + self.budget_seconds
+        )
+        elapsed = time.perf_counter() - started
+        self._search_seconds += elapsed
+        self._max_search_seconds = max(self._max_search_seconds, elapsed)
+        if truncated:
+            self.truncated += 1
+        if not results:
+            return []
+
+        chat_ids = [index.chat_id(doc) for _, doc in results]
+        chats = {chat["_id"]: chat for chat in await chat_repository.find_by_ids(chat_ids, MEMORY_PROJECTION)}
+        # Chats deleted since they were indexed are simply missing here
+        memories = [chats[chat_id] for chat_id in chat_ids if chat_id in chats]
+        self.recalled += len(memories)
+        return memories
+
+    def add(self, user_id: str, companion_gender: str, chat_id: ObjectId, user_message: str, ai_response: str):
+        """Index a chat that was just stored"""
+        if not self.enabled:
+            return
+
+        key = (user_id, companion_gender)
+        text = f"{user_message} {ai_response}"
+        if key in self._loading:
+            self._pending.setdefault(key, []).append((chat_id.binary, text))
+            return
+        index = self._indexes.get(key)
+        if index is None:
+            return  # Loaded from the chats collection on first recall
+        index.unsynced_ids.add(chat_id.binary)
+        self._total_bytes += index.add(chat_id.binary, text)
+        self._evict()
+
+    async def _load(self, key: ConversationKey):
+        """Build a conversation's index from its snapshot and stored chats"""
+        user_id, companion_gender = key
+        try:
+            index = await asyncio.to_thread(self._read_snapshot, key) or MemoryIndex()
+
+            scanned = set()
+            async for chat in chat_repository.iter_since(
+                user_id, companion_gender, index.synced_until, projection=INDEX_PROJECTION
+            ):
+                chat_id = chat["_id"].binary
+                if chat_id not in index.unsynced_ids:
+                    index.add(chat_id, _chat_text(chat))
+                scanned.add(chat_id)
+                index.synced_until = chat["timestamp"]
+            index.unsynced_ids -= scanned
+
+            # Chats written while loading
+            for chat_id, text in self._pending.pop(key, []):
+                if chat_id not in scanned:
+                    index.unsynced_ids.add(chat_id)
+                    index.add(chat_id, text)
+
+            self._indexes[key] = index
+            self._total_bytes += index.nbytes
+            self.loads += 1
+            logger.info(f"Memory index loaded: User {user_id} ({companion_gender}), {len(index)} chats, {len(scanned)} new")
+            self._evict()
+
+        except Exception as e:
+            self._pending.pop(key, None)
+            logger.error(f"Memory index load failed for user {user_id}: {str(e) or type(e).__name__}")
+
+    def _evict(self):
+        """Drop least recently used indexes over the memory cap, snapshotting them"""
+        while self._total_bytes > self.max_bytes and len(self._indexes) > 1:
+            key, index = self._indexes.popitem(last=False)
+            self._total_bytes -= index.nbytes
+            self.evictions += 1
+            task = asyncio.create_task(asyncio.to_thread(self._write_snapshot, key, index.to_bytes()))
+            self._saving.add(task)
+            task.add_done_callback(self._saving.discard)
+
+    def _path(self, key: ConversationKey) -> str:
+        digest = hashlib.sha256("\x1f".join(key).encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, f"{digest}.idx")
+
+    def _read_snapshot(self, key: ConversationKey) -> Optional[MemoryIndex]:
+        try:
+            with open(self._path(key), "rb") as f:
+                return MemoryIndex.from_bytes(f.read())
+        except FileNotFoundError:
+            return None
+        except (ValueError, KeyError, TypeError, struct.error) as e:
+            # Rebuilt from the chats collection instead
+            logger.warning(f"Discarding unreadable memory index snapshot for {key[0]}: {e}")
+            return None
+
+    def _write_snapshot(self, key: ConversationKey, data: bytes):
+        """Write atomically (temp file + os.replace)"""
+        path = self._path(key)
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"Memory index snapshot write failed: {e}")
+
+    def invalidate(self, user_id: str, companion_gender: Optional[str] = None):
+        """Forget a user's indexes (or one conversation's) and their snapshots"""
+        for gender in [companion_gender] if companion_gender else COMPANION_GENDERS:
+            key = (user_id, gender)
+            index = self._indexes.pop(key, None)
+            if index is not None:
+                self._total_bytes -= index.nbytes
+            task = self._loading.get(key)
+            if task is not None:
+                task.cancel()
+            self._pending.pop(key, None)
+            try:
+                os.remove(self._path(key))
+            except FileNotFoundError:
+                pass
+
+    async def stop(self):
+        """Cancel loads and snapshot every loaded index"""
+        tasks = list(self._loading.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await asyncio.gather(*self._saving, return_exceptions=True)
+        if self.enabled:
+            for key, index in list(self._indexes.items()):
+                await asyncio.to_thread(self._write_snapshot, key, index.to_bytes())
+
+    def get_stats(self) -> Dict:
+        """Memory index and recall metrics"""
+        searches = self.recalls - self.not_ready
+        return {
+            "enabled": self.enabled,
+            "indexes": len(self._indexes),
+            "indexed_chats": sum(len(index) for index in self._indexes.values()),
+            "estimated_bytes": self._total_bytes,
+            "loading": len(self._loading),
+            "recalls": self.recalls,
+            "not_ready": self.not_ready,
+            "recalled_chats": self.recalled,
+            "avg_search_ms": round(self._search_seconds / searches * 1000, 3) if searches else None,
+            "max_search_ms": round(self._max_search_seconds * 1000, 3),
+            "budget_truncated": self.truncated,
+            "evictions": self.evictions
+        }
+
+# Create singleton instance
+long_term_memory = LongTermMemoryService()
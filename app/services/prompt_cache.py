@@ -0,0 +1,86 @@
+"""
+System Prompt Cache
+Memoizes compiled companion system prompts
+
+Companions served from the catalog are keyed by companion_id; the
+catalog invalidates this cache whenever it reloads, so a companion's
+prompt is rendered once per catalog version. Contexts without an id are
+keyed by a tuple of every field the prompt is rendered from. Each entry
+carries its token count so callers can budget context without
+re-tokenizing the prompt.
+"""
+import logging
+from collections import OrderedDict
+from typing import Callable, Dict, Tuple
+from app.services.token_counter import count_tokens
+
+logger = logging.getLogger(__name__)
+
+def prompt_version(companion_context: Dict) -> Tuple:
+    """Version key for a companion context"""
+    companion_id = companion_context.get("companion_id")
+    if companion_id:
+        return (companion_id,)
+    return (
+        companion_context.get("name", "AI Companion"),
+        companion_context.get("backstory", ""),
+        tuple(companion_context.get("personality_traits") or ()),
+        tuple(companion_context.get("interests") or ()),
+        companion_context.get("speaking_style", "friendly"),
+    )
+
+class CompiledPrompt:
+    """A rendered system prompt and its token count"""
+    __slots__ = ("text", "token_count", "version")
+
+    def __init__(self, text: str, token_count: int, version: Tuple):
+        self.text = text
+        self.token_count = token_count
+        self.version = version
+
+class SystemPromptCache:
+    """Bounded LRU of compiled system prompts keyed by prompt version"""
+
+    def __init__(self, max_entries: int = 32):
+        self.max_entries = max_entries
+        self._prompts: "OrderedDict[Tuple, CompiledPrompt]" = OrderedDict()
+
+        # Metrics
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, companion_context: Dict, render: Callable[[Dict], str]) -> CompiledPrompt:
+        """Return the compiled prompt for a companion, rendering it on a miss"""
+        version = prompt_version(companion_context)
+        compiled = self._prompts.get(version)
+        if compiled is not None:
+            self.hits += 1
+            self._prompts.move_to_end(version)
+            return compiled
+
+        self.misses += 1
+        text = render(companion_context)
+        compiled = CompiledPrompt(text, count_tokens(text), version)
+        self._prompts[version] = compiled
+        if len(self._prompts) > self.max_entries:
+            self._prompts.popitem(last=False)
+        return compiled
+
+    def invalidate(self):
+        """Drop every cached prompt"""
+        self._prompts.clear()
+
+    def get_stats(self) -> Dict:
+        """Cache metrics and per-prompt token counts"""
+        return {
+            "entries": len(self._prompts),
+            "hits": self.hits,
+            "misses": self.misses,
+            "prompts": [
+                {"version": compiled.version[0], "token_count": compiled.token_count}
+                for compiled in self._prompts.values()
+            ]
+        }
+
+# Create singleton instance
+system_prompt_cache = SystemPromptCache()
@@ -0,0 +1,52 @@
+"""
+Sentiment Classifier
+Keyword sentiment of a user message, shared by both AI services
+
+Keywords match whole words only ("hi" does not match "this", "who" does
+not match "whole"). A message is split into words once and intersected
+with the set of all keywords; it is classified by the highest-priority
+category any matched keyword belongs to, in the order of
+SENTIMENT_KEYWORDS. Messages with no keyword but a "?" are "curious";
+everything else is "default".
+"""
+import re
+from typing import Iterable, List
+
+# Categories in priority order, each with its keywords
+SENTIMENT_KEYWORDS = {
+    "greeting": ("hi", "hello", "hey", "sup", "morning", "evening"),
+    "happy": ("happy", "great", "awesome", "excited", "love", "amazing", "wonderful"),
+    "empathetic": ("sad", "upset", "angry", "frustrated", "tired", "worried", "stressed"),
+    "curious": ("what", "why", "how", "when", "where", "who"),
+}
+DEFAULT_SENTIMENT = "default"
+QUESTION_SENTIMENT = "curious"
+
+_CATEGORIES = list(SENTIMENT_KEYWORDS)
+_KEYWORD_RANK = {
+    keyword: rank
+    for rank, keywords in enumerate(SENTIMENT_KEYWORDS.values())
+    for keyword in keywords
+}
+_KEYWORDS = frozenset(_KEYWORD_RANK)
+_QUESTION_RANK = _CATEGORIES.index(QUESTION_SENTIMENT)
+
+# Same word boundaries as regex \b
+_WORD = re.compile(r"\w+")
+
+def classify_sentiment(message: str) -> str:
+    """
+    Sentiment category of a message
+
+    Returns:
+        "greeting", "happy", "empathetic", "curious" or "default"
+    """
+    best = _QUESTION_RANK if "?" in message else len(_CATEGORIES)
+    matched = _KEYWORDS.intersection(_WORD.findall(message.lower()))
+    if matched:
+        best = min(best, min(_KEYWORD_RANK[keyword] for keyword in matched))
+    return _CATEGORIES[best] if best < len(_CATEGORIES) else DEFAULT_SENTIMENT
+
+def classify_many(messages: Iterable[str]) -> List[str]:
+    """Sentiment categories of many messages (e.g. for backfills), in order"""
+    return [classify_sentiment(message) for message in messages]
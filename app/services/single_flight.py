@@ -0,0 +1,76 @@
+"""
+Single Flight
+Coalesces concurrent identical upstream calls into one
+
+Callers pass a key (a fingerprint of everything that determines the
+result) and a factory for the upstream call. While a call for a key is
+in flight, further callers with the same key wait for it and share its
+result or exception instead of issuing their own. A caller being
+cancelled does not cancel the shared call unless it was the last one
+waiting for it.
+"""
+import asyncio
+import hashlib
+import json
+from typing import Any, Awaitable, Callable, Dict
+
+def fingerprint(*parts: Any) -> str:
+    """Stable SHA-256 of JSON-serializable request parts"""
+    payload = json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+class _Flight:
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+class SingleFlight:
+    """Deduplicates concurrent calls by key"""
+
+    def __init__(self):
+        self._flights: Dict[str, _Flight] = {}
+
+        # Metrics
+        self.calls = 0
+        self.coalesced = 0
+
+    async def run(self, key: str, factory: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Run factory() for key, or join the call already in flight for it
+
+        Returns:
+            The (shared) result of the upstream call
+        """
+        self.calls += 1
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = _Flight(asyncio.create_task(factory()))
+            self._flights[key] = flight
+            flight.task.add_done_callback(lambda _: self._forget(key, flight))
+        else:
+            self.coalesced += 1
+
+        flight.waiters += 1
+        try:
+            return await asyncio.shield(flight.task)
+        finally:
+            flight.waiters -= 1
+            if flight.waiters == 0 and not flight.task.done():
+                # Nobody is waiting any more: abandon the upstream call
+                self._forget(key, flight)
+                flight.task.cancel()
+
+    def _forget(self, key: str, flight: _Flight):
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+
+    def get_stats(self) -> Dict:
+        """Coalescing metrics"""
+        return {
+            "calls": self.calls,
+            "coalesced": self.coalesced,
+            "coalescing_rate": round(self.coalesced / self.calls, 4) if self.calls else None,
+            "in_flight": len(self._flights)
+        }
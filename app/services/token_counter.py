@@ -0,0 +1,41 @@
+"""
+Token Counter
+Local token counting for prompt budgeting
+
+Uses tiktoken's cl100k_base encoding when installed; otherwise falls
+back to a ~4 characters per token estimate.
+"""
+import logging
+
+logger = logging.getLogger(__name__)
+
+try:
+    import tiktoken
+    _encoding = tiktoken.get_encoding("cl100k_base")
+    TIKTOKEN_AVAILABLE = True
+except Exception as e:
+    logger.warning(f"tiktoken not available ({e}). Using approximate token counts.")
+    _encoding = None
+    TIKTOKEN_AVAILABLE = False
+
+def count_tokens(text: str) -> int:
+    """Number of tokens in text (approximate without tiktoken)"""
+    if not text:
+        return 0
+    if _encoding is not None:
+        return len(_encoding.encode(text))
+    return max(1, (len(text) + 3) // 4)
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Cut text to at most max_tokens tokens (by the same count as count_tokens)"""
+    if max_tokens <= 0:
+        return ""
+    if count_tokens(text) <= max_tokens:
+        return text
+    if _encoding is not None:
+        tokens = _encoding.encode(text)[:max_tokens]
+        # Cutting inside a multi-byte character can re-encode longer
+        while tokens and count_tokens(_encoding.decode(tokens)) > max_tokens:
+            tokens = tokens[:-1]
+        return _encoding.decode(tokens)
+    return text[:max_tokens * 4]
@@ -2,24 +2,36 @@
 Text-to-Speech Service
 Converts text to natural human-like speech using ElevenLabs API
 Supports gender-specific voices: female voices for female companions, male voices for male companions
+
+stream_speech() relays audio chunks as ElevenLabs produces them: a worker
+thread iterates the blocking ElevenLabs stream and hands chunks to the
+event loop through a buffer of at most tts_stream_buffer_chunks, so a
+slow client holds back synthesis instead of growing memory.
 """
+import asyncio
 import logging
 import io
 import base64
-from typing import Optional
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator, Callable, Dict, Iterator, Optional
 from fastapi import HTTPException
+from app.services.audio_cache import audio_cache, audio_cache_key
+from app.services.single_flight import SingleFlight
+from app.services.admission import AdmissionTimeoutError, create_controller, rate_limit_retry_after
+from app.services.fake_providers import FakeElevenLabs
+from app.config import settings
 
 logger = logging.getLogger(__name__)
 
 try:
-    from app.config import settings
     from elevenlabs.client import ElevenLabs
     from elevenlabs import VoiceSettings
     ELEVENLABS_AVAILABLE = True
 except ImportError:
     ELEVENLABS_AVAILABLE = False
     logger.warning("ElevenLabs not available for TTS")
-    settings = None
     ElevenLabs = None
     VoiceSettings = None
 
@@ -41,14 +53,69 @@ except ImportError:
 #     gTTS = None
 #     logger.warning("gTTS not available")
 
+# ElevenLabs model used for all companion speech
+ELEVENLABS_MODEL_ID = "eleven_multilingual_v2"  # High quality model
+
+# Retries of a rate-limited (429) synthesis before giving up
+RATE_LIMIT_RETRIES = 2
+
+# Model id reported by the fake provider (keeps fake audio out of real cache entries)
+FAKE_TTS_MODEL_ID = "fake-tts"
+
+# VoiceSettings optimized for friendly, warm, human-like speech
+# - stability: Higher for consistent, reliable voice (0.6 = warm and friendly)
+# - similarity_boost: Higher to maintain voice character (0.8 = natural)
+# - style: Slight exaggeration for more expressive, friendly tone (0.3)
+# - use_speaker_boost: Enhances clarity and warmth
+VOICE_SETTINGS = {
+    "stability": 0.6,           # Warm, consistent tone
+    "similarity_boost": 0.8,     # Natural voice character
+    "style": 0.3,               # Friendly, expressive
+    "use_speaker_boost": True    # Enhanced clarity
+}
+
 class TTSService:
     """Text-to-Speech Service using ElevenLabs API"""
     
     def __init__(self):
         self.client = None
-        if ELEVENLABS_AVAILABLE and (settings is not None):
+        self.model_id = ELEVENLABS_MODEL_ID
+        # Identical synthesis requests in flight at the same time share one call
+        self.flights = SingleFlight()
+        # Concurrency / rate limit on synthesis calls, voice turns served first
+        self.limiter = create_controller(
+            "tts",
+            settings,
+            max_concurrent=settings.tts_max_concurrent,
+            requests_per_minute=settings.tts_requests_per_minute
+        )
+        self.stream_buffer_chunks = max(1, settings.tts_stream_buffer_chunks)
+        self.stream_cache_max_bytes = settings.tts_stream_cache_max_kb * 1024
+        self.stream_stall_seconds = settings.tts_stream_stall_seconds
+        # Stream workers only run while synthesis holds a limiter slot, so
+        # they get their own pool of that size instead of the default
+        # executor (created on first use, shut down by close())
+        self.stream_workers = max(1, settings.tts_max_concurrent)
+        self.stream_executor: Optional[ThreadPoolExecutor] = None
+        
+        # Streaming metrics
+        self.streams = 0
+        self.streams_aborted = 0
+        self.streams_stalled = 0
+        self.max_buffered_chunks = 0
+        self._first_chunks = 0
+        self._first_chunk_seconds = 0.0
+        if settings is not None and settings.tts_provider == "fake":
+            self._initialize_fake()
+        elif ELEVENLABS_AVAILABLE and (settings is not None):
             self._initialize()
     
+    def _initialize_fake(self):
+        """Initialize the offline fake TTS client (see fake_providers)"""
+        self.client = FakeElevenLabs()
+        self.model_id = FAKE_TTS_MODEL_ID
+        logger.info("Fake TTS initialized (offline load testing)")
+    
     def _initialize(self):
         """Initialize ElevenLabs TTS client"""
         try:
@@ -78,7 +145,11 @@ class TTSService:
             gender: Companion gender ('boy' or 'girl') to select appropriate voice
             
         Returns:
-            Audio data as bytes (MP3 format)
+            Audio data as bytes (MP3 format); empty if synthesis failed
+            
+        Raises:
+            HTTPException: 503 if ElevenLabs is not configured
+            AdmissionTimeoutError: If TTS is too busy to start before the queue-wait deadline
         """
         if not self.client:
             raise HTTPException(
@@ -87,54 +158,15 @@ class TTSService:
             )
         
         try:
-            # Select voice based on gender
-            if voice:
-                voice_id = voice
-            elif gender:
-                # Use female voice for 'girl' companion, male voice for 'boy' companion
-                if gender.lower() in ['girl', 'female']:
-                    voice_id = settings.elevenlabs_female_voice_id
-                    logger.info(f"Using female voice for {gender} companion")
-                elif gender.lower() in ['boy', 'male']:
-                    voice_id = settings.elevenlabs_male_voice_id
-                    logger.info(f"Using male voice for {gender} companion")
-                else:
-                    voice_id = settings.elevenlabs_female_voice_id  # Default to female
-                    logger.warning(f"Unknown gender '{gender}', defaulting to female voice")
-            else:
-                # Default to female voice if no gender specified
-                voice_id = settings.elevenlabs_female_voice_id
-                logger.info("No gender specified, using default female voice")
+            voice_id = self._resolve_voice_id(voice, gender)
             
-            # Generate audio using ElevenLabs
-            # VoiceSettings optimized for friendly, warm, human-like speech
-            # - stability: Higher for consistent, reliable voice (0.6 = warm and friendly)
-            # - similarity_boost: Higher to maintain voice character (0.8 = natural)
-            # - style: Slight exaggeration for more expressive, friendly tone (0.3)
-            # - use_speaker_boost: Enhances clarity and warmth
-            voice_settings = None
-            if VoiceSettings is not None:
-                voice_settings = VoiceSettings(
-                    stability=0.6,           # Warm, consistent tone
-                    similarity_boost=0.8,     # Natural voice character
-                    style=0.3,               # Friendly, expressive
-                    use_speaker_boost=True    # Enhanced clarity
-                )
-            
-            # Generate speech
-            audio_stream = self.client.text_to_speech.convert(
-                voice_id=voice_id,
-                text=text,
-                model_id="eleven_multilingual_v2",  # High quality model
-                voice_settings=voice_settings
-            )
-            
-            # Collect audio bytes from stream
-            audio_bytes = b"".join(audio_stream)
-            
-            logger.info(f"Generated ElevenLabs TTS audio: {len(text)} chars -> {len(audio_bytes)} bytes (voice: {voice_id})")
-            return audio_bytes
+            # Concurrent requests for the same audio share one cache lookup/synthesis
+            cache_key = audio_cache_key(voice_id, self.model_id, VOICE_SETTINGS, text)
+            return await self.flights.run(cache_key, lambda: self._fetch(cache_key, voice_id, text))
             
+        except AdmissionTimeoutError:
+            # Overload, not a broken clip: let the caller decide (e.g. answer 503)
+            raise
         except Exception as e:
             error_msg = str(e)
             logger.error(f"ElevenLabs TTS generation failed: {error_msg}")
@@ -150,6 +182,268 @@ class TTSService:
             logger.warning(f"TTS unavailable for this request. App will continue without voice output.")
             return b""
     
+    async def _fetch(self, cache_key: str, voice_id: str, text: str) -> bytes:
+        """Audio for a cache key: from the audio cache, else synthesized and cached"""
+        # Serve repeated phrases from the audio cache
+        cached_audio = await audio_cache.get(cache_key)
+        if cached_audio is not None:
+            logger.info(f"TTS cache hit: {len(text)} chars -> {len(cached_audio)} bytes (voice: {voice_id})")
+            return cached_audio
+        
+        audio_bytes = await self._synthesize_limited(voice_id, text)
+        await audio_cache.put(cache_key, audio_bytes)
+        
+        logger.info(f"Generated ElevenLabs TTS audio: {len(text)} chars -> {len(audio_bytes)} bytes (voice: {voice_id})")
+        return audio_bytes
+    
+    async def _synthesize_limited(self, voice_id: str, text: str) -> bytes:
+        """Synthesize under the admission limiter, retrying 429s after Retry-After"""
+        deadline = self.limiter.deadline_for()
+        attempt = 0
+        while True:
+            async with self.limiter.slot(deadline=deadline):
+                try:
+                    # Generate speech off the event loop (the ElevenLabs client is blocking)
+                    audio_bytes = await asyncio.to_thread(self._synthesize, voice_id, text)
+                except Exception as e:
+                    retry_after = rate_limit_retry_after(e)
+                    if retry_after is None:
+                        raise
+                    self.limiter.throttle(retry_after)
+                    logger.warning(f"ElevenLabs rate limited (retry after {retry_after:.1f}s)")
+                    if attempt >= RATE_LIMIT_RETRIES:
+                        raise
+                    attempt += 1
+                    continue
+            self.limiter.record_success()
+            return audio_bytes
+    
+    def _synthesize(self, voice_id: str, text: str) -> bytes:
+        """Blocking ElevenLabs synthesis of one text (run in a worker thread)"""
+        # Collect audio bytes from stream
+        return b"".join(self._convert(voice_id, text))
+    
+    def _convert(self, voice_id: str, text: str) -> Iterator[bytes]:
+        """Blocking ElevenLabs audio chunk stream for one text"""
+        voice_settings = None
+        if VoiceSettings is not None:
+            voice_settings = VoiceSettings(**VOICE_SETTINGS)
+        
+        return self.client.text_to_speech.convert(
+            voice_id=voice_id,
+            text=text,
+            model_id=self.model_id,
+            voice_settings=voice_settings
+        )
+    
+    async def stream_speech(
+        self,
+        text: str,
+        voice: Optional[str] = None,
+        gender: Optional[str] = None
+    ) -> AsyncIterator[bytes]:
+        """
+        Convert text to speech, yielding MP3 chunks as they are synthesized
+        
+        Cached audio is yielded in one piece. Otherwise chunks are relayed
+        under the admission limiter (429s before the first chunk are
+        retried) and the clip is cached afterwards if it fits in
+        tts_stream_cache_max_kb. Unlike text_to_speech(), identical
+        concurrent requests are not merged and errors are raised, not
+        swallowed.
+        
+        Args:
+            text: Text to convert to speech
+            voice: Voice ID to use (optional, will use gender-based default)
+            gender: Companion gender ('boy' or 'girl') to select appropriate voice
+            
+        Yields:
+            Audio data chunks (MP3 format)
+            
+        Raises:
+            HTTPException: 503 if ElevenLabs is not configured
+            AdmissionTimeoutError: If TTS is too busy to start before the queue-wait deadline
+        """
+        if not self.client:
+            raise HTTPException(
+                status_code=503,
+                detail="ElevenLabs TTS service not available. Please configure ELEVENLABS_API_KEY in .env"
+            )
+        
+        voice_id = self._resolve_voice_id(voice, gender)
+        cache_key = audio_cache_key(voice_id, self.model_id, VOICE_SETTINGS, text)
+        cached_audio = await audio_cache.get(cache_key)
+        if cached_audio is not None:
+            logger.info(f"TTS cache hit: {len(text)} chars -> {len(cached_audio)} bytes (voice: {voice_id})")
+            yield cached_audio
+            return
+        
+        # Keep a copy for the cache only while the clip is short enough
+        collected = [] if audio_cache.enabled else None
+        total_bytes = 0
+        async for chunk in self._relay_limited(voice_id, text):
+            total_bytes += len(chunk)
+            if collected is not None:
+                collected.append(chunk)
+                if total_bytes > self.stream_cache_max_bytes:
+                    collected = None
+            yield chunk
+        
+        if collected:
+            await audio_cache.put(cache_key, b"".join(collected))
+        logger.info(f"Streamed ElevenLabs TTS audio: {len(text)} chars -> {total_bytes} bytes (voice: {voice_id})")
+    
+    async def _relay_limited(self, voice_id: str, text: str) -> AsyncIterator[bytes]:
+        """
+        Relay synthesis under the admission limiter, retrying 429s before the first chunk
+        
+        The slot is returned as soon as ElevenLabs has delivered the whole
+        clip (or the relay gave up), not when the client has downloaded it.
+        """
+        deadline = self.limiter.deadline_for()
+        attempt = 0
+        while True:
+            await self.limiter.acquire(deadline=deadline)
+            release = self._slot_releaser()
+            relayed = False
+            relay = self._relay(voice_id, text, on_synthesized=release)
+            try:
+                async for chunk in relay:
+                    relayed = True
+                    yield chunk
+            except Exception as e:
+                retry_after = rate_limit_retry_after(e)
+                if retry_after is None or relayed:
+                    raise
+                self.limiter.throttle(retry_after)
+                logger.warning(f"ElevenLabs rate limited (retry after {retry_after:.1f}s)")
+                if attempt >= RATE_LIMIT_RETRIES:
+                    raise
+                attempt += 1
+                continue
+            finally:
+                await relay.aclose()
+                release()
+            self.limiter.record_success()
+            return
+    
+    def _slot_releaser(self) -> Callable[..., None]:
+        """Callable returning the limiter slot just acquired, at most once"""
+        released = False
+        
+        def release(*_):
+            nonlocal released
+            if not released:
+                released = True
+                self.limiter.release()
+        return release
+    
+    async def _relay(
+        self,
+        voice_id: str,
+        text: str,
+        on_synthesized: Optional[Callable[..., None]] = None
+    ) -> AsyncIterator[bytes]:
+        """
+        Chunks of the blocking ElevenLabs stream, read by a worker thread through a bounded buffer
+        
+        The worker runs on the dedicated stream executor. If the client
+        leaves the buffer full for tts_stream_stall_seconds the worker
+        abandons synthesis and a TimeoutError ends the relay once the
+        buffered chunks have been read.
+        
+        Args:
+            voice_id: ElevenLabs voice
+            text: Text to synthesize
+            on_synthesized: Called (on the event loop) when the worker is done with ElevenLabs
+        """
+        loop = asyncio.get_running_loop()
+        buffer: asyncio.Queue = asyncio.Queue()
+        # Free buffer places: the worker takes one per chunk, the consumer returns it
+        space = threading.Semaphore(self.stream_buffer_chunks)
+        stop = threading.Event()
+        stall_seconds = self.stream_stall_seconds or None
+        
+        def produce():
+            audio_stream = None
+            try:
+                audio_stream = self._convert(voice_id, text)
+                for chunk in audio_stream:
+                    if not space.acquire(timeout=stall_seconds):
+                        raise TimeoutError(f"TTS stream client read nothing for {stall_seconds:g}s")
+                    if stop.is_set():
+                        break
+                    loop.call_soon_threadsafe(buffer.put_nowait, chunk)
+                item = None  # End of audio
+            except Exception as e:
+                item = e
+            finally:
+                # Closes the HTTP response if the consumer went away mid-clip
+                close = getattr(audio_stream, "close", None)
+                if close is not None:
+                    close()
+            if not stop.is_set():
+                loop.call_soon_threadsafe(buffer.put_nowait, item)
+        
+        def on_done(producer: asyncio.Future):
+            if producer.cancelled():
+                # Never ran: the pool was shut down while it was queued
+                buffer.put_nowait(RuntimeError("TTS stream workers shut down"))
+            if on_synthesized is not None:
+                on_synthesized(producer)
+        
+        if self.stream_executor is None:
+            self.stream_executor = ThreadPoolExecutor(
+                max_workers=self.stream_workers,
+                thread_name_prefix="tts-stream"
+            )
+        started = time.perf_counter()
+        producer = loop.run_in_executor(self.stream_executor, produce)
+        producer.add_done_callback(on_done)
+        self.streams += 1
+        finished = False
+        try:
+            while True:
+                item = await buffer.get()
+                if item is None:
+                    finished = True
+                    return
+                if isinstance(item, TimeoutError):
+                    self.streams_stalled += 1
+                if isinstance(item, Exception):
+                    raise item
+                if started is not None:
+                    self._first_chunks += 1
+                    self._first_chunk_seconds += time.perf_counter() - started
+                    started = None
+                self.max_buffered_chunks = max(self.max_buffered_chunks, buffer.qsize() + 1)
+                space.release()
+                yield item
+        finally:
+            if not finished:
+                self.streams_aborted += 1
+                # Wake a worker waiting for buffer space so it sees the stop
+                stop.set()
+                space.release()
+    
+    def _resolve_voice_id(self, voice: Optional[str], gender: Optional[str]) -> str:
+        """Select the ElevenLabs voice: explicit voice, else by companion gender"""
+        if voice:
+            return voice
+        if gender:
+            # Use female voice for 'girl' companion, male voice for 'boy' companion
+            if gender.lower() in ['girl', 'female']:
+                logger.info(f"Using female voice for {gender} companion")
+                return settings.elevenlabs_female_voice_id
+            if gender.lower() in ['boy', 'male']:
+                logger.info(f"Using male voice for {gender} companion")
+                return settings.elevenlabs_male_voice_id
+            logger.warning(f"Unknown gender '{gender}', defaulting to female voice")
+            return settings.elevenlabs_female_voice_id  # Default to female
+        # Default to female voice if no gender specified
+        logger.info("No gender specified, using default female voice")
+        return settings.elevenlabs_female_voice_id
+    
     # Legacy methods commented out - replaced by ElevenLabs
     # async def text_to_speech_gtts(self, text: str) -> bytes:
     #     """Legacy gTTS method - now replaced by ElevenLabs"""
@@ -187,6 +481,23 @@ class TTSService:
         audio_bytes = await self.text_to_speech(text, voice, speed, gender)
         return base64.b64encode(audio_bytes).decode('utf-8')
     
+    def get_stats(self) -> Dict:
+        """Streaming relay metrics"""
+        return {
+            "streams": self.streams,
+            "aborted": self.streams_aborted,
+            "stalled": self.streams_stalled,
+            "avg_first_chunk_ms": round(self._first_chunk_seconds / self._first_chunks * 1000, 1) if self._first_chunks else None,
+            "max_buffered_chunks": self.max_buffered_chunks,
+            "buffer_chunks": self.stream_buffer_chunks
+        }
+    
+    def close(self):
+        """Shut down the stream worker pool without waiting for running workers"""
+        if self.stream_executor is not None:
+            self.stream_executor.shutdown(wait=False, cancel_futures=True)
+            self.stream_executor = None
+    
     def is_available(self) -> bool:
         """Check if ElevenLabs TTS service is available"""
         return self.client is not None
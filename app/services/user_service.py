@@ -4,8 +4,7 @@ Handles user-related business logic and database operations
 """
 from typing import Optional, Dict
 from datetime import datetime
-from bson import ObjectId
-from app.database import users
+from app.repositories.user_repository import user_repository
 from app.models.user_model import UserCreate, UserLogin, UserInDB
 import logging
 
@@ -15,7 +14,7 @@ class UserService:
     """Service class for user operations"""
     
     @staticmethod
-    def create_user(user_data: UserCreate) -> Dict:
+    async def create_user(user_data: UserCreate) -> Dict:
         """
         Create a new user in the database
         
@@ -29,7 +28,7 @@ class UserService:
             ValueError: If user already exists
         """
         # Check if user already exists
-        existing_user = users.find_one({"email": user_data.email})
+        existing_user = await user_repository.find_by_email(user_data.email)
         if existing_user:
             raise ValueError(f"User with email {user_data.email} already exists")
         
@@ -43,19 +42,19 @@ class UserService:
         )
         
         # Insert into database
-        result = users.insert_one(user_doc.model_dump())
+        inserted_id = await user_repository.insert(user_doc.model_dump())
         
         logger.info(f"User created successfully: {user_data.email}")
         
         return {
-            "user_id": str(result.inserted_id),
+            "user_id": str(inserted_id),
             "message": "User registered successfully",
             "email": user_data.email,
             "name": user_data.name
         }
     
     @staticmethod
-    def login_user(login_data: UserLogin) -> Dict:
+    async def login_user(login_data: UserLogin) -> Dict:
         """
         Login user (simple email-based authentication)
         
@@ -69,15 +68,15 @@ class UserService:
             ValueError: If user not found
         """
         # Find user by email
-        user = users.find_one({"email": login_data.email})
+        user = await user_repository.find_by_email(login_data.email)
         
         if not user:
             raise ValueError(f"User with email {login_data.email} not found")
         
         # Update last login time
-        users.update_one(
-            {"_id": user["_id"]},
-            {"$set": {"last_login": datetime.utcnow()}}
+        await user_repository.update_fields(
+            user["_id"],
+            {"last_login": datetime.utcnow()}
         )
         
         logger.info(f"User logged in: {login_data.email}")
@@ -92,7 +91,7 @@ class UserService:
         }
     
     @staticmethod
-    def get_user_by_id(user_id: str) -> Optional[Dict]:
+    async def get_user_by_id(user_id: str) -> Optional[Dict]:
         """
         Get user by ID
         
@@ -103,7 +102,7 @@ class UserService:
             User document or None
         """
         try:
-            user = users.find_one({"_id": ObjectId(user_id)})
+            user = await user_repository.find_by_id(user_id)
             if user:
                 user["user_id"] = str(user["_id"])
                 del user["_id"]
@@ -113,7 +112,7 @@ class UserService:
             return None
     
     @staticmethod
-    def update_user_preferences(user_id: str, preferences: Dict) -> Dict:
+    async def update_user_preferences(user_id: str, preferences: Dict) -> Dict:
         """
         Update user preferences
         
@@ -125,12 +124,9 @@ class UserService:
             Success message
         """
         try:
-            result = users.update_one(
-                {"_id": ObjectId(user_id)},
-                {"$set": preferences}
-            )
+            modified_count = await user_repository.update_fields(user_id, preferences)
             
-            if result.modified_count > 0:
+            if modified_count > 0:
                 return {"message": "Preferences updated successfully"}
             else:
                 return {"message": "No changes made"}
@@ -139,14 +135,14 @@ class UserService:
             raise ValueError(f"Failed to update preferences: {str(e)}")
     
     @staticmethod
-    def get_all_users() -> list:
+    async def get_all_users() -> list:
         """
         Get all users (admin function)
         
         Returns:
             List of all users
         """
-        all_users = list(users.find({}))
+        all_users = await user_repository.find_all()
         for user in all_users:
             user["user_id"] = str(user["_id"])
             del user["_id"]
@@ -0,0 +1,145 @@
+"""
+Voice Pipeline
+Overlaps LLM streaming with per-sentence TTS for voice turns
+
+As text deltas arrive they are cut into sentences; each finished
+sentence is sent to TTS right away while later tokens are still being
+generated. Audio segments are emitted strictly in sentence order, each
+as soon as it (and every earlier one) is ready, so the first audio is
+available after roughly one sentence of generation plus one short
+synthesis. Both internal queues are bounded, so a client that reads
+slowly holds back generation and TTS instead of growing memory.
+"""
+import asyncio
+import logging
+import re
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Sentence end: terminal punctuation (plus closing quotes/brackets) followed
+# by whitespace, or a line break
+_SENTENCE_BOUNDARY = re.compile(r"[.!?…]+[\"')\]]*\s+|\n+")
+
+class SentenceSplitter:
+    """Accumulates streamed text and cuts it into sentences"""
+
+    def __init__(self, min_chars: int = 12):
+        # Very short fragments ("Oh!") are merged into the next sentence
+        self.min_chars = min_chars
+        self._buffer = ""
+
+    def feed(self, delta: str) -> List[str]:
+        """Add a text delta, returns any sentences it completed"""
+        self._buffer += delta
+
+        sentences = []
+        start = 0
+        for match in _SENTENCE_BOUNDARY.finditer(self._buffer):
+            if match.end() - start < self.min_chars:
+                continue
+            sentence = self._buffer[start:match.end()].strip()
+            if sentence:
+                sentences.append(sentence)
+            start = match.end()
+
+        self._buffer = self._buffer[start:]
+        return sentences
+
+    def flush(self) -> Optional[str]:
+        """Return whatever text is left once the stream ends"""
+        rest = self._buffer.strip()
+        self._buffer = ""
+        return rest or None
+
+async def run_voice_pipeline(
+    text_deltas: AsyncIterator[str],
+    synthesize: Optional[Callable[[str], Awaitable[bytes]]],
+    max_concurrent_tts: int = 3,
+    queue_size: int = 32
+) -> AsyncIterator[Dict]:
+    """
+    Stream a voice turn
+
+    Args:
+        text_deltas: LLM text deltas
+        synthesize: Async TTS for one sentence (None to skip audio)
+        max_concurrent_tts: Sentences synthesized in parallel
+        queue_size: Events / sentences buffered ahead of the consumer
+
+    Yields:
+        {"type": "token", "delta"} as text arrives and
+        {"type": "audio", "index", "text", "audio"} in sentence order
+    """
+    events: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+    segments: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+    semaphore = asyncio.Semaphore(max_concurrent_tts)
+    tts_tasks: List[asyncio.Task] = []
+
+    async def synthesize_limited(sentence: str) -> bytes:
+        async with semaphore:
+            return await synthesize(sentence)
+
+    async def start_segment(index: int, sentence: str):
+        task = asyncio.create_task(synthesize_limited(sentence))
+        tts_tasks.append(task)
+        await segments.put((index, sentence, task))
+
+    async def produce_text():
+        splitter = SentenceSplitter()
+        index = 0
+        async for delta in text_deltas:
+            await events.put({"type": "token", "delta": delta})
+            if synthesize is None:
+                continue
+            for sentence in splitter.feed(delta):
+                await start_segment(index, sentence)
+                index += 1
+
+        rest = splitter.flush()
+        if synthesize is not None and rest:
+            await start_segment(index, rest)
+        await segments.put(None)
+
+    async def emit_audio():
+        while True:
+            segment = await segments.get()
+            if segment is None:
+                return
+            index, sentence, task = segment
+            try:
+                audio = await task
+            except Exception as e:
+                logger.error(f"TTS failed for sentence {index}: {e}")
+                audio = b""
+            await events.put({"type": "audio", "index": index, "text": sentence, "audio": audio})
+
+    async def run():
+        # End markers are only queued on success: once the consumer has
+        # stopped reading, a put into a full queue would never return
+        emitter = asyncio.create_task(emit_audio())
+        try:
+            await produce_text()
+            await emitter
+        except Exception as e:
+            await events.put({"type": "error", "error": e})
+            return
+        finally:
+            emitter.cancel()
+        await events.put(None)
+
+    runner = asyncio.create_task(run())
+    try:
+        while True:
+            event = await events.get()
+            if event is None:
+                break
+            if event["type"] == "error":
+                raise event["error"]
+            yield event
+    finally:
+        # Client went away or the pipeline failed: stop all outstanding work
+        for task in [runner, *tts_tasks]:
+            if not task.done():
+                task.cancel()
+        await asyncio.gather(runner, *tts_tasks, return_exceptions=True)
@@ -0,0 +1,278 @@
+"""
+Voice Session
+State and message loop for one persistent WebSocket voice connection
+
+The user, companion, prompt context and recent history are resolved once
+when the socket opens and kept for the life of the connection. Each text
+turn runs through the sentence pipeline (see voice_pipeline) and pushes
+text deltas and audio frames back over the socket.
+
+Protocol (JSON text frames unless noted):
+    client -> server
+        {"type": "turn", "message": "..."}   start a turn (cancels one in progress)
+        {"type": "cancel"}                   cancel the turn in progress
+        {"type": "ping"} / {"type": "pong"}  heartbeat
+    server -> client
+        {"type": "ready", "companion_name", "tts_available"}
+        {"type": "token", "delta"}
+        {"type": "audio", "index", "text", "bytes"} followed by one binary
+            frame with that sentence's MP3 audio
+        {"type": "done", "chat_id", "ai_response", "timestamp", "first_token_ms", "first_audio_ms", "total_ms"}
+        {"type": "cancelled"} / {"type": "error", "detail"}
+        {"type": "ping"} / {"type": "pong"}
+
+Outgoing frames go through a bounded queue drained by one sender task,
+so a slow client applies backpressure to generation instead of growing
+memory. A connection that sends nothing (not even pong) for two
+heartbeat intervals is closed.
+"""
+import asyncio
+import json
+import logging
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+from fastapi import WebSocket, WebSocketDisconnect
+from fastapi.encoders import jsonable_encoder
+from app.services.ai_service_enhanced import enhanced_ai_service
+from app.services.chat_persistence_service import chat_persistence_service
+from app.services.conversation_history import conversation_history
+from app.services.conversation_summary import conversation_summary
+from app.services.long_term_memory import long_term_memory
+from app.services.sentiment import classify_sentiment
+from app.services.tts_service import tts_service
+from app.services.voice_pipeline import run_voice_pipeline
+
+logger = logging.getLogger(__name__)
+
+# Same limit as ChatMessage.message
+MAX_MESSAGE_LENGTH = 1000
+
+class VoiceSession:
+    """One open WebSocket voice conversation"""
+
+    def __init__(
+        self,
+        websocket: WebSocket,
+        user_id: str,
+        companion_gender: str,
+        companion: Dict,
+        history: List[Dict],
+        settings,
+        voice: Optional[str] = None
+    ):
+        self.websocket = websocket
+        self.user_id = user_id
+        self.companion_gender = companion_gender
+        self.voice = voice
+        self.companion_context = {
+            "companion_id": str(companion["_id"]),
+            "backstory": companion.get("backstory", "Friendly AI companion."),
+            "personality_traits": companion.get("personality_traits", []),
+            "interests": companion.get("interests", []),
+            "name": companion.get("name", "AI Companion")
+        }
+        self.history = list(history)  # Newest first
+        self.max_history = settings.history_cache_turns
+        self.heartbeat_interval = settings.voice_ws_heartbeat_seconds
+        self.pipeline_queue_size = settings.voice_pipeline_queue_size
+        self._outbox: asyncio.Queue = asyncio.Queue(maxsize=settings.voice_ws_send_queue_size)
+        self._turn_task: Optional[asyncio.Task] = None
+
+    async def _send_json(self, payload: Dict):
+        """Queue a JSON frame (waits while the outbox is full)"""
+        await self._outbox.put(("json", payload))
+
+    async def _send_bytes(self, data: bytes):
+        """Queue a binary frame (waits while the outbox is full)"""
+        await self._outbox.put(("bytes", data))
+
+    async def _sender(self):
+        """Drain the outbox to the socket"""
+        while True:
+            kind, payload = await self._outbox.get()
+            if kind == "json":
+                await self.websocket.send_text(json.dumps(jsonable_encoder(payload)))
+            else:
+                await self.websocket.send_bytes(payload)
+
+    async def _heartbeat(self):
+        """Ping the client at a fixed interval"""
+        while True:
+            await asyncio.sleep(self.heartbeat_interval)
+            await self._send_json({"type": "ping"})
+
+    async def _synthesize(self, sentence: str) -> bytes:
+        """TTS for one sentence in the companion's voice"""
+        return await tts_service.text_to_speech(
+            text=sentence,
+            voice=self.voice,
+            gender=self.companion_gender
+        )
+
+    async def run(self):
+        """Serve the connection until the client disconnects or goes idle"""
+        sender = asyncio.create_task(self._sender())
+        heartbeat = asyncio.create_task(self._heartbeat())
+        try:
+            await self._send_json({
+                "type": "ready",
+                "companion_name": self.companion_context["name"],
+                "tts_available": tts_service.is_available()
+            })
+
+            while True:
+                frame = await asyncio.wait_for(
+                    self.websocket.receive(),
+                    timeout=self.heartbeat_interval * 2
+                )
+                if frame["type"] == "websocket.disconnect":
+                    raise WebSocketDisconnect(frame.get("code", 1000))
+                raw = frame.get("text")
+                if raw is None:
+                    await self._send_json({"type": "error", "detail": "Messages must be JSON text frames"})
+                    continue
+                try:
+                    message = json.loads(raw)
+                except ValueError:
+                    await self._send_json({"type": "error", "detail": "Messages must be JSON"})
+                    continue
+                if not isinstance(message, dict):
+                    await self._send_json({"type": "error", "detail": "Messages must be JSON objects"})
+                    continue
+                await self._handle(message)
+
+        except WebSocketDisconnect:
+            logger.info(f"Voice session closed by client: User {self.user_id}")
+        except asyncio.TimeoutError:
+            logger.info(f"Voice session idle, closing: User {self.user_id}")
+            await self.websocket.close(code=1001)
+        finally:
+            await self._cancel_turn()
+            for task in (heartbeat, sender):
+                task.cancel()
+            await asyncio.gather(heartbeat, sender, return_exceptions=True)
+
+    async def _handle(self, message: Dict):
+        """Dispatch one client message"""
+        message_type = message.get("type")
+
+        if message_type == "ping":
+            await self._send_json({"type": "pong"})
+        elif message_type == "pong":
+            pass
+        elif message_type == "turn":
+            text = (message.get("message") or "").strip()
+            if not text or len(text) > MAX_MESSAGE_LENGTH:
+                await self._send_json({
+                    "type": "error",
+                    "detail": f"message must be 1-{MAX_MESSAGE_LENGTH} characters"
+                })
+                return
+            # A new turn interrupts the one in progress
+            if await self._cancel_turn():
+                await self._send_json({"type": "cancelled"})
+            self._turn_task = asyncio.create_task(self._run_turn(text))
+        elif message_type == "cancel":
+            if await self._cancel_turn():
+                await self._send_json({"type": "cancelled"})
+        else:
+            await self._send_json({"type": "error", "detail": f"Unknown message type: {message_type}"})
+
+    async def _cancel_turn(self) -> bool:
+        """Cancel the turn in progress, returns whether there was one"""
+        task = self._turn_task
+        self._turn_task = None
+        if task is None or task.done():
+            return False
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        return True
+
+    async def _run_turn(self, text: str):
+        """Generate, speak and store one turn"""
+        started = time.perf_counter()
+        parts = []
+        first_token_at = None
+        first_audio_at = None
+
+        synthesize = self._synthesize if tts_service.is_available() else None
+
+        try:
+            context = dict(self.companion_context, chat_history=list(self.history))
+            context["summary"] = await conversation_summary.get(self.user_id, self.companion_gender)
+            context["memories"] = await long_term_memory.recall(self.user_id, self.companion_gender, text)
+
+            text_deltas = enhanced_ai_service.stream_contextual_response(
+                prompt=text,
+                companion_context=context
+            )
+            async for event in run_voice_pipeline(text_deltas, synthesize, queue_size=self.pipeline_queue_size):
+                if event["type"] == "token":
+                    if first_token_at is None:
+                        first_token_at = time.perf_counter()
+                    parts.append(event["delta"])
+                    await self._send_json({"type": "token", "delta": event["delta"]})
+                elif event["audio"]:
+                    if first_audio_at is None:
+                        first_audio_at = time.perf_counter()
+                    await self._send_json({
+                        "type": "audio",
+                        "index": event["index"],
+                        "text": event["text"],
+                        "bytes": len(event["audio"])
+                    })
+                    await self._send_bytes(event["audio"])
+
+            # Store completed turn
+            chat_doc = {
+                "user_id": self.user_id,
+                "companion_id": self.companion_context["companion_id"],
+                "companion_name": self.companion_context["name"],
+                "companion_gender": self.companion_gender,
+                "user_message": text,
+                "ai_response": "".join(parts),
+                "timestamp": datetime.utcnow(),
+                "interaction_type": "voice",
+                "sentiment": classify_sentiment(text),
+                "metadata": {
+                    "voice_used": self.voice,
+                    "websocket": True
+                }
+            }
+            chat_id = await chat_persistence_service.save(chat_doc)
+
+            self.history.insert(0, {
+                "user_message": chat_doc["user_message"],
+                "ai_response": chat_doc["ai_response"],
+                "timestamp": chat_doc["timestamp"]
+            })
+            del self.history[self.max_history:]
+            conversation_history.append(
+                self.user_id, self.companion_gender,
+                chat_doc["user_message"], chat_doc["ai_response"], chat_doc["timestamp"]
+            )
+            conversation_summary.note_turn(self.user_id, self.companion_gender)
+            long_term_memory.add(
+                self.user_id, self.companion_gender, chat_id,
+                chat_doc["user_message"], chat_doc["ai_response"]
+            )
+
+            def elapsed_ms(moment):
+                return round((moment - started) * 1000, 1) if moment else None
+
+            await self._send_json({
+                "type": "done",
+                "chat_id": str(chat_id),
+                "ai_response": chat_doc["ai_response"],
+                "timestamp": chat_doc["timestamp"],
+                "first_token_ms": elapsed_ms(first_token_at),
+                "first_audio_ms": elapsed_ms(first_audio_at),
+                "total_ms": elapsed_ms(time.perf_counter())
+            })
+
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Voice session turn failed: {str(e)}")
+            await self._send_json({"type": "error", "detail": "Voice turn failed"})
@@ -0,0 +1,128 @@
+"""
+Sentiment Backfill Script
+Adds the sentiment field to chats stored without one (older voice chats)
+
+Chats are scanned in _id order in large batches, only fetching the
+fields needed; each batch is classified in one classify_many() call and
+written back with a single unordered bulk_write. Progress is
+checkpointed after every batch, so an interrupted run resumes where it
+stopped, and writes are throttled to a target ops/sec so the job can
+run beside live traffic. Prints sentiment and interaction-type counts
+for the backfilled chats at the end.
+
+Usage:
+    python backfill_sentiment.py [--batch-size 1000] [--ops-per-second 2000] [--dry-run]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from collections import Counter
+from bson import ObjectId
+from pymongo import MongoClient, UpdateOne
+from app.config import settings
+from app.services.sentiment import classify_many
+
+DEFAULT_CHECKPOINT_FILE = os.path.join(".cache", "backfill_sentiment.json")
+
+def load_checkpoint(path: str):
+    """Last _id processed by a previous run, or None"""
+    try:
+        with open(path) as f:
+            return ObjectId(json.load(f)["last_id"])
+    except FileNotFoundError:
+        return None
+
+def save_checkpoint(path: str, last_id: ObjectId, updated: int):
+    """Record progress atomically (write to a temp file, then rename)"""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump({"last_id": str(last_id), "updated": updated}, f)
+    os.replace(tmp_path, path)
+
+def backfill(batch_size: int, ops_per_second: float, checkpoint_file: str, dry_run: bool):
+    """Classify and store sentiment for every chat missing it"""
+    client = MongoClient(settings.mongo_uri)
+    client.admin.command('ping')
+    chats = client[settings.database_name]["chats"]
+    print(f"✓ Connected to MongoDB ({settings.database_name})")
+
+    last_id = None if dry_run else load_checkpoint(checkpoint_file)
+    if last_id is not None:
+        print(f"Resuming after _id {last_id}")
+
+    sentiments = Counter()
+    interaction_types = Counter()
+    updated = 0
+    issued = 0  # Chats read and (unless dry_run) update operations sent, whether or not they modified anything
+    started = time.monotonic()
+
+    while True:
+        # Keyset pagination on _id: each batch is an index range scan
+        query = {"sentiment": {"$exists": False}}
+        if last_id is not None:
+            query["_id"] = {"$gt": last_id}
+        batch = list(
+            chats.find(query, {"user_message": 1, "interaction_type": 1})
+            .sort("_id", 1)
+            .limit(batch_size)
+        )
+        if not batch:
+            break
+
+        labels = classify_many(chat.get("user_message") or "" for chat in batch)
+        sentiments.update(labels)
+        interaction_types.update(chat.get("interaction_type", "text") for chat in batch)
+        last_id = batch[-1]["_id"]
+        issued += len(batch)
+
+        if not dry_run:
+            # The $exists guard leaves chats written by the live app in the meantime alone
+            result = chats.bulk_write(
+                [
+                    UpdateOne({"_id": chat["_id"], "sentiment": {"$exists": False}}, {"$set": {"sentiment": label}})
+                    for chat, label in zip(batch, labels)
+                ],
+                ordered=False
+            )
+            updated += result.modified_count
+            save_checkpoint(checkpoint_file, last_id, updated)
+        else:
+            updated += len(batch)
+
+        # Throttle on operations sent, not documents modified: skipped updates still cost the server
+        if ops_per_second > 0:
+            ahead = issued / ops_per_second - (time.monotonic() - started)
+            if ahead > 0:
+                time.sleep(ahead)
+
+        elapsed = time.monotonic() - started
+        print(f"  {updated} chats {'classified' if dry_run else 'updated'} ({issued / elapsed:.0f} ops/s), last _id {last_id}")
+
+    print(f"\n✓ Backfill {'dry run ' if dry_run else ''}complete: {updated} chats in {time.monotonic() - started:.1f}s")
+    if updated:
+        print("Sentiment:        " + ", ".join(f"{label}={count}" for label, count in sentiments.most_common()))
+        print("Interaction type: " + ", ".join(f"{kind}={count}" for kind, count in interaction_types.most_common()))
+    client.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Backfill the sentiment field on stored chats")
+    parser.add_argument("--batch-size", type=int, default=1000, help="Chats per read / bulk write")
+    parser.add_argument("--ops-per-second", type=float, default=2000, help="Target rate of update operations sent (0 = unthrottled)")
+    parser.add_argument("--checkpoint-file", default=DEFAULT_CHECKPOINT_FILE, help="Where progress is saved")
+    parser.add_argument("--dry-run", action="store_true", help="Classify and count without writing")
+    args = parser.parse_args()
+
+    try:
+        backfill(args.batch_size, args.ops_per_second, args.checkpoint_file, args.dry_run)
+    except KeyboardInterrupt:
+        print("\nInterrupted - re-run to resume from the checkpoint")
+        sys.exit(1)
+    except Exception as e:
+        print(f"\n✗ Error: {e}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -1,30 +1,48 @@
 """
 Database Setup Script
 Initializes the database with sample companion data
+
+Connection settings come from app.config (MONGO_URI / DATABASE_NAME in
+.env) and indexes from app.database.bootstrap_indexes, the same ones the
+application uses.
 """
+import asyncio
 from pymongo import MongoClient
+from app import database
+from app.config import settings
+from app.repositories.chat_stats_repository import chat_stats_repository
 from datetime import datetime
 import sys
 
-# MongoDB Configuration
-MONGO_URI = "mongodb://localhost:27017/"
-DATABASE_NAME = "AICompanionDB"
+async def bootstrap():
+    """Create the declared indexes and count existing chats through the application's modules"""
+    database.connect(settings)
+    try:
+        await database.bootstrap_indexes()
+        # One-time backfill of /chat/stats counters for users with existing chats
+        await chat_stats_repository.rebuild_all()
+    finally:
+        database.close_connection()
 
 def setup_database():
     """Initialize database with sample companions"""
     try:
         print("Connecting to MongoDB...")
-        client = MongoClient(MONGO_URI)
+        client = MongoClient(settings.mongo_uri)
         
         # Test connection
         client.admin.command('ping')
         print("✓ Connected to MongoDB successfully!")
         
         # Get database and collection
-        db = client[DATABASE_NAME]
+        db = client[settings.database_name]
         companions = db["companions"]
         
-        print(f"\nSetting up database: {DATABASE_NAME}")
+        print(f"\nSetting up database: {settings.database_name}")
+        
+        # Create indexes (idempotent - safe to re-run)
+        asyncio.run(bootstrap())
+        print("✓ Database indexes created, chat stats counters rebuilt")
         
         # Check if companions already exist
         existing_count = companions.count_documents({})
@@ -81,7 +99,7 @@ def setup_database():
         print(f"\n{'='*50}")
         print("Database setup complete!")
         print(f"{'='*50}")
-        print(f"\nDatabase: {DATABASE_NAME}")
+        print(f"\nDatabase: {settings.database_name}")
         print(f"Companions created: 2")
         print("\nYou can now start the server with: run.bat")
         print("Or manually: uvicorn app.main:app --reload")
@@ -92,7 +110,7 @@ def setup_database():
     except Exception as e:
         print(f"\n❌ Error setting up database: {e}")
         print("\nPlease ensure:")
-        print("1. MongoDB is running on localhost:27017")
+        print("1. MongoDB is running at MONGO_URI (see .env)")
         print("2. You have proper permissions")
         sys.exit(1)
 
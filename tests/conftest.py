@@ -0,0 +1,23 @@
+"""
+Shared fixtures
+"""
+import pytest
+from app import database
+
+@pytest.fixture
+def mock_db(monkeypatch):
+    """In-memory Motor database (mongomock-motor) behind app.database.get_database"""
+    mongomock_motor = pytest.importorskip("mongomock_motor")
+    from mongomock.collection import BulkOperationBuilder
+
+    add_update = BulkOperationBuilder.add_update
+
+    def add_update_without_sort(self, *args, sort=None, **kwargs):
+        # pymongo >= 4.11 passes sort= for UpdateOne, which mongomock does not accept yet
+        return add_update(self, *args, **kwargs)
+
+    monkeypatch.setattr(BulkOperationBuilder, "add_update", add_update_without_sort)
+    client = mongomock_motor.AsyncMongoMockClient()
+    monkeypatch.setattr(database, "client", client)
+    monkeypatch.setattr(database, "db", client["ai_companion_test"])
+    return database.db
@@ -0,0 +1,77 @@
+"""
+Admission Control tests
+Priority ordering, queue-wait deadlines and slot accounting
+"""
+import asyncio
+import time
+import pytest
+from app.services import admission
+from app.services.admission import AdmissionController, AdmissionTimeoutError, Priority
+
+def test_waiters_are_served_by_priority_then_fifo():
+    controller = AdmissionController("test", max_concurrent=1)
+    served = []
+
+    async def call(name: str, priority: Priority):
+        async with controller.slot(priority=priority):
+            served.append(name)
+            await asyncio.sleep(0)
+
+    async def scenario():
+        await controller.acquire(priority=Priority.CHAT)
+        # Queued while the only slot is taken, lowest priority first
+        tasks = []
+        for name, priority in [
+            ("background", Priority.BACKGROUND),
+            ("chat-1", Priority.CHAT),
+            ("voice", Priority.VOICE),
+            ("chat-2", Priority.CHAT),
+        ]:
+            tasks.append(asyncio.create_task(call(name, priority)))
+            await asyncio.sleep(0)
+        controller.release()
+        await asyncio.gather(*tasks)
+
+    asyncio.run(scenario())
+
+    assert served == ["voice", "chat-1", "chat-2", "background"]
+    assert controller.get_stats()["active"] == 0
+
+def test_waiter_times_out_at_its_deadline():
+    controller = AdmissionController("test", max_concurrent=1)
+
+    async def scenario():
+        await controller.acquire()
+        started = time.monotonic()
+        with pytest.raises(AdmissionTimeoutError):
+            await controller.acquire(priority=Priority.VOICE, deadline=time.monotonic() + 0.05)
+        waited = time.monotonic() - started
+        controller.release()
+        return waited
+
+    waited = asyncio.run(scenario())
+
+    assert 0.04 <= waited < 1.0
+    stats = controller.get_stats()
+    assert stats["active"] == 0
+    assert stats["queues"]["voice"]["timeouts"] == 1
+    assert stats["queues"]["voice"]["depth"] == 0
+
+def test_slot_granted_as_the_deadline_passes_is_returned(monkeypatch):
+    controller = AdmissionController("test", max_concurrent=1)
+
+    async def grant_then_time_out(future, timeout):
+        # The holder releases, which grants the waiter, in the same instant the timeout fires
+        controller.release()
+        assert future.done() and not future.cancelled()
+        raise asyncio.TimeoutError()
+
+    async def scenario():
+        await controller.acquire()
+        monkeypatch.setattr(admission.asyncio, "wait_for", grant_then_time_out)
+        with pytest.raises(AdmissionTimeoutError):
+            await controller.acquire()
+
+    asyncio.run(scenario())
+
+    assert controller.get_stats()["active"] == 0
@@ -0,0 +1,135 @@
+"""
+Chat load tests
+Concurrent /chat/send clients against the async data-access layer
+
+Requests go through the chat router over an in-process ASGI transport
+with mongomock-motor behind the repositories. Every user lookup waits
+DB_LATENCY_MS, as a round trip to mongod would. Requests/sec and p99 at
+each concurrency level are printed with pytest -s.
+"""
+import asyncio
+import statistics
+import time
+import httpx
+import pytest
+from fastapi import FastAPI
+from app.config import Settings
+from app.repositories.chat_stats_repository import chat_stats_repository
+from app.repositories.user_repository import user_repository
+from app.routes import chat_routes
+from app.services.chat_persistence_service import ChatPersistenceService
+from app.services.companion_catalog import CompanionCatalog
+from app.services.conversation_history import ConversationHistoryCache
+from app.services.conversation_summary import ConversationSummaryService
+from app.services.long_term_memory import LongTermMemoryService
+
+DB_LATENCY_MS = 5
+USERS = 20
+
+@pytest.fixture
+def chat_app(mock_db, tmp_path, monkeypatch):
+    """Chat router on fresh services over a seeded database, and the seeded user ids"""
+    settings = Settings(summary_enabled=False, memory_enabled=False, memory_index_dir=str(tmp_path))
+    services = {
+        "chat_persistence_service": ChatPersistenceService(),
+        "companion_catalog": CompanionCatalog(),
+        "conversation_history": ConversationHistoryCache(),
+        "conversation_summary": ConversationSummaryService(),
+        "long_term_memory": LongTermMemoryService(),
+    }
+    for name, service in services.items():
+        if name != "chat_persistence_service":
+            service.configure(settings)
+        monkeypatch.setattr(chat_routes, name, service)
+
+    async def seed():
+        await mock_db.companions.insert_many([
+            {"name": "Alex", "gender": "boy", "backstory": "Loves hiking."},
+            {"name": "Emma", "gender": "girl", "backstory": "Plays the cello."},
+        ])
+        result = await mock_db.users.insert_many([
+            {"name": f"User {index}", "email": f"user-{index}@example.com"} for index in range(USERS)
+        ])
+        await services["companion_catalog"].load()
+        return [str(user_id) for user_id in result.inserted_ids]
+
+    user_ids = asyncio.run(seed())
+    app = FastAPI()
+    app.include_router(chat_routes.router, prefix="/chat")
+    return app, user_ids
+
+def _with_db_latency(monkeypatch, blocking: bool):
+    """Delay every user lookup; blocking=True stands in for synchronous pymongo"""
+    find_by_id = user_repository.find_by_id
+
+    async def slow_find_by_id(user_id):
+        if blocking:
+            time.sleep(DB_LATENCY_MS / 1000)
+        else:
+            await asyncio.sleep(DB_LATENCY_MS / 1000)
+        return await find_by_id(user_id)
+
+    monkeypatch.setattr(user_repository, "find_by_id", slow_find_by_id)
+
+async def _load(app: FastAPI, user_ids: list, clients: int) -> dict:
+    """Send one message per client concurrently; returns status codes and timings"""
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        async def send(index: int):
+            response = await client.post("/chat/send", json={
+                "user_id": user_ids[index % len(user_ids)],
+                "companion_gender": "girl" if index % 2 else "boy",
+                "message": f"hello number {index}"
+            })
+            # Every client sent at the start of the burst
+            return response.status_code, time.perf_counter() - started
+
+        started = time.perf_counter()
+        results = await asyncio.gather(*(send(index) for index in range(clients)))
+        elapsed = time.perf_counter() - started
+
+    latencies = sorted(latency for _, latency in results)
+    return {
+        "statuses": [code for code, _ in results],
+        "elapsed": elapsed,
+        "rps": clients / elapsed,
+        "p99": latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))],
+        "median": statistics.median(latencies),
+    }
+
+def _report(name: str, clients: int, result: dict):
+    print(
+        f"{name} {clients} clients: {result['rps']:.0f} req/s, "
+        f"p50 {result['median'] * 1000:.0f} ms, p99 {result['p99'] * 1000:.0f} ms"
+    )
+
+@pytest.mark.parametrize("clients", [50, 200, 1000])
+def test_concurrent_chat_turns(chat_app, monkeypatch, clients):
+    app, user_ids = chat_app
+    _with_db_latency(monkeypatch, blocking=False)
+
+    async def scenario():
+        result = await _load(app, user_ids, clients)
+        totals = [(await chat_stats_repository.get(user_id))["total_chats"] for user_id in user_ids]
+        return result, totals
+
+    result, totals = asyncio.run(scenario())
+    _report("async", clients, result)
+
+    assert result["statuses"] == [200] * clients
+    assert sum(totals) == clients
+
+def test_slow_lookups_overlap_instead_of_blocking_the_loop(chat_app, monkeypatch):
+    app, user_ids = chat_app
+    clients = 200
+    results = {}
+    for blocking in (True, False):
+        with monkeypatch.context() as patch:
+            _with_db_latency(patch, blocking)
+            results[blocking] = asyncio.run(_load(app, user_ids, clients))
+    _report("blocking", clients, results[True])
+    _report("async", clients, results[False])
+
+    # Blocking lookups alone take clients * DB_LATENCY_MS (1 s) end to end
+    assert results[True]["elapsed"] >= clients * DB_LATENCY_MS / 1000
+    assert results[False]["p99"] < results[True]["p99"] / 2
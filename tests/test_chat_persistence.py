@@ -0,0 +1,177 @@
+"""
+Chat Persistence tests
+Write-behind batching, shutdown flush, dead-lettering and retries
+"""
+import asyncio
+import os
+from datetime import datetime, timedelta
+import pytest
+from bson import ObjectId, json_util
+from app.config import Settings
+from app.repositories.chat_repository import chat_repository
+from app.repositories.chat_stats_repository import chat_stats_repository
+from app.services import chat_persistence_service as persistence_module
+from app.services.chat_persistence_service import ChatPersistenceService
+
+USER_ID = "user-1"
+START = datetime(2024, 1, 1)
+
+def _chat(index: int, gender: str = "girl") -> dict:
+    return {
+        "user_id": USER_ID,
+        "companion_gender": gender,
+        "user_message": f"message {index}",
+        "ai_response": f"reply {index}",
+        "timestamp": START + timedelta(minutes=index)
+    }
+
+def _settings(tmp_path, **overrides) -> Settings:
+    values = {
+        "chat_write_behind": True,
+        "chat_write_batch_size": 3,
+        "chat_write_flush_interval_ms": 20,
+        "chat_write_buffer_size": 100,
+        "chat_write_retries": 2,
+        "chat_write_dead_letter_file": str(tmp_path / "dead_letter.jsonl"),
+    }
+    values.update(overrides)
+    return Settings(**values)
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(persistence_module, "FLUSH_BACKOFF_INITIAL_SECONDS", 0.0)
+
+@pytest.fixture
+def batch_sizes(monkeypatch):
+    """Sizes of the insert_many calls made by the flush loop"""
+    sizes = []
+    insert_many = chat_repository.insert_many
+
+    async def recording_insert_many(chat_docs):
+        sizes.append(len(chat_docs))
+        return await insert_many(chat_docs)
+
+    monkeypatch.setattr(chat_repository, "insert_many", recording_insert_many)
+    return sizes
+
+def test_queued_chats_are_written_in_batches(mock_db, tmp_path, batch_sizes):
+    service = ChatPersistenceService()
+
+    async def scenario():
+        service.start(_settings(tmp_path))
+        ids = [await service.save(_chat(index)) for index in range(7)]
+        await service.flush()
+        stored = await mock_db.chats.count_documents({"_id": {"$in": ids}})
+        stats = await chat_stats_repository.get(USER_ID)
+        await service.stop()
+        return stored, stats
+
+    stored, stats = asyncio.run(scenario())
+
+    assert stored == 7
+    assert batch_sizes == [3, 3, 1]
+    assert stats["total_chats"] == 7
+    assert stats["girl_chats"] == 7
+    assert service.get_stats()["flushed"] == 7
+
+def test_stop_flushes_chats_still_buffered(mock_db, tmp_path):
+    service = ChatPersistenceService()
+
+    async def scenario():
+        # Neither the batch size nor the interval would flush these before stop()
+        service.start(_settings(tmp_path, chat_write_batch_size=100, chat_write_flush_interval_ms=60000))
+        for index in range(5):
+            await service.save(_chat(index))
+        await service.stop()
+        return await mock_db.chats.count_documents({"user_id": USER_ID})
+
+    assert asyncio.run(scenario()) == 5
+    assert service.get_stats()["buffered"] == 0
+
+def test_chats_that_keep_failing_are_dead_lettered(mock_db, tmp_path, monkeypatch):
+    settings = _settings(tmp_path)
+    service = ChatPersistenceService()
+    attempts = 0
+
+    async def failing_insert_many(chat_docs):
+        nonlocal attempts
+        attempts += 1
+        raise ConnectionError("mongod unreachable")
+
+    monkeypatch.setattr(chat_repository, "insert_many", failing_insert_many)
+
+    async def scenario():
+        service.start(settings)
+        ids = [await service.save(_chat(index)) for index in range(2)]
+        await service.flush()
+        await service.stop()
+        return ids
+
+    ids = asyncio.run(scenario())
+
+    assert attempts == settings.chat_write_retries + 1
+    with open(settings.chat_write_dead_letter_file, encoding="utf-8") as f:
+        dead = [json_util.loads(line) for line in f]
+    assert [chat["_id"] for chat in dead] == ids
+    assert dead[0]["timestamp"] == START
+    stats = service.get_stats()
+    assert stats["failed"] == 2
+    assert stats["retries"] == settings.chat_write_retries
+
+def test_dead_letters_are_replayed_on_startup(mock_db, tmp_path):
+    settings = _settings(tmp_path)
+    chats = [dict(_chat(index), _id=ObjectId()) for index in range(4)]
+    with open(settings.chat_write_dead_letter_file, "w", encoding="utf-8") as f:
+        f.writelines(json_util.dumps(chat) + "\n" for chat in chats)
+    service = ChatPersistenceService()
+
+    async def scenario():
+        service.start(settings)
+        await service.stop()
+        stored = await mock_db.chats.count_documents({"_id": {"$in": [chat["_id"] for chat in chats]}})
+        return stored, await chat_stats_repository.get(USER_ID)
+
+    stored, stats = asyncio.run(scenario())
+
+    assert stored == 4
+    assert stats["total_chats"] == 4
+    assert not os.path.exists(settings.chat_write_dead_letter_file)
+    assert service.get_stats()["replayed"] == 4
+
+def test_retry_after_written_but_uncounted_batch_recounts_its_users(mock_db, tmp_path, monkeypatch):
+    service = ChatPersistenceService()
+    record_chats = chat_stats_repository.record_chats
+    failures = []
+
+    async def record_chats_failing_once(chat_docs):
+        if not failures:
+            failures.append(len(chat_docs))
+            raise ConnectionError("connection reset after the insert")
+        await record_chats(chat_docs)
+
+    monkeypatch.setattr(chat_stats_repository, "record_chats", record_chats_failing_once)
+
+    async def scenario():
+        # One earlier chat so the user's counters exist and are marked rebuilt
+        await chat_repository.insert(_chat(0, gender="boy"))
+        service.start(_settings(tmp_path))
+        for index in range(1, 4):
+            await service.save(_chat(index))
+        await service.flush()
+        await service.stop()
+        return (
+            await mock_db.chats.count_documents({"user_id": USER_ID}),
+            await chat_stats_repository.get(USER_ID)
+        )
+
+    stored, stats = asyncio.run(scenario())
+
+    # The retry hit duplicate keys for the whole batch, which counts as written
+    assert failures == [3]
+    assert stored == 4
+    assert service.get_stats()["flushed"] == 3
+    assert service.get_stats()["failed"] == 0
+    assert stats["total_chats"] == 4
+    assert stats["girl_chats"] == 3
+    assert stats["boy_chats"] == 1
+    assert stats["last_chat_time"] == START + timedelta(minutes=3)
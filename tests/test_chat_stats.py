@@ -0,0 +1,175 @@
+"""
+Chat Stats tests
+Incremental counters against the chats they count, and a point-read benchmark
+
+The benchmark needs a local mongod (MONGO_TEST_URI, default
+mongodb://localhost:27017/) and is skipped without one. It seeds
+STATS_BENCH_CHATS chats (default 100000; set 1000000 for the full-size
+run) and prints the timings with pytest -s.
+"""
+import asyncio
+import os
+import statistics
+import time
+import uuid
+from datetime import datetime, timedelta
+import pytest
+from app import database
+from app.config import Settings
+from app.repositories.chat_repository import chat_repository
+from app.repositories.chat_stats_repository import chat_stats_repository
+
+MONGO_TEST_URI = os.environ.get("MONGO_TEST_URI", "mongodb://localhost:27017/")
+BENCH_CHATS = int(os.environ.get("STATS_BENCH_CHATS", "100000"))
+BENCH_USERS = 50
+BENCH_READS = 20
+
+USER_ID = "user-1"
+START = datetime(2024, 1, 1)
+
+def _chat(index: int, gender: str = "girl", user_id: str = USER_ID) -> dict:
+    return {
+        "user_id": user_id,
+        "companion_gender": gender,
+        "user_message": f"message {index}",
+        "ai_response": f"reply {index}",
+        "timestamp": START + timedelta(minutes=index)
+    }
+
+async def counted_stats(chats, user_id: str) -> dict:
+    """The four queries /chat/stats used to make, as the reference"""
+    recent = await chats.find_one({"user_id": user_id}, sort=[("timestamp", -1)])
+    return {
+        "total_chats": await chats.count_documents({"user_id": user_id}),
+        "boy_chats": await chats.count_documents({"user_id": user_id, "companion_gender": "boy"}),
+        "girl_chats": await chats.count_documents({"user_id": user_id, "companion_gender": "girl"}),
+        "last_chat_time": recent["timestamp"] if recent else None
+    }
+
+def _counters(stats: dict) -> dict:
+    return {field: stats.get(field) for field in ("total_chats", "boy_chats", "girl_chats", "last_chat_time")}
+
+def test_first_chat_of_an_existing_user_counts_older_chats(mock_db):
+    async def scenario():
+        # Chats from before the counters existed
+        await mock_db.chats.insert_many([_chat(index, "boy") for index in range(3)])
+        await chat_repository.insert(_chat(3))
+        return await chat_stats_repository.get(USER_ID), await counted_stats(mock_db.chats, USER_ID)
+
+    stats, expected = asyncio.run(scenario())
+
+    assert stats["rebuilt"] is True
+    assert _counters(stats) == expected
+    assert expected["total_chats"] == 4
+
+def test_inserts_and_deletes_keep_counters_exact(mock_db):
+    async def scenario():
+        for index in range(5):
+            await chat_repository.insert(_chat(index, "girl" if index % 2 else "boy"))
+        await chat_repository.insert_many([_chat(index, "girl") for index in range(5, 9)])
+        await chat_repository.insert_many([_chat(index, "boy", user_id="user-2") for index in range(2)])
+        snapshots = [(await chat_stats_repository.get(USER_ID), await counted_stats(mock_db.chats, USER_ID))]
+
+        await chat_repository.delete_for_user(USER_ID, "girl")
+        snapshots.append((await chat_stats_repository.get(USER_ID), await counted_stats(mock_db.chats, USER_ID)))
+
+        await chat_repository.delete_for_user(USER_ID)
+        snapshots.append((await chat_stats_repository.get(USER_ID), await counted_stats(mock_db.chats, USER_ID)))
+        return snapshots, await chat_stats_repository.get("user-2")
+
+    snapshots, other = asyncio.run(scenario())
+
+    for stats, expected in snapshots:
+        assert _counters(stats) == expected
+    # Deleting girl chats moved last_chat_time back to the newest boy chat
+    assert snapshots[1][0]["last_chat_time"] == START + timedelta(minutes=4)
+    assert other["total_chats"] == 2
+
+def test_rebuild_never_lowers_counters_a_concurrent_chat_raised(mock_db):
+    async def scenario():
+        await chat_repository.insert(_chat(0))
+        # A chat counted between the rebuild's aggregation and its write
+        await mock_db.chat_stats.update_one(
+            {"_id": USER_ID}, {"$inc": {"total_chats": 1, "girl_chats": 1}}
+        )
+        return await chat_stats_repository.rebuild(USER_ID)
+
+    stats = asyncio.run(scenario())
+
+    assert stats["total_chats"] == 2
+    assert stats["girl_chats"] == 2
+
+def _on_mongod(database_name: str, work):
+    """Run work(db) against a fresh connection to the test mongod"""
+    async def run():
+        db = database.connect(Settings(
+            mongo_uri=MONGO_TEST_URI,
+            database_name=database_name,
+            mongo_server_selection_timeout_ms=1000
+        ))
+        try:
+            return await work(db)
+        finally:
+            database.close_connection()
+
+    return asyncio.run(run())
+
+async def _seed(db):
+    try:
+        await database.ping()
+    except Exception as e:
+        return e
+    await database.bootstrap_indexes()
+    batch = []
+    for index in range(BENCH_CHATS):
+        # One heavy user with a fifth of all chats
+        user_id = USER_ID if index % 5 == 0 else f"user-{2 + index % BENCH_USERS}"
+        batch.append(_chat(index, "girl" if index % 3 else "boy", user_id=user_id))
+        if len(batch) == 10000:
+            await db.chats.insert_many(batch, ordered=False)
+            batch = []
+    if batch:
+        await db.chats.insert_many(batch, ordered=False)
+
+@pytest.fixture(scope="module")
+def seeded_mongod():
+    """Name of a database seeded with BENCH_CHATS chats, dropped afterwards"""
+    database_name = f"ai_companion_stats_{uuid.uuid4().hex[:8]}"
+    try:
+        error = _on_mongod(database_name, _seed)
+    except Exception:
+        _on_mongod(database_name, lambda db: database.client.drop_database(database_name))
+        raise
+    if error:
+        pytest.skip(f"No mongod reachable at {MONGO_TEST_URI}: {error}")
+    try:
+        yield database_name
+    finally:
+        _on_mongod(database_name, lambda db: database.client.drop_database(database_name))
+
+def test_point_read_beats_counting_queries(seeded_mongod):
+    async def timed(read):
+        timings = []
+        for _ in range(BENCH_READS):
+            started = time.perf_counter()
+            result = await read()
+            timings.append(time.perf_counter() - started)
+        return statistics.median(timings), result
+
+    async def scenario(db):
+        started = time.perf_counter()
+        await chat_stats_repository.rebuild_all()
+        rebuild_all = time.perf_counter() - started
+        counting, expected = await timed(lambda: counted_stats(db.chats, USER_ID))
+        point_read, stats = await timed(lambda: chat_stats_repository.get(USER_ID))
+        return rebuild_all, counting, point_read, expected, stats
+
+    rebuild_all, counting, point_read, expected, stats = _on_mongod(seeded_mongod, scenario)
+    print(
+        f"{BENCH_CHATS} chats, {expected['total_chats']} for the heavy user: "
+        f"rebuild_all {rebuild_all:.2f}s, four queries {counting * 1000:.2f} ms, "
+        f"point read {point_read * 1000:.2f} ms (medians of {BENCH_READS})"
+    )
+
+    assert _counters(stats) == expected
+    assert point_read < counting
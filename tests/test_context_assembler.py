@@ -0,0 +1,112 @@
+"""
+Context Assembler tests
+Token budget packing of the LLM prompt
+"""
+import pytest
+from app.services.context_assembler import (
+    ContextAssembler,
+    MESSAGE_OVERHEAD_TOKENS,
+    REPLY_PRIMING_TOKENS,
+    SUMMARY_HEADER,
+    MEMORY_HEADER,
+)
+from app.services.prompt_cache import CompiledPrompt
+from app.services.token_counter import count_tokens
+
+SYSTEM_TEXT = "You are Emma, a warm and curious AI companion. Keep replies short and natural."
+USER_MESSAGE = "What should I cook for dinner tonight?"
+
+def make_assembler(budget_tokens: int, max_message_tokens: int = 200) -> ContextAssembler:
+    assembler = ContextAssembler()
+    assembler.budget_tokens = budget_tokens
+    assembler.max_message_tokens = max_message_tokens
+    return assembler
+
+def system_prompt() -> CompiledPrompt:
+    return CompiledPrompt(SYSTEM_TEXT, count_tokens(SYSTEM_TEXT), ("test",))
+
+def history(turns: int, words: int = 30):
+    """Distinct turns, newest first (turn 0 is the newest)"""
+    return [
+        {
+            "user_message": f"user turn {index} " + "word " * words,
+            "ai_response": f"ai turn {index} " + "reply " * words,
+        }
+        for index in range(turns)
+    ]
+
+def prompt_tokens(messages) -> int:
+    """Tokens of a message list, counted the way the assembler budgets them"""
+    return REPLY_PRIMING_TOKENS + sum(
+        count_tokens(message["content"]) + MESSAGE_OVERHEAD_TOKENS for message in messages
+    )
+
+@pytest.mark.parametrize("budget", [120, 200, 350, 600, 1000, 2000])
+def test_never_exceeds_budget(budget):
+    assembler = make_assembler(budget)
+    memories = history(5, words=20)
+    context = assembler.assemble(
+        system_prompt(), USER_MESSAGE, history(12),
+        summary="The user is learning to cook. " * 40,
+        memories=memories,
+        profile="ABOUT YOU: I love trying new recipes."
+    )
+
+    assert context.token_count <= budget
+    assert prompt_tokens(context.messages) <= budget
+    assert assembler.get_stats()["over_budget"] == 0
+
+def test_keeps_system_prompt_user_message_and_newest_turn():
+    chats = history(6, words=150)
+    mandatory = REPLY_PRIMING_TOKENS + count_tokens(SYSTEM_TEXT) + count_tokens(USER_MESSAGE) + 2 * MESSAGE_OVERHEAD_TOKENS
+    # Room for part of one turn only
+    assembler = make_assembler(mandatory + 60)
+
+    context = assembler.assemble(system_prompt(), USER_MESSAGE, chats, summary="Older facts. " * 20)
+
+    assert context.messages[0] == {"role": "system", "content": SYSTEM_TEXT}
+    assert context.messages[-1] == {"role": "user", "content": USER_MESSAGE}
+    assert context.history_turns == 1
+    assert chats[0]["user_message"].startswith(context.messages[-3]["content"])
+    assert chats[0]["ai_response"].startswith(context.messages[-2]["content"])
+    assert context.token_count <= assembler.budget_tokens
+
+def test_drops_older_turns_first():
+    chats = history(10)
+    turn_tokens = (
+        count_tokens(chats[0]["user_message"]) + count_tokens(chats[0]["ai_response"])
+        + 2 * MESSAGE_OVERHEAD_TOKENS
+    )
+    mandatory = REPLY_PRIMING_TOKENS + count_tokens(SYSTEM_TEXT) + count_tokens(USER_MESSAGE) + 2 * MESSAGE_OVERHEAD_TOKENS
+    assembler = make_assembler(mandatory + 3 * turn_tokens + turn_tokens // 2)
+
+    context = assembler.assemble(system_prompt(), USER_MESSAGE, chats)
+
+    assert context.history_turns == 3
+    assert context.dropped_turns == 7
+    history_messages = context.messages[1:-1]
+    # The three newest turns, oldest first
+    assert [message["content"] for message in history_messages[::2]] == [
+        chats[2]["user_message"], chats[1]["user_message"], chats[0]["user_message"]
+    ]
+
+def test_summary_and_memories_trimmed_before_recent_history():
+    chats = history(4)
+    summary = "The user has a sister called Anna who is getting married in June. " * 30
+    memories = history(3, words=40)
+    full = make_assembler(100000).assemble(system_prompt(), USER_MESSAGE, chats, summary=summary, memories=memories)
+    without_extras = make_assembler(100000).assemble(system_prompt(), USER_MESSAGE, chats)
+    # Enough for all recent history plus a little of the summary
+    assembler = make_assembler(without_extras.token_count + 40)
+    assert full.token_count > assembler.budget_tokens
+
+    context = assembler.assemble(system_prompt(), USER_MESSAGE, chats, summary=summary, memories=memories)
+
+    assert context.history_turns == len(chats)
+    assert context.dropped_turns == 0
+    assert context.memory_turns == 0
+    summaries = [message["content"] for message in context.messages if message["content"].startswith(SUMMARY_HEADER)]
+    assert len(summaries) == 1
+    assert len(summaries[0]) < len(SUMMARY_HEADER) + len(summary)
+    assert not any(message["content"].startswith(MEMORY_HEADER) for message in context.messages)
+    assert context.token_count <= assembler.budget_tokens
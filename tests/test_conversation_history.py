@@ -0,0 +1,78 @@
+"""
+Conversation History tests
+Cache hits across turns and TTL expiry
+"""
+import asyncio
+from datetime import datetime
+from app.config import Settings
+from app.services import conversation_history as history_module
+from app.services.conversation_history import ConversationHistoryCache
+
+USER_ID = "user-1"
+GENDER = "girl"
+
+class FakeClock:
+    """Stands in for time.monotonic so tests can skip ahead"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+def _setup(monkeypatch, ttl_seconds: float):
+    clock = FakeClock()
+    monkeypatch.setattr(history_module.time, "monotonic", clock.monotonic)
+    queries = []
+
+    async def find_recent(user_id, companion_gender, limit=5, projection=None):
+        queries.append((user_id, companion_gender))
+        return [{"user_message": "hi", "ai_response": "hello", "timestamp": datetime(2024, 1, 1)}]
+
+    monkeypatch.setattr(history_module.chat_repository, "find_recent", find_recent)
+
+    cache = ConversationHistoryCache()
+    settings = Settings(history_cache_ttl_seconds=ttl_seconds)
+    cache.configure(settings)
+    return cache, clock, queries
+
+def _two_turns(cache: ConversationHistoryCache, clock: FakeClock, gap_seconds: float):
+    async def scenario():
+        first = await cache.get_recent(USER_ID, GENDER)
+        cache.append(USER_ID, GENDER, "how are you?", "great", datetime(2024, 1, 1, 0, 1))
+        clock.now += gap_seconds
+        second = await cache.get_recent(USER_ID, GENDER)
+        return first, second
+
+    return asyncio.run(scenario())
+
+def test_default_settings_keep_serving_turns_far_apart_from_cache(monkeypatch):
+    cache, clock, queries = _setup(monkeypatch, Settings().history_cache_ttl_seconds)
+
+    first, second = _two_turns(cache, clock, gap_seconds=120)
+
+    assert len(first) == 1
+    assert [turn["user_message"] for turn in second] == ["how are you?", "hi"]
+    assert len(queries) == 1
+    stats = cache.get_stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 1
+    assert stats["expirations"] == 0
+
+def test_turn_within_ttl_reads_from_cache(monkeypatch):
+    cache, clock, queries = _setup(monkeypatch, ttl_seconds=30)
+
+    _, second = _two_turns(cache, clock, gap_seconds=10)
+
+    assert len(second) == 2
+    assert len(queries) == 1
+
+def test_expired_conversation_is_reloaded(monkeypatch):
+    cache, clock, queries = _setup(monkeypatch, ttl_seconds=30)
+
+    _, second = _two_turns(cache, clock, gap_seconds=31)
+
+    # Re-read from the (fake) chats collection, which does not have the appended turn
+    assert [turn["user_message"] for turn in second] == ["hi"]
+    assert len(queries) == 2
+    assert cache.get_stats()["expirations"] == 1
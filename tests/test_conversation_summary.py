@@ -0,0 +1,109 @@
+"""
+Conversation Summary tests
+Background refreshes against the fake LLM provider, and clearing history mid-refresh
+"""
+import asyncio
+from datetime import datetime, timedelta
+import pytest
+from app.config import Settings
+from app.repositories.chat_repository import chat_repository
+from app.repositories.summary_repository import summary_repository
+from app.services.ai_service_enhanced import enhanced_ai_service
+from app.services.conversation_summary import ConversationSummaryService
+from app.services.fake_providers import LatencyModel
+from app.services.llm_providers import FakeProvider
+
+USER_ID = "user-1"
+GENDER = "girl"
+KEY = (USER_ID, GENDER)
+START = datetime(2024, 1, 1)
+LATENCY_MS = 100
+
+@pytest.fixture
+def summarizing(monkeypatch):
+    """Fake LLM behind enhanced_ai_service; the event is set once a summary call starts"""
+    provider = FakeProvider(api_key="fake", model="fake", timeout=5.0)
+    provider.client.settings = Settings(fake_llm_tokens_per_second=0, fake_llm_output_tokens=20)
+    provider.client.latency = LatencyModel(LATENCY_MS, sigma=0, error_rate=0, seed=0)
+    started = asyncio.Event()
+    complete = provider.complete
+
+    async def signalling_complete(*args, **kwargs):
+        started.set()
+        return await complete(*args, **kwargs)
+
+    monkeypatch.setattr(provider, "complete", signalling_complete)
+    monkeypatch.setattr(enhanced_ai_service, "llm_provider", provider)
+    return started
+
+@pytest.fixture
+def service():
+    service = ConversationSummaryService()
+    service.configure(Settings(summary_refresh_turns=1, history_cache_turns=5))
+    return service
+
+async def _seed_chats(db, count: int = 12):
+    await db.chats.insert_many([
+        {
+            "user_id": USER_ID,
+            "companion_gender": GENDER,
+            "user_message": f"message {index}",
+            "ai_response": f"reply {index}",
+            "timestamp": START + timedelta(minutes=index)
+        }
+        for index in range(count)
+    ])
+
+async def _refresh(service: ConversationSummaryService) -> asyncio.Task:
+    service.note_turn(USER_ID, GENDER)
+    return service._refreshing[KEY]
+
+def test_refresh_folds_aged_out_chats_into_the_summary(mock_db, summarizing, service):
+    async def scenario():
+        await _seed_chats(mock_db)
+        await (await _refresh(service))
+        return await summary_repository.get(USER_ID, GENDER), await service.get(USER_ID, GENDER)
+
+    doc, summary = asyncio.run(scenario())
+
+    assert doc["summary"] == summary
+    assert summary
+    # Everything older than the 5 verbatim turns
+    assert doc["summarized_turns"] == 7
+    assert doc["summarized_until"] == START + timedelta(minutes=6)
+
+def test_clear_during_the_llm_call_discards_the_summary(mock_db, summarizing, service):
+    async def scenario():
+        await _seed_chats(mock_db)
+        refresh = await _refresh(service)
+        await summarizing.wait()
+        await chat_repository.delete_for_user(USER_ID, GENDER)
+        await service.clear(USER_ID, GENDER)
+        await refresh
+        return await summary_repository.get(USER_ID, GENDER), await service.get(USER_ID, GENDER)
+
+    doc, summary = asyncio.run(scenario())
+
+    assert doc is None
+    assert summary is None
+    assert service.get_stats()["refreshes"] == 0
+
+def test_clear_during_the_summary_write_undoes_it(mock_db, summarizing, service, monkeypatch):
+    save = summary_repository.save
+
+    async def save_then_clear(*args):
+        await save(*args)
+        # Lands after the write, before the refresh checks the generation again
+        await service.clear(USER_ID, GENDER)
+
+    monkeypatch.setattr(summary_repository, "save", save_then_clear)
+
+    async def scenario():
+        await _seed_chats(mock_db)
+        await (await _refresh(service))
+        return await summary_repository.get(USER_ID, GENDER), await service.get(USER_ID, GENDER)
+
+    doc, summary = asyncio.run(scenario())
+
+    assert doc is None
+    assert summary is None
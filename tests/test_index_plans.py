@@ -0,0 +1,202 @@
+"""
+Index plan tests
+explain() every query shape the repositories issue against a seeded mongod
+
+Fails when a plan falls back to COLLSCAN or examines far more documents
+(or index keys) than it returns. Needs a local mongod: set MONGO_TEST_URI
+(default mongodb://localhost:27017/); skipped when none is reachable. The
+seeded database is dropped afterwards.
+"""
+import asyncio
+import os
+import uuid
+from datetime import datetime, timedelta
+import pytest
+from bson import ObjectId
+from app import database
+from app.config import Settings
+from app.repositories.chat_repository import ChatRepository, CONTEXT_PROJECTION, HISTORY_SORT
+from app.repositories.chat_stats_repository import COMPANION_GENDERS
+
+MONGO_TEST_URI = os.environ.get("MONGO_TEST_URI", "mongodb://localhost:27017/")
+
+USERS = 20
+CHATS_PER_CONVERSATION = 100
+START = datetime(2024, 1, 1)
+
+# A plan may examine at most this many documents / keys per returned one (plus slack)
+MAX_EXAMINED_PER_RETURNED = 2
+EXAMINED_SLACK = 5
+
+# Shapes that must read more than they return (aggregations): documents / keys they may examine
+MAX_EXAMINED = {
+    # All of one user's chats, none of the other users'
+    "chat_stats.rebuild": len(COMPANION_GENDERS) * CHATS_PER_CONVERSATION,
+}
+
+USER_ID = "user-7"
+GENDER = "girl"
+MIDDLE = START + timedelta(minutes=CHATS_PER_CONVERSATION // 2)
+
+def _find(collection: str, filter: dict, sort: dict = None, projection: dict = None, limit: int = 0) -> dict:
+    command = {"find": collection, "filter": filter}
+    if sort:
+        command["sort"] = sort
+    if projection:
+        command["projection"] = projection
+    if limit:
+        command["limit"] = limit
+    return command
+
+def _user_query(gender: str = None) -> dict:
+    return ChatRepository._build_query(USER_ID, gender)
+
+# (name, explained command) for every query shape in app/repositories
+QUERY_SHAPES = [
+    ("users.find_by_email", _find("users", {"email": "user-7@example.com"}, limit=1)),
+    ("users.find_by_id", _find("users", {"_id": "user-7"}, limit=1)),
+    ("companions.find_by_gender", _find("companions", {"gender": GENDER}, limit=1)),
+    ("chats.find_recent", _find(
+        "chats", _user_query(GENDER), {"timestamp": -1}, CONTEXT_PROJECTION, limit=5
+    )),
+    ("chats.find_page", _find("chats", _user_query(), dict(HISTORY_SORT), limit=51)),
+    ("chats.find_page(gender)", _find("chats", _user_query(GENDER), dict(HISTORY_SORT), limit=51)),
+    ("chats.find_page(after)", _find(
+        "chats",
+        dict(_user_query(GENDER), **{"$or": [
+            {"timestamp": {"$lt": MIDDLE}},
+            {"timestamp": MIDDLE, "_id": {"$lt": ObjectId("f" * 24)}},
+        ]}),
+        dict(HISTORY_SORT),
+        limit=51
+    )),
+    ("chats.find_between", _find(
+        "chats",
+        dict(_user_query(GENDER), timestamp={"$gt": START + timedelta(minutes=10), "$lt": MIDDLE}),
+        {"timestamp": 1},
+        CONTEXT_PROJECTION,
+        limit=50
+    )),
+    ("chats.iter_since", _find(
+        "chats",
+        dict(_user_query(GENDER), timestamp={"$gt": MIDDLE}),
+        {"timestamp": 1, "_id": 1}
+    )),
+    ("chat_stats.latest_remaining", _find(
+        "chats", _user_query(), dict(HISTORY_SORT), {"timestamp": 1}, limit=1
+    )),
+    ("chat_stats.get", _find("chat_stats", {"_id": USER_ID}, limit=1)),
+    ("chat_stats.rebuild", {
+        "aggregate": "chats",
+        "pipeline": [
+            {"$match": {"user_id": USER_ID}},
+            {"$facet": {
+                "by_companion": [{"$group": {"_id": "$companion_gender", "count": {"$sum": 1}}}],
+                "latest": [{"$sort": {"timestamp": -1}}, {"$limit": 1}, {"$project": {"_id": 0, "timestamp": 1}}]
+            }}
+        ],
+        "cursor": {}
+    }),
+    ("conversation_summaries.get", _find(
+        "conversation_summaries", {"user_id": USER_ID, "companion_gender": GENDER}, limit=1
+    )),
+]
+
+def _walk(node, skip=("rejectedPlans",)):
+    """Yield every dict in an explain document, outside the rejected plans"""
+    if isinstance(node, dict):
+        yield node
+        for key, value in node.items():
+            if key not in skip:
+                yield from _walk(value, skip)
+    elif isinstance(node, list):
+        for value in node:
+            yield from _walk(value, skip)
+
+def _stages(explain: dict) -> set:
+    return {node["stage"] for node in _walk(explain) if isinstance(node.get("stage"), str)}
+
+def _execution_stats(explain: dict) -> dict:
+    return next(node["executionStats"] for node in _walk(explain) if "executionStats" in node)
+
+def _seed(db):
+    users = [
+        {"_id": f"user-{index}", "email": f"user-{index}@example.com", "name": f"User {index}"}
+        for index in range(USERS)
+    ]
+    companions = [{"name": gender.title(), "gender": gender} for gender in COMPANION_GENDERS]
+    chats = [
+        {
+            "user_id": user["_id"],
+            "companion_gender": gender,
+            "user_message": f"message {minute}",
+            "ai_response": f"reply {minute}",
+            "timestamp": START + timedelta(minutes=minute)
+        }
+        for user in users
+        for gender in COMPANION_GENDERS
+        for minute in range(CHATS_PER_CONVERSATION)
+    ]
+    summaries = [
+        {"user_id": user["_id"], "companion_gender": gender, "summary": "earlier chats"}
+        for user in users
+        for gender in COMPANION_GENDERS
+    ]
+    stats = [{"_id": user["_id"], "total_chats": 2 * CHATS_PER_CONVERSATION, "rebuilt": True} for user in users]
+    return (
+        db.users.insert_many(users),
+        db.companions.insert_many(companions),
+        db.chats.insert_many(chats),
+        db.conversation_summaries.insert_many(summaries),
+        db.chat_stats.insert_many(stats),
+    )
+
+@pytest.fixture(scope="module")
+def explained():
+    """Explain output per query shape, from a freshly seeded and indexed database"""
+    database_name = f"ai_companion_plans_{uuid.uuid4().hex[:8]}"
+
+    async def run():
+        db = database.connect(Settings(
+            mongo_uri=MONGO_TEST_URI,
+            database_name=database_name,
+            mongo_server_selection_timeout_ms=1000
+        ))
+        try:
+            try:
+                await database.ping()
+            except Exception as e:
+                return e
+            try:
+                await asyncio.gather(*_seed(db))
+                await database.bootstrap_indexes()
+                return {
+                    name: await db.command({"explain": command, "verbosity": "executionStats"})
+                    for name, command in QUERY_SHAPES
+                }
+            finally:
+                await database.client.drop_database(database_name)
+        finally:
+            database.close_connection()
+
+    result = asyncio.run(run())
+    if isinstance(result, Exception):
+        pytest.skip(f"No mongod reachable at {MONGO_TEST_URI}: {result}")
+    return result
+
+@pytest.mark.parametrize("name", [name for name, _ in QUERY_SHAPES])
+def test_query_uses_an_index(explained, name):
+    stages = _stages(explained[name])
+
+    assert "COLLSCAN" not in stages, f"{name} scans the whole collection: {sorted(stages)}"
+
+@pytest.mark.parametrize("name", [name for name, _ in QUERY_SHAPES])
+def test_query_examines_about_what_it_returns(explained, name):
+    stats = _execution_stats(explained[name])
+    if name in MAX_EXAMINED:
+        limit = MAX_EXAMINED[name] + EXAMINED_SLACK
+    else:
+        limit = MAX_EXAMINED_PER_RETURNED * stats["nReturned"] + EXAMINED_SLACK
+
+    assert stats["totalDocsExamined"] <= limit, f"{name}: {stats['totalDocsExamined']} docs for {stats['nReturned']} results"
+    assert stats["totalKeysExamined"] <= limit, f"{name}: {stats['totalKeysExamined']} keys for {stats['nReturned']} results"
@@ -0,0 +1,75 @@
+"""
+LLM Provider tests
+Concurrent turns against the fake provider overlap instead of serializing
+"""
+import asyncio
+import time
+import pytest
+from app.config import Settings
+from app.services.fake_providers import LatencyModel
+from app.services.llm_providers import FakeProvider
+
+LATENCY_MS = 200
+TURNS = 50
+MESSAGES = [
+    {"role": "system", "content": "You are a friendly companion."},
+    {"role": "user", "content": "How was your day?"},
+]
+
+@pytest.fixture
+def provider():
+    """Fake provider with a fixed first-token latency and instant tokens"""
+    provider = FakeProvider(api_key="fake", model="fake", timeout=5.0)
+    provider.client.settings = Settings(fake_llm_tokens_per_second=0, fake_llm_output_tokens=20)
+    provider.client.latency = LatencyModel(LATENCY_MS, sigma=0, error_rate=0, seed=0)
+    return provider
+
+def _report(name: str, elapsed: float):
+    serial = TURNS * LATENCY_MS / 1000
+    print(f"{name}: {TURNS} turns in {elapsed:.2f}s ({serial:.0f}s if serialized)")
+
+def test_concurrent_completions_overlap(provider):
+    async def turns():
+        started = time.perf_counter()
+        replies = await asyncio.gather(*(provider.complete(MESSAGES) for _ in range(TURNS)))
+        return replies, time.perf_counter() - started
+
+    replies, elapsed = asyncio.run(turns())
+    _report("complete", elapsed)
+
+    assert all(replies)
+    # Serialized, the turns would take TURNS * LATENCY_MS (10 s)
+    assert elapsed < 5 * LATENCY_MS / 1000
+
+def test_concurrent_streams_overlap(provider):
+    async def turn():
+        return "".join([delta async for delta in provider.stream(MESSAGES)])
+
+    async def turns():
+        started = time.perf_counter()
+        replies = await asyncio.gather(*(turn() for _ in range(TURNS)))
+        return replies, time.perf_counter() - started
+
+    replies, elapsed = asyncio.run(turns())
+    _report("stream", elapsed)
+
+    assert all(replies)
+    assert elapsed < 5 * LATENCY_MS / 1000
+
+def test_slow_completion_times_out(provider):
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(provider.complete(MESSAGES, timeout=LATENCY_MS / 1000 / 4))
+
+def test_cancelled_turn_does_not_hold_up_the_others(provider):
+    async def turns():
+        cancelled = asyncio.create_task(provider.complete(MESSAGES))
+        others = [asyncio.create_task(provider.complete(MESSAGES)) for _ in range(5)]
+        await asyncio.sleep(0.01)
+        cancelled.cancel()
+        replies = await asyncio.gather(*others)
+        return cancelled.cancelled(), replies
+
+    cancelled, replies = asyncio.run(turns())
+
+    assert cancelled
+    assert all(replies)
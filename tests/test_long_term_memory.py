@@ -0,0 +1,86 @@
+"""
+Long-term Memory tests
+Snapshot round trip and recovery from corrupt snapshots
+"""
+import asyncio
+from datetime import datetime, timedelta
+import pytest
+from bson import ObjectId
+from app.config import Settings
+from app.services.long_term_memory import LongTermMemoryService, MemoryIndex
+
+USER_ID = "user-1"
+GENDER = "girl"
+KEY = (USER_ID, GENDER)
+START = datetime(2024, 1, 1)
+MESSAGES = [
+    "I climbed a volcano in Iceland last summer",
+    "my sister is getting married in June",
+    "I adopted a cat called Miso",
+    "work has been stressful this week",
+    "I started learning the piano",
+    "the weather is lovely today",
+    "I watched a film yesterday",
+    "what should I cook tonight",
+]
+
+def _service(tmp_path) -> LongTermMemoryService:
+    service = LongTermMemoryService()
+    service.configure(Settings(memory_index_dir=str(tmp_path), history_cache_turns=5))
+    return service
+
+def _snapshot() -> bytes:
+    index = MemoryIndex()
+    for message in MESSAGES:
+        index.add(ObjectId().binary, message)
+    return index.to_bytes()
+
+def test_snapshot_round_trip(tmp_path):
+    service = _service(tmp_path)
+    service._write_snapshot(KEY, _snapshot())
+
+    index = service._read_snapshot(KEY)
+
+    assert index is not None
+    assert len(index) == len(MESSAGES)
+
+@pytest.mark.parametrize("corrupt", [
+    lambda data: data[:6],                    # Cut inside the header length
+    lambda data: data[:40],                   # Cut inside the header
+    lambda data: data[:-3],                   # Cut inside the arrays
+    lambda data: b"LTM1" + b"\xff" * 20,      # Garbage after the magic
+    lambda data: b"not a snapshot",
+], ids=["header-length", "header", "arrays", "garbage", "magic"])
+def test_corrupt_snapshot_is_discarded(tmp_path, corrupt):
+    service = _service(tmp_path)
+    with open(service._path(KEY), "wb") as f:
+        f.write(corrupt(_snapshot()))
+
+    assert service._read_snapshot(KEY) is None
+
+def test_truncated_snapshot_is_rebuilt_from_chats(mock_db, tmp_path):
+    service = _service(tmp_path)
+    with open(service._path(KEY), "wb") as f:
+        f.write(_snapshot()[:6])
+
+    async def scenario():
+        await mock_db.chats.insert_many([
+            {
+                "user_id": USER_ID,
+                "companion_gender": GENDER,
+                "user_message": message,
+                "ai_response": "tell me more",
+                "timestamp": START + timedelta(minutes=index)
+            }
+            for index, message in enumerate(MESSAGES)
+        ])
+        # The first recall starts the load in the background
+        assert await service.recall(USER_ID, GENDER, "volcano") == []
+        await service._loading[KEY]
+        return await service.recall(USER_ID, GENDER, "how was the volcano")
+
+    memories = asyncio.run(scenario())
+
+    assert service.loads == 1
+    assert len(service._indexes[KEY]) == len(MESSAGES)
+    assert memories[0]["user_message"] == MESSAGES[0]
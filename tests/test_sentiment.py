@@ -0,0 +1,96 @@
+"""
+Sentiment Classifier tests
+Whole-word matching, category priority and agreement with the substring scan it replaced
+"""
+import random
+import time
+import pytest
+from app.services.sentiment import SENTIMENT_KEYWORDS, classify_many, classify_sentiment
+
+KEYWORDS = [keyword for keywords in SENTIMENT_KEYWORDS.values() for keyword in keywords]
+FILLER = [
+    word for word in (
+        "the", "cat", "sat", "on", "a", "mat", "today", "we", "went", "to", "park", "my",
+        "dinner", "was", "fine", "and", "rain", "fell", "i", "am", "you", "are", "it", "is",
+        "book", "about", "trains", "coffee", "friend", "called", "me", "later", "plan", "trip"
+    )
+    if not any(keyword in word for keyword in KEYWORDS)
+]
+
+def legacy_sentiment(message: str) -> str:
+    """The substring scan the classifier replaced, kept as a reference"""
+    message_lower = message.lower()
+    if any(word in message_lower for word in ["hi", "hello", "hey", "sup", "morning", "evening"]):
+        return "greeting"
+    if any(word in message_lower for word in ["happy", "great", "awesome", "excited", "love", "amazing", "wonderful"]):
+        return "happy"
+    if any(word in message_lower for word in ["sad", "upset", "angry", "frustrated", "tired", "worried", "stressed"]):
+        return "empathetic"
+    if "?" in message or any(word in message_lower for word in ["what", "why", "how", "when", "where", "who"]):
+        return "curious"
+    return "default"
+
+def _corpus(size: int, seed: int = 0) -> list:
+    """Messages whose keywords only ever appear as whole words"""
+    rng = random.Random(seed)
+    messages = []
+    for _ in range(size):
+        words = rng.choices(FILLER, k=rng.randint(3, 25))
+        for _ in range(rng.randint(0, 2)):
+            words.insert(rng.randrange(len(words) + 1), rng.choice(KEYWORDS))
+        message = " ".join(words)
+        if rng.random() < 0.5:
+            message = message.capitalize()
+        messages.append(message + rng.choice(["", ".", "!", "?", "...", " :)"]))
+    return messages
+
+@pytest.mark.parametrize("message, expected", [
+    ("I feel sad", "empathetic"),
+    ("so SAD...", "empathetic"),
+    ("sadness is everywhere", "default"),
+    ("this is fine", "default"),
+    ("the whole thing", "default"),
+    ("a shipment arrived", "default"),
+    ("Hi!", "greeting"),
+    ("hello, friend", "greeting"),
+    ("oh hey-ho", "greeting"),
+    ("what's for dinner", "curious"),
+    ("dinner at eight?", "curious"),
+    ("love-struck", "happy"),
+    ("I'm tired.", "empathetic"),
+    ("", "default"),
+])
+def test_keywords_match_whole_words_only(message, expected):
+    assert classify_sentiment(message) == expected
+
+@pytest.mark.parametrize("message, expected", [
+    ("hi, I'm so sad", "greeting"),
+    ("I love it but I'm tired", "happy"),
+    ("why am I so stressed", "empathetic"),
+    ("why is it great?", "happy"),
+])
+def test_highest_priority_category_wins(message, expected):
+    assert classify_sentiment(message) == expected
+
+def test_agrees_with_the_substring_scan_on_whole_words():
+    messages = _corpus(2000)
+
+    assert classify_many(messages) == [legacy_sentiment(message) for message in messages]
+
+def test_classify_many_keeps_order():
+    messages = ["hello", "I am sad", "where to?", "the mat"]
+
+    assert classify_many(messages) == ["greeting", "empathetic", "curious", "default"]
+
+def test_throughput():
+    """Reports msgs/s for both classifiers (pytest -s); fails only on a gross regression"""
+    messages = _corpus(20000, seed=1)
+    rates = {}
+    for name, classify in (("legacy", legacy_sentiment), ("word set", classify_sentiment)):
+        started = time.perf_counter()
+        for message in messages:
+            classify(message)
+        rates[name] = len(messages) / (time.perf_counter() - started)
+    print(", ".join(f"{name}: {rate:,.0f} msgs/s" for name, rate in rates.items()))
+
+    assert rates["word set"] > 10000
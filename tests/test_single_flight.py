@@ -0,0 +1,64 @@
+"""
+Single Flight tests
+Coalescing of concurrent identical calls
+"""
+import asyncio
+from app.services.single_flight import SingleFlight
+
+CALLERS = 50
+
+def test_burst_runs_loader_once_and_shares_result():
+    flights = SingleFlight()
+    calls = 0
+
+    async def loader():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return {"reply": "hello"}
+
+    async def burst():
+        return await asyncio.gather(*(flights.run("key", loader) for _ in range(CALLERS)))
+
+    results = asyncio.run(burst())
+
+    assert calls == 1
+    assert len(results) == CALLERS
+    assert all(result is results[0] for result in results)
+    stats = flights.get_stats()
+    assert stats["calls"] == CALLERS
+    assert stats["coalesced"] == CALLERS - 1
+    assert stats["in_flight"] == 0
+
+def test_loader_error_reaches_all_waiters_and_releases_key():
+    flights = SingleFlight()
+    calls = 0
+    error = ValueError("upstream failed")
+
+    async def failing_loader():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        raise error
+
+    async def working_loader():
+        nonlocal calls
+        calls += 1
+        return "ok"
+
+    async def scenario():
+        results = await asyncio.gather(
+            *(flights.run("key", failing_loader) for _ in range(CALLERS)),
+            return_exceptions=True
+        )
+        in_flight = flights.get_stats()["in_flight"]
+        retry = await flights.run("key", working_loader)
+        return results, in_flight, retry
+
+    results, in_flight, retry = asyncio.run(scenario())
+
+    assert all(result is error for result in results)
+    assert in_flight == 0
+    # The failed flight is forgotten, so the next call runs a loader again
+    assert retry == "ok"
+    assert calls == 2
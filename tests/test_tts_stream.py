@@ -0,0 +1,86 @@
+"""
+TTS streaming relay tests
+Limiter slots, stalled clients and the stream worker pool
+"""
+import asyncio
+import time
+import pytest
+from app.services.tts_service import TTSService
+
+class FakeSpeechClient:
+    """Blocking ElevenLabs stand-in yielding a fixed number of chunks"""
+
+    def __init__(self, chunks: int, delay: float = 0.005):
+        self.text_to_speech = self
+        self.chunks = chunks
+        self.delay = delay
+
+    def convert(self, **kwargs):
+        for _ in range(self.chunks):
+            time.sleep(self.delay)
+            yield b"mp3"
+
+@pytest.fixture
+def tts():
+    service = TTSService()
+    service.client = FakeSpeechClient(chunks=8)
+    service.stream_buffer_chunks = 4
+    yield service
+    service.close()
+
+def test_slot_is_released_once_synthesis_ends_not_when_download_does(tts):
+    async def slow_reader():
+        active_mid_download = None
+        received = 0
+        async for _ in tts._relay_limited("voice", "hello"):
+            received += 1
+            await asyncio.sleep(0.05)
+            if received == 6:
+                active_mid_download = tts.limiter.get_stats()["active"]
+        return received, active_mid_download
+
+    received, active_mid_download = asyncio.run(slow_reader())
+
+    assert received == 8
+    assert active_mid_download == 0
+
+def test_stalled_client_stops_synthesis_and_frees_the_slot(tts):
+    tts.stream_stall_seconds = 0.1
+
+    async def stalled_reader():
+        relay = tts._relay_limited("voice", "hello")
+        await relay.__anext__()
+        await asyncio.sleep(0.4)
+        active = tts.limiter.get_stats()["active"]
+        with pytest.raises(TimeoutError):
+            async for _ in relay:
+                pass
+        return active
+
+    assert asyncio.run(stalled_reader()) == 0
+    assert tts.get_stats()["stalled"] == 1
+
+def test_close_fails_queued_streams_and_a_later_stream_starts_a_new_pool(tts):
+    tts.client = FakeSpeechClient(chunks=3, delay=0.1)
+    tts.stream_workers = 1
+
+    async def read():
+        try:
+            return len([chunk async for chunk in tts._relay_limited("voice", "hello")])
+        except RuntimeError as e:
+            return str(e)
+
+    async def scenario():
+        running = asyncio.create_task(read())
+        queued = asyncio.create_task(read())
+        await asyncio.sleep(0.05)
+        tts.close()
+        results = await asyncio.gather(running, queued)
+        return results, tts.limiter.get_stats()["active"], await read()
+
+    (running, queued), active, later = asyncio.run(scenario())
+
+    assert running == 3
+    assert queued == "TTS stream workers shut down"
+    assert active == 0
+    assert later == 3
@@ -0,0 +1,82 @@
+"""
+Voice Pipeline tests
+Sentence ordering and backpressure from a slow consumer
+"""
+import asyncio
+from app.services.voice_pipeline import run_voice_pipeline
+
+SENTENCES = [f"This is sentence number {index}. " for index in range(40)]
+
+def test_audio_follows_sentence_order():
+    async def deltas():
+        for sentence in SENTENCES[:5]:
+            yield sentence
+
+    async def synthesize(sentence: str) -> bytes:
+        # Later sentences finish first
+        await asyncio.sleep(0.01 * (10 - len(sentence) % 10))
+        return sentence.encode()
+
+    async def scenario():
+        return [event async for event in run_voice_pipeline(deltas(), synthesize)]
+
+    events = asyncio.run(scenario())
+
+    audio = [event for event in events if event["type"] == "audio"]
+    assert [event["index"] for event in audio] == list(range(5))
+    assert [event["text"] for event in audio] == [sentence.strip() for sentence in SENTENCES[:5]]
+
+def test_slow_consumer_holds_back_generation_and_tts():
+    generated = 0
+    synthesized = 0
+
+    async def deltas():
+        nonlocal generated
+        for sentence in SENTENCES:
+            generated += 1
+            yield sentence
+
+    async def synthesize(sentence: str) -> bytes:
+        nonlocal synthesized
+        synthesized += 1
+        return b"mp3"
+
+    async def scenario():
+        pipeline = run_voice_pipeline(deltas(), synthesize, queue_size=2)
+        first = await pipeline.__anext__()
+        # The consumer stalls; give the pipeline every chance to run ahead
+        for _ in range(50):
+            await asyncio.sleep(0)
+        await pipeline.aclose()
+        return first
+
+    first = asyncio.run(scenario())
+
+    assert first == {"type": "token", "delta": SENTENCES[0]}
+    # Bounded by the two queues and the in-flight items, not by the clip length
+    assert generated < 10
+    assert synthesized < 10
+
+def test_llm_error_is_raised_to_the_consumer():
+    error = RuntimeError("provider failed")
+
+    async def deltas():
+        yield SENTENCES[0]
+        raise error
+
+    async def synthesize(sentence: str) -> bytes:
+        return b"mp3"
+
+    async def scenario():
+        events = []
+        try:
+            async for event in run_voice_pipeline(deltas(), synthesize, queue_size=1):
+                events.append(event)
+        except RuntimeError as e:
+            return events, e
+        return events, None
+
+    events, raised = asyncio.run(asyncio.wait_for(scenario(), timeout=5))
+
+    assert raised is error
+    assert events[0] == {"type": "token", "delta": SENTENCES[0]}
@@ -0,0 +1,58 @@
+"""
+Voice Session tests
+Handling of malformed client frames
+"""
+import asyncio
+import json
+from app.config import Settings
+from app.services.voice_session import VoiceSession
+
+class FakeWebSocket:
+    """Replays scripted ASGI receive messages and records what is sent"""
+
+    def __init__(self, frames):
+        self.frames = list(frames)
+        self.sent = []
+
+    async def receive(self):
+        if not self.frames:
+            # Give the sender time to drain the replies before the session ends
+            await asyncio.sleep(0.05)
+            return {"type": "websocket.disconnect", "code": 1000}
+        await asyncio.sleep(0)
+        return self.frames.pop(0)
+
+    async def send_text(self, data: str):
+        self.sent.append(json.loads(data))
+
+    async def send_bytes(self, data: bytes):
+        self.sent.append(data)
+
+    async def close(self, code: int = 1000):
+        pass
+
+def _text(data: str):
+    return {"type": "websocket.receive", "text": data}
+
+def test_malformed_frames_get_error_replies_and_keep_the_session_open():
+    websocket = FakeWebSocket([
+        {"type": "websocket.receive", "bytes": b"\x00\x01"},
+        _text("not json"),
+        _text("[1, 2]"),
+        _text(json.dumps({"type": "ping"})),
+    ])
+    session = VoiceSession(
+        websocket,
+        user_id="user-1",
+        companion_gender="girl",
+        companion={"_id": "companion-1", "name": "Emma"},
+        history=[],
+        settings=Settings()
+    )
+
+    asyncio.run(asyncio.wait_for(session.run(), timeout=5))
+
+    types = [frame["type"] for frame in websocket.sent]
+    assert types[0] == "ready"
+    assert types[1:] == ["error", "error", "error", "pong"]
+    assert websocket.sent[1]["detail"] == "Messages must be JSON text frames"